@@ -0,0 +1,67 @@
+import os
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from app.shared_resources import chatbot_instances
+from app.core.llm_router import LLMRouter
+from app.core.slow_query_log import slow_query_log
+
+
+def require_admin_token(x_admin_token: str | None = Header(default=None)):
+    """
+    Admin routes require an X-Admin-Token header matching ADMIN_TOKEN. They
+    expose query text and bind values, so without ADMIN_TOKEN they are off.
+    """
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled; set ADMIN_TOKEN to enable them.")
+    if not hmac.compare_digest((x_admin_token or "").encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+router = APIRouter(prefix="/api/admin", dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    bot = chatbot_instances["DefaultBot"]
+    return {
+        "query_cache": bot.query_cache.stats(),
+        "result_cache": bot.result_cache.stats(),
+        "fast_path": bot.fast_path.stats() if bot.fast_path else None,
+        "rollup_router": bot.rollup_router.stats() if bot.rollup_router else None,
+        "governor": bot.governor.stats() if bot.governor else None,
+        "single_flight": bot.in_flight.stats() if bot.in_flight else None,
+        "prompts": bot.prompts.stats(),
+        "sessions": bot.sessions.stats(),
+        "llm_providers": bot.llm.stats() if isinstance(bot.llm, LLMRouter) else None,
+        "data_version": await bot.data_version.current(),
+    }
+
+
+@router.post("/cache/invalidate")
+async def invalidate_result_cache():
+    """Call after reloading case data so no stale results are served."""
+    bot = chatbot_instances["DefaultBot"]
+    version = await bot.data_version.invalidate()
+    bot.result_cache.clear()
+    return {"success": True, "data_version": version}
+
+
+@router.get("/slow-queries")
+async def slow_queries(limit: int = 20, order_by: str = "total_ms", slow_only: bool = False):
+    """
+    Statement fingerprints ranked by `order_by` (total_ms, max_ms, mean_ms,
+    count or rows), each with its slowest samples and their captured plans.
+    """
+    try:
+        fingerprints = slow_query_log.top(limit, order_by, slow_only)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**slow_query_log.stats(), "top": fingerprints}
+
+
+@router.post("/slow-queries/reset")
+async def reset_slow_queries():
+    slow_query_log.reset()
+    return {"success": True}
@@ -1,17 +1,212 @@
-from fastapi import APIRouter
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import aclosing
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app.shared_resources import chatbot_instances
+from app.core.pagination import PageRejected, query_registry, fetch_page
+from app.core import metrics
+from app.core.export import ExportBusy, ExportResponse, export_chunks, export_media_type, export_rejection
+from app.core.query_governor import COST
+from app.core.result_format import (
+    JSON, UnsupportedFormat, columnar_result, encode, negotiate, to_columnar,
+)
 
 router = APIRouter()
+logger = logging.getLogger("api")
+
+# How often a running request checks whether its client is still connected.
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
 
 class ChatRequest(BaseModel):
     question: str
+    # prefer session_id: the server keeps the history; chat_history is for old clients
+    session_id: str | None = None
     chat_history: list | None = None
 
 
+def session_for(bot, payload: ChatRequest) -> str | None:
+    """The request's session id; a new session unless the client ships its own history."""
+    if payload.session_id:
+        return payload.session_id
+    if payload.chat_history is None:
+        return bot.sessions.new_id()
+    return None
+
+
+async def run_until_disconnected(request: Request, coro):
+    """
+    Await `coro`, cancelling it (and any SQL it is running) if the client goes
+    away first. Returns None when the client disconnected.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling request.")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return None
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+def check_format(response_format: str) -> str:
+    if response_format not in ("rows", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be 'rows' or 'columnar'.")
+    return response_format
+
+
 @router.post("/api/chat")
-async def chat_endpoint(payload: ChatRequest):
+async def chat_endpoint(
+    payload: ChatRequest, request: Request, timings: bool = False,
+    response_format: str = Query("rows", alias="format"),
+):
+    """
+    Answer one question. With `?timings=true` the response also carries a
+    `timings` block: time per pipeline stage, LLM tokens, rows, DB wait
+    and cache outcomes for this request. `?format=columnar` sends the
+    column names once and each row as an array. With that, an Accept of
+    application/msgpack or application/vnd.apache.arrow.stream selects a
+    binary encoding.
+    """
+    check_format(response_format)
+    try:
+        media_type = negotiate(request.headers.get("accept")) if response_format == "columnar" else JSON
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=406, detail=str(e))
     bot = chatbot_instances["DefaultBot"]
     history = payload.chat_history or []
-    result = await bot.process_query(payload.question, chat_history=history)
+    with metrics.trace("chat") as trace:
+        result = await run_until_disconnected(
+            request,
+            bot.process_query(payload.question, chat_history=history, session_id=session_for(bot, payload)),
+        )
+    if result is None:
+        # nginx-style "client closed request"; nobody is listening anyway
+        return Response(status_code=499)
+    if timings:
+        result = {**result, "timings": trace.as_dict()}
+    if response_format == "columnar":
+        result = columnar_result(result)
+        if media_type != JSON:
+            return Response(content=encode(result, media_type), media_type=media_type)
     return result
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@router.post("/api/chat/stream")
+async def chat_stream_endpoint(payload: ChatRequest, response_format: str = Query("rows", alias="format")):
+    """
+    Server-Sent Events variant of /api/chat. Emits `intent`, `sql`, `rows`
+    (one per fetched batch), `sub_query` and `summary` (or `error`; the
+    summary carries the `session_id` to send with the next question), then,
+    when the answer stage is enabled, `answer_token` chunks and `answer`.
+    Starlette stops the generator when the client disconnects, which cancels
+    the running SQL. With `?format=columnar`, each `rows` event carries
+    `columns` and the batch as arrays.
+    """
+    columnar = check_format(response_format) == "columnar"
+    bot = chatbot_instances["DefaultBot"]
+    history = payload.chat_history or []
+    session_id = session_for(bot, payload)
+
+    async def event_stream():
+        started = time.perf_counter()
+        events = bot.stream_database_query(payload.question, chat_history=history, session_id=session_id)
+        try:
+            async with aclosing(events):
+                async for event, data in events:
+                    if columnar and event == "rows":
+                        data = {"index": data["index"], **to_columnar(data["rows"])}
+                    yield format_sse(event, data)
+        finally:
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="chat_stream")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.delete("/api/session/{session_id}")
+async def delete_session_endpoint(session_id: str):
+    """Forget a conversation; the next question with this id starts fresh."""
+    chatbot_instances["DefaultBot"].sessions.delete(session_id)
+    return {"deleted": session_id}
+
+
+def admitted_entry(query_id: str) -> dict:
+    entry = query_registry.get(query_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired query id.")
+    if not entry.get("admitted"):
+        raise HTTPException(status_code=403, detail="This query was not admitted to run.")
+    return entry
+
+
+@router.get("/api/query/{query_id}/page")
+async def query_page_endpoint(query_id: str, cursor: str | None = None, limit: int = 100):
+    """
+    Page through the full result of a previously generated query (the
+    `query_id` reported per sub-query) without calling the LLM again. Pass the
+    returned `next_cursor` to get the following page.
+    """
+    entry = admitted_entry(query_id)
+    try:
+        page = await fetch_page(chatbot_instances["DefaultBot"], entry, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PageRejected as e:
+        opening = (
+            "This result is too expensive to page through." if e.verdict["rejected_by"] == COST
+            else "This result cannot be paged through."
+        )
+        raise HTTPException(status_code=422, detail=f"{opening} {e.verdict['reason']}")
+    return {"query_id": query_id, "question": entry["question"], **page}
+
+
+@router.get("/api/query/{query_id}/export")
+async def query_export_endpoint(query_id: str, response_format: str = Query("csv", alias="format")):
+    """
+    Download the full result of a previously generated query as CSV or
+    Parquet (`?format=parquet`, needs pyarrow). Rows are streamed from a
+    server-side cursor, and there is no row cap.
+    """
+    entry = admitted_entry(query_id)
+    try:
+        media_type = export_media_type(response_format)
+    except ValueError as e:
+        status_code = 406 if isinstance(e, UnsupportedFormat) else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
+    rejection = await export_rejection(chatbot_instances["DefaultBot"], entry)
+    if rejection is not None:
+        opening = (
+            "The full result is too expensive to export." if rejection["rejected_by"] == COST
+            else "The full result cannot be exported."
+        )
+        raise HTTPException(status_code=422, detail=f"{opening} {rejection['reason']}")
+    try:
+        body, close = await export_chunks(entry, response_format)
+    except ExportBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return ExportResponse(
+        body,
+        close,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="query-{query_id}.{response_format}"'},
+    )
@@ -1,17 +1,31 @@
 import os
-import re
 import json
+import time
 import asyncio
+import hashlib
 import logging
+from contextlib import aclosing
 from typing import List, Tuple
 
 from pydantic import BaseModel
 from typing_extensions import TypedDict
 
-from langchain_community.utilities import SQLDatabase
-from langchain_experimental.sql import SQLDatabaseChain
-
+from app.db import engine, db_executor
 from app.core.llm_factory import create_llm
+from app.core.llm_router import LLMRouter
+from app.core.query_cache import QueryCache
+from app.core.fast_path import FastPathParser
+from app.core.result_cache import ResultCache, fingerprint_sql
+from app.core.data_version import DataVersion
+from app.core.rollup_router import RollupRouter
+from app.core.query_governor import QueryGovernor, COST, JOIN_ROWS, PLAN_ERROR
+from app.core.sql_analysis import parse_sql
+from app.core.single_flight import SingleFlight
+from app.core.prompt_builder import PromptBuilder
+from app.core.session_store import SessionStore, ChatSession
+from app.core.schema_snapshot import snapshot_database
+from app.core.metrics import span, observe_stage, record_llm_tokens, record_rows, record_cache
+from app.core.pagination import MAX_RESULT_ROWS, MAX_STREAM_ROWS, cap_query, query_registry
 from app.core.utils.log_utils import log_and_raise
 from app.core.chatbot_prompts import (
     SYSTEM_INSTRUCTION_PROMPT,
@@ -19,7 +33,56 @@ from app.core.chatbot_prompts import (
     MULTI_QUESTION_GENERATE_ANSWER_PROMPT,
     DETECT_INTENT_PROMPT,
 )
-from app.table_info import TABLE_INFO
+from app.table_info import TABLE_INFO, CASE_SERVING_VIEW, CASE_TYPE_TABLE
+
+
+# Max sub-queries of one request running at the same time. The global limit is
+# the DB executor pool size (DB_EXECUTOR_WORKERS in app/db.py).
+SUBQUERY_CONCURRENCY = int(os.getenv("SUBQUERY_CONCURRENCY", "4"))
+
+# Rows per sub-query shown to the LLM when it writes the natural-language answer.
+ANSWER_SAMPLE_ROWS = int(os.getenv("ANSWER_SAMPLE_ROWS", "50"))
+
+# Relations generated SQL may read.
+ALLOWED_TABLES = {CASE_SERVING_VIEW, CASE_TYPE_TABLE}
+
+async def _single_batch(rows: list):
+    yield rows
+
+
+# Opening sentence of the reply when the governor turned a query away, by verdict["rejected_by"].
+REJECTION_MESSAGES = {
+    COST: "The query was not run because it would be too expensive.",
+    JOIN_ROWS: "The query was not run because one of its joins would produce too many rows.",
+    PLAN_ERROR: "The query was not run because the database could not plan it.",
+}
+
+
+def _no_rows_message(sub_queries: list) -> str:
+    rejected = [report for report in sub_queries if report.get("status") == "rejected"]
+    if rejected:
+        openings = dict.fromkeys(REJECTION_MESSAGES[report["rejected_by"]] for report in rejected)
+        reasons = dict.fromkeys(report["reason"] for report in rejected)
+        return " ".join([*openings, *reasons])
+    return "No data was found for this request."
+
+
+def _result_text(rows: list, row_count: int, truncated: bool) -> str:
+    """Result of one sub-query as given to the answer prompt."""
+    if not row_count:
+        return "None"
+    more = " (more rows exist)" if truncated else ""
+    shown = rows[:ANSWER_SAMPLE_ROWS]
+    return f"{row_count} row(s){more}, first {len(shown)}: {json.dumps(shown, default=str)}"
+
+
+def _found_rows_message(row_count: int, truncated: bool) -> str:
+    if truncated:
+        return (
+            f"Showing the first {row_count} row(s); more are available "
+            f"through the pagination API."
+        )
+    return f"Found {row_count} row(s)."
 
 
 # ---------- Simple models for structured output ----------
@@ -27,6 +90,8 @@ from app.table_info import TABLE_INFO
 class QueryItem(BaseModel):
     question: str
     query: str
+    # bind parameters (":name" placeholders); set by the fast path, never by the LLM
+    params: dict | None = None
 
 
 class QueryOutput(BaseModel):
@@ -44,32 +109,119 @@ class State(TypedDict):
 # ---------- DRT‑only Chatbot class ----------
 
 class Chatbot:
-    def __init__(self, bot_type: str, shared_db: SQLDatabase):
+    def __init__(self, bot_type: str, shared_db=None):
         # basic setup
         self.bot_type = bot_type
         self.logger = logging.getLogger(f"{self.bot_type}Chatbot")
         self.logger.setLevel(logging.INFO)
 
-        # DB: only your shared PostgreSQL with case_details_2025
+        # DB: only your shared PostgreSQL with case_details_2025. The prompts
+        # use the static TABLE_INFO; a SQLDatabase (which reflects tables) is
+        # only built if something asks for `db` or `db_chain`.
         try:
-            self.db = shared_db
-            self.logger.info("Using shared SQLDatabase instance.")
+            self._db = shared_db
+            self._db_chain = None
+            self.dialect = engine.dialect.name
             self.table_info = TABLE_INFO
             self.logger.info("Cached DRT table schema information.")
         except Exception as e:
-            self.logger.error(f"Error using shared SQLDatabase: {str(e)}")
+            self.logger.error(f"Error setting up the database: {str(e)}")
             raise
 
-        # LLM (Ollama / Gemini / Groq via factory)
+        # LLM (Ollama / Gemini / Groq, or a router over several, via factory),
+        # called through its async API
         self.llm = create_llm()
         if not self.llm:
             raise ValueError("Failed to initialize the LLM. Please check configuration.")
 
-        # optional: SQLDatabaseChain (not strictly required if you always go via prompts)
-        self.db_chain = SQLDatabaseChain.from_llm(llm=self.llm, db=self.db)
+        # token-budgeted prompts: relevant schema columns and recent history only
+        self.prompts = PromptBuilder(
+            self.table_info,
+            token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", "6000")),
+            history_budget=int(os.getenv("PROMPT_HISTORY_TOKENS", "1500")),
+            prune_schema=os.getenv("PROMPT_SCHEMA_PRUNING", "true").lower() == "true",
+        )
 
         # system instruction, already customized for DRT
-        self.system_instruction = SYSTEM_INSTRUCTION_PROMPT.format(bot_type=self.bot_type)
+        self.system_instruction = SYSTEM_INSTRUCTION_PROMPT.format(
+            bot_type=self.bot_type, case_table=CASE_SERVING_VIEW
+        )
+
+        # NL-to-SQL cache in front of write_query; the namespace changes whenever
+        # the prompt or schema text does, so persisted entries never outlive them
+        prompt_version = hashlib.sha256(
+            (WRITE_QUERY_PROMPT + self.table_info).encode("utf-8")
+        ).hexdigest()[:16]
+        self.query_cache = QueryCache(
+            max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("QUERY_CACHE_TTL_SECONDS", "86400")),
+            path=os.getenv("QUERY_CACHE_PATH") or None,
+            namespace=prompt_version,
+            history_turns=int(os.getenv("QUERY_CACHE_HISTORY_TURNS", "2")),
+        )
+
+        # rule-based parser for the common question shapes (see app/core/fast_path.py)
+        self.fast_path = (
+            FastPathParser() if os.getenv("FAST_PATH_ENABLED", "true").lower() == "true" else None
+        )
+
+        # SQL result cache, invalidated whenever the data version changes
+        self.result_cache = ResultCache(
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        )
+        self.data_version = DataVersion(
+            check_seconds=float(os.getenv("DATA_VERSION_CHECK_SECONDS", "30")),
+        )
+
+        # answers simple COUNT/AVG statistics from drt_case_rollup when it is current
+        self.rollup_router = (
+            RollupRouter() if os.getenv("ROLLUP_ROUTING", "true").lower() == "true" else None
+        )
+
+        # server-side conversation state, so clients send only the new question
+        self.sessions = SessionStore(
+            max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+            ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "86400")),
+            max_turns=int(os.getenv("SESSION_MAX_TURNS", "10")),
+            path=os.getenv("SESSION_STORE_PATH") or None,
+            # a repeated question reuses its SQL only after the same earlier questions
+            context_turns=self.query_cache.history_turns,
+        )
+
+        # optional natural-language answer after the rows (streamed over SSE)
+        self.answer_stage = os.getenv("ANSWER_STAGE_ENABLED", "false").lower() == "true"
+
+        # identical questions (same normalized text and history context as the
+        # NL-to-SQL cache key) arriving together share one pipeline run
+        self.in_flight = (
+            SingleFlight() if os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true" else None
+        )
+
+        # EXPLAIN-based cost limits and statement_timeout (see app/core/query_governor.py)
+        self.governor = (
+            QueryGovernor() if os.getenv("QUERY_GOVERNOR_ENABLED", "true").lower() == "true" else None
+        )
+
+    # ---------- On-demand LangChain objects ----------
+
+    @property
+    def db(self):
+        """SQLDatabase over the case tables, built from the schema snapshot on first use."""
+        if self._db is None:
+            self._db = snapshot_database(engine)
+            self.logger.info("Built SQLDatabase from the schema snapshot.")
+        return self._db
+
+    @property
+    def db_chain(self):
+        """Optional SQLDatabaseChain (not used by the prompt pipeline); built on first use."""
+        if self._db_chain is None:
+            from langchain_experimental.sql import SQLDatabaseChain
+
+            self._db_chain = SQLDatabaseChain.from_llm(
+                llm=self.llm.primary if isinstance(self.llm, LLMRouter) else self.llm, db=self.db
+            )
+        return self._db_chain
 
     # ---------- General / small‑talk ----------
 
@@ -82,14 +234,16 @@ class Chatbot:
                             System Instruction:
                             {self.system_instruction}
 
-                            User Input: "{user_input}"
-
                             Chat history (most recent last):
-                            {json.dumps(chat_history)}
+                            {self.prompts.history_for(chat_history)}
+
+                            User Input: "{user_input}"
 
                             Respond appropriately based on the system instruction, considering the chat history for context.
                         """
-            response = await asyncio.to_thread(self.llm.invoke, prompt)
+            with span("generate_dynamic_response"):
+                response = await self.llm.ainvoke(prompt)
+            record_llm_tokens("generate_dynamic_response", prompt, response)
             self.logger.info("Dynamic response generated successfully.")
             return response.content.strip()
         except Exception as e:
@@ -100,77 +254,61 @@ class Chatbot:
     # ---------- Safety: only read‑only queries ----------
 
     def is_query_retrieval_only(self, query: str) -> bool:
-        """Allow only read‑only queries (no INSERT/UPDATE/DELETE/etc.)."""
+        """Allow only a single read‑only SELECT (no DML/DDL, SELECT INTO, locks or side-effect functions)."""
         self.logger.info(f"Checking if query is retrieval-only: {query}")
-        query = query.strip()
-
-        # block queries starting with comments
-        if re.match(r"(?i)^\s*(--|#|/\*)", query):
-            self.logger.warning("Query starts with a comment — blocked.")
+        parsed = parse_sql(query)
+        if not parsed.read_only:
+            self.logger.warning(f"Query is not retrieval-only: {parsed.error}")
             return False
-
-        forbidden_start = [
-            "insert",
-            "update",
-            "delete",
-            "drop",
-            "alter",
-            "create",
-            "exec",
-            "merge",
-            "truncate",
-            "save",
-        ]
-        pattern = r"(?i)^\s*(" + "|".join(forbidden_start) + r")\b"
-        if re.match(pattern, query):
-            self.logger.warning("Query starts with a forbidden keyword.")
-            return False
-
         self.logger.info("Query is safe (retrieval or non-modifying).")
         return True
 
     def uses_only_case_table(self, sql_query: str) -> bool:
         """
-        Ensure the query touches only your single table: case_details_2025.
+        Ensure the query reads only the serving view (and the case_type lookup),
+        including tables referenced from CTEs and subqueries.
         """
-        self.logger.info(f"Validating tables in query: {sql_query}")
-        tables = re.findall(r"from\s+(\w+)", sql_query, re.IGNORECASE)
-        tables += re.findall(r"join\s+(\w+)", sql_query, re.IGNORECASE)
-        unique_tables = {t.lower() for t in tables}
-        self.logger.info(f"Detected tables: {unique_tables or set()}")
-
-        # allow no explicit FROM (e.g., some dialects) or only case_details_2025
-        allowed = {"updated_case_details_2025", " case_type"}
-        if not unique_tables:
-            return True
-        return unique_tables.issubset(allowed)
- 
+        tables = parse_sql(sql_query).tables
+        self.logger.info(f"Detected tables: {set(tables)}")
+        return tables.issubset(ALLOWED_TABLES)
+
     def is_query_allowed(self, sql_query: str) -> bool:
         """
         Single check: read-only + only allowed tables.
         """
-        if not self.is_query_retrieval_only(sql_query):
-            return False
-        if not self.uses_only_case_table(sql_query):
-            self.logger.warning("Query uses tables other than allowed tables.")
-            return False
-        return True
-    
+        return self.query_rejection(sql_query) is None
+
+    def query_rejection(self, sql_query: str) -> str | None:
+        """Why `sql_query` may not run, or None when it passes both checks."""
+        with span("is_query_allowed"):
+            if not self.is_query_retrieval_only(sql_query):
+                return parse_sql(sql_query).error
+            if not self.uses_only_case_table(sql_query):
+                self.logger.warning("Query uses tables other than allowed tables.")
+                return "The query reads tables other than the case data."
+            return None
+
     # ---------- Write SQL from NL ----------
 
-    def write_query(self, questions: str, chat_history: list) -> list[QueryItem]:
+    async def write_query(self, questions: str, chat_history: list) -> list[QueryItem]:
         self.logger.info(f"Generating SQL queries for questions: {questions}")
         try:
-            prompt = WRITE_QUERY_PROMPT.format(
-                table_info=self.table_info,
+            prompt = self.prompts.build(
+                "write_query",
+                WRITE_QUERY_PROMPT,
+                questions,
+                chat_history,
+                case_table=CASE_SERVING_VIEW,
+                case_type_table=CASE_TYPE_TABLE,
                 input=questions,
-                dialect=self.db.dialect,
+                dialect=self.dialect,
                 database_specific_instructions="",  # if you removed this from the prompt, drop this arg
-                chat_history=json.dumps(chat_history),
             )
 
-            response = self.llm.invoke(prompt)
+            with span("write_query"):
+                response = await self.llm.ainvoke(prompt)
             raw_text = response.content if hasattr(response, "content") else str(response)
+            record_llm_tokens("write_query", prompt, response, raw_text)
             self.logger.info(f"Raw LLM output for write_query: {raw_text}")
 
             cleaned = raw_text.strip()
@@ -203,13 +341,94 @@ class Chatbot:
             )
 
         
+    async def plan_queries(
+        self, questions: str, chat_history: list, session: ChatSession | None = None
+    ) -> list[QueryItem]:
+        """
+        SQL from an earlier turn of the session that asked the same question,
+        then fast-path templates; only unrecognized questions reach the (cached) LLM.
+        """
+        if session is not None:
+            previous = session.find_queries(questions)
+            record_cache("session", "hit" if previous else "miss")
+            if previous:
+                self.logger.info(f"Reusing SQL from earlier in the session for: {questions}")
+                return [QueryItem(**item) for item in previous]
+        if self.fast_path is not None:
+            parsed = self.fast_path.parse(questions)
+            record_cache("fast_path", "miss" if parsed is None else "hit")
+            if parsed is not None:
+                _, sql, params = parsed
+                return [QueryItem(question=questions, query=sql, params=params)]
+        return await self.cached_write_query(questions, chat_history)
+
+    async def cached_write_query(self, questions: str, chat_history: list) -> list[QueryItem]:
+        """write_query behind the NL-to-SQL cache; hits skip the LLM entirely."""
+        key = self.query_cache.make_key(questions, chat_history)
+        cached = self.query_cache.get(key)
+        record_cache("query_cache", "miss" if cached is None else "hit")
+        if cached is not None:
+            self.logger.info(f"NL-to-SQL cache hit for questions: {questions}")
+            return [QueryItem(**item) for item in cached]
+
+        queries = await self.write_query(questions, chat_history)
+        self.query_cache.set(key, [item.model_dump() for item in queries])
+        return queries
+
+    async def route_query(self, item: QueryItem) -> Tuple[str, dict | None, str]:
+        """
+        (SQL to run, params, source) for an allowed sub-query: the rollup
+        rewrite when one applies and the rollup matches the data version,
+        otherwise the query as planned.
+        """
+        if self.rollup_router is not None:
+            rewritten = self.rollup_router.rewrite(item.query)
+            if rewritten is not None:
+                db_version = await self.data_version.db_version()
+                counts_cases = self.rollup_router.counts_cases(item.query)
+                if await self.rollup_router.is_available(db_version, counts_cases=counts_cases):
+                    record_cache("rollup", "hit")
+                    return rewritten, item.params, "rollup"
+                record_cache("rollup", "unavailable")
+        return item.query, item.params, "base"
+
+    async def cost_rejection(
+        self, query: str, params: dict | None, max_cost: float | None = None
+    ) -> dict | None:
+        """The governor's verdict when it refuses to run `query`, or None when it may run."""
+        if self.governor is None:
+            return None
+        version = await self.data_version.current()
+        with span("governor"):
+            verdict = await self.governor.check(query, params, max_cost=max_cost, data_version=version)
+        return None if verdict["allowed"] else verdict
+
+    @property
+    def statement_timeout_ms(self) -> int | None:
+        return self.governor.statement_timeout_ms if self.governor is not None else None
+
     # ---------- Execute query ----------
 
-    async def execute_query(self, query: str) -> Tuple[bool, str]:
+    async def execute_query(
+        self, query: str, max_rows: int | None = None, params: dict | None = None,
+        timeout_ms: int | None = None,
+    ) -> Tuple[bool, list]:
         self.logger.info(f"Executing query: {query}")
         try:
-            result = self.db._execute(query)
-            self.logger.info(f"Query Result: {result}")
+            fingerprint = fingerprint_sql(query, params)
+            version = await self.data_version.current()
+            cached = self.result_cache.get(fingerprint, version)
+            record_cache("result_cache", "miss" if cached is None else "hit")
+            if cached is not None:
+                self.logger.info("Result cache hit.")
+                return True, cached
+
+            # runs on the bounded DB thread pool; cancelling this coroutine
+            # (e.g. client disconnect) cancels the statement in PostgreSQL too
+            with span("execute_query"):
+                result = await db_executor.run(query, params, max_rows=max_rows, timeout_ms=timeout_ms)
+            self.result_cache.set(fingerprint, version, result)
+            self.logger.info(f"Query returned {len(result)} row(s).")
             return True, result
         except Exception as e:
             self.logger.error(f"Error executing query: {str(e)}")
@@ -218,6 +437,30 @@ class Chatbot:
 
     # ---------- Turn SQL results into user answer ----------
 
+    def answer_prompt(
+        self,
+        actual_question: str,
+        queries: List[QueryItem],
+        results: List[str],
+        chat_history: list,
+    ) -> str:
+        combined_data = "\n".join(
+            [
+                f"Sub-Question: {item.question}\nQuery: {item.query}\nResult: {result}"
+                for item, result in zip(queries, results)
+            ]
+        )
+        return self.prompts.build(
+            "generate_answer",
+            MULTI_QUESTION_GENERATE_ANSWER_PROMPT,
+            actual_question,
+            chat_history,
+            fit="combined_data",
+            actual_question=actual_question,
+            case_table=CASE_SERVING_VIEW,
+            combined_data=combined_data,
+        )
+
     async def generate_answer(
         self,
         actual_question: str,
@@ -227,21 +470,10 @@ class Chatbot:
     ) -> str:
         self.logger.info(f"Generating answer for question: {actual_question}")
         try:
-            combined_data = "\n".join(
-                [
-                    f"Sub-Question: {item.question}\nQuery: {item.query}\nResult: {result}"
-                    for item, result in zip(queries, results)
-                ]
-            )
-
-            prompt = MULTI_QUESTION_GENERATE_ANSWER_PROMPT.format(
-                actual_question=actual_question,
-                combined_data=combined_data,
-                table_info=self.table_info,
-                chat_history=json.dumps(chat_history),
-            )
-
-            response = await asyncio.to_thread(self.llm.invoke, prompt)
+            prompt = self.answer_prompt(actual_question, queries, results, chat_history)
+            with span("generate_answer"):
+                response = await self.llm.ainvoke(prompt)
+            record_llm_tokens("generate_answer", prompt, response)
             self.logger.info("Answer generated successfully.")
             return response.content.strip()
         except Exception as e:
@@ -249,17 +481,53 @@ class Chatbot:
             log_and_raise(e, "Error generating answers from SQL results.")
             return "Sorry, I encountered an issue while generating the answers. Please try again."
 
+    async def stream_answer(
+        self,
+        actual_question: str,
+        queries: List[QueryItem],
+        results: List[str],
+        chat_history: list,
+    ):
+        """
+        Async generator of answer text chunks as the LLM produces them. The
+        last item is a dict with the full answer and its timings.
+        """
+        self.logger.info(f"Streaming answer for question: {actual_question}")
+        started = time.perf_counter()
+        ttft_ms = None
+        parts = []
+        prompt = self.answer_prompt(actual_question, queries, results, chat_history)
+        async for chunk in self.llm.astream(prompt):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not text:
+                continue
+            if ttft_ms is None:
+                ttft_ms = round((time.perf_counter() - started) * 1000, 2)
+                self.logger.info(f"Answer time to first token: {ttft_ms} ms")
+            parts.append(text)
+            yield text
+        elapsed = time.perf_counter() - started
+        response = "".join(parts).strip()
+        # includes time the consumer spent between tokens
+        observe_stage("stream_answer", elapsed)
+        record_llm_tokens("stream_answer", prompt, completion=response)
+        yield {
+            "response": response,
+            "ttft_ms": ttft_ms,
+            "elapsed_ms": round(elapsed * 1000, 2),
+        }
+
     # ---------- Intent detection ----------
 
     async def detect_intent(self, user_input: str, chat_history: list) -> str:
         self.logger.info(f"Detecting intent for user input: {user_input}")
         try:
-            prompt = DETECT_INTENT_PROMPT.format(
-                table_schema=self.table_info,
-                user_input=user_input,
-                chat_history=json.dumps(chat_history),
+            prompt = self.prompts.build(
+                "detect_intent", DETECT_INTENT_PROMPT, user_input, chat_history, user_input=user_input
             )
-            response = await asyncio.to_thread(self.llm.invoke, prompt)
+            with span("detect_intent"):
+                response = await self.llm.ainvoke(prompt)
+            record_llm_tokens("detect_intent", prompt, response)
             intent = response.content.strip()
             self.logger.info(f"Intent detected: {intent}")
             return intent
@@ -276,43 +544,117 @@ class Chatbot:
         return {"success": True, "response": dynamic_response}
 
 
+    async def run_sub_query(
+        self, item: QueryItem, semaphore: asyncio.Semaphore
+    ) -> Tuple[list, dict]:
+        """Validate and execute one sub-query, returning its rows and a timing report."""
+        async with semaphore:
+            started = time.perf_counter()
+            report = {"question": item.question, "query": item.query}
+            if item.params:
+                report["params"] = item.params
+            rows = []
+            rejection = self.query_rejection(item.query)
+            if rejection is not None:
+                self.logger.warning(f"Blocked unsafe or invalid query: {item.query}")
+                report["status"] = "blocked"
+                report["reason"] = rejection
+            else:
+                sql, params, report["source"] = await self.route_query(item)
+                # one extra row tells us whether the cap cut the result short
+                capped = cap_query(sql, MAX_RESULT_ROWS + 1)
+                rejection = await self.cost_rejection(capped, params)
+                if rejection is not None:
+                    report["status"] = "rejected"
+                    report["rejected_by"] = rejection["rejected_by"]
+                    report["reason"] = rejection["reason"]
+                else:
+                    # only admitted queries can be paged or exported by id
+                    report["query_id"] = query_registry.register(
+                        item.question, item.query, item.params, admitted=True
+                    )
+                    ok, result = await self.execute_query(
+                        capped,
+                        max_rows=MAX_RESULT_ROWS + 1,
+                        params=params,
+                        timeout_ms=self.statement_timeout_ms,
+                    )
+                    if not ok:
+                        self.logger.warning(f"Query execution failed for: {item.query}")
+                        report["status"] = "failed"
+                    else:
+                        # db_executor returns a list of dicts (one per row)
+                        if isinstance(result, list):
+                            rows = result[:MAX_RESULT_ROWS]
+                            report["truncated"] = len(result) > MAX_RESULT_ROWS
+                        report["status"] = "ok"
+            report["row_count"] = len(rows)
+            record_rows(len(rows))
+            report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self.logger.info(
+                f"Sub-query finished in {report['elapsed_ms']} ms "
+                f"({report['status']}, {report['row_count']} rows): {item.question}"
+            )
+            return rows, report
+
     async def handle_database_query(
-        self, questions: str, chat_history: list = None,
+        self, questions: str, chat_history: list = None, session: ChatSession | None = None,
     ) -> dict:
         if chat_history is None:
             chat_history = []
         self.logger.info(f"Handling database query for questions: {questions}")
         try:
-            queries = await asyncio.to_thread(self.write_query, questions, chat_history)
+            queries = await self.plan_queries(questions, chat_history, session)
+
+            # sub-queries run concurrently (bounded per request here, and
+            # globally by the DB executor pool); results keep the LLM's order
+            semaphore = asyncio.Semaphore(SUBQUERY_CONCURRENCY)
+            tasks = [
+                asyncio.create_task(self.run_sub_query(item, semaphore))
+                for item in queries
+            ]
+            try:
+                outcomes = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
 
             all_rows = []  # list of dicts from DB
-            for item in queries:
-                if not self.is_query_allowed(item.query):
-                    self.logger.warning(f"Blocked unsafe or invalid query: {item.query}")
-                    continue
-
-                ok, result = await self.execute_query(item.query)
-                if not ok:
-                    self.logger.warning(f"Query execution failed for: {item.query}")
-                    continue
-
-                # result from SQLDatabase._execute is usually a list of dicts or rows
-                # normalize to list of dicts
-                if isinstance(result, list):
-                    all_rows.extend(result)
+            sub_queries = []
+            for rows, report in outcomes:
+                all_rows.extend(rows)
+                sub_queries.append(report)
+            truncated = any(report.get("truncated") for report in sub_queries)
 
             if not all_rows:
                 return {
                     "success": False,
-                    "response": "No data was found for this request.",
+                    "response": _no_rows_message(sub_queries),
                     "rows": [],
+                    "sub_queries": sub_queries,
                 }
 
-            return {
+            result = {
                 "success": True,
-                "response": f"Found {len(all_rows)} row(s).",
+                "response": _found_rows_message(len(all_rows), truncated),
                 "rows": all_rows,
+                "truncated": truncated,
+                "sub_queries": sub_queries,
             }
+            if self.answer_stage:
+                results = [
+                    _result_text(rows, report["row_count"], report.get("truncated"))
+                    for rows, report in outcomes
+                ]
+                try:
+                    result["answer"] = await self.generate_answer(
+                        questions, queries, results, chat_history
+                    )
+                except Exception:
+                    # the rows are still worth returning without the answer
+                    result["answer"] = None
+            return result
 
         except Exception as e:
             self.logger.error(f"Error handling database query: {str(e)}")
@@ -325,11 +667,186 @@ class Chatbot:
 
 
 
-    async def process_query(self, question: str, chat_history: list = None) -> dict:
+    async def process_query(
+        self, question: str, chat_history: list = None, session_id: str | None = None
+    ) -> dict:
+        """
+        With `session_id`, the history comes from the server-side session
+        (any `chat_history` is ignored) and this turn is recorded in it.
+        """
+        session = self.sessions.get(session_id) if session_id else None
+        if session is not None:
+            chat_history = session.history()
         if chat_history is None:
             chat_history = []
         self.logger.info(f"Processing query: {question}")
-        return await self.handle_database_query(question, chat_history)
+        if self.in_flight is None:
+            result = await self.handle_database_query(question, chat_history, session)
+        else:
+            key = self.query_cache.make_key(question, chat_history)
+            result = await self.in_flight.do(
+                key, lambda: self.handle_database_query(question, chat_history, session)
+            )
+        if session is None:
+            return result
+        self.record_turn(
+            session, question, result.get("sub_queries"), result.get("response"),
+            len(result.get("rows") or []), result.get("answer"),
+        )
+        return {**result, "session_id": session.session_id}
+
+    def record_turn(self, session: ChatSession, question: str, sub_queries, summary, row_count, answer=None):
+        try:
+            session.add_turn(question, sub_queries, summary or "", row_count, answer)
+            self.sessions.save(session)
+        except Exception as e:
+            self.logger.error(f"Could not save chat session: {str(e)}")
+
+    # ---------- Streaming pipeline ----------
+
+    async def stream_sub_query(
+        self, index: int, item: QueryItem, semaphore: asyncio.Semaphore, events: asyncio.Queue
+    ):
+        """Like run_sub_query, but pushes row batches onto `events` as they are fetched."""
+        async with semaphore:
+            started = time.perf_counter()
+            report = {"index": index, "question": item.question, "query": item.query, "row_count": 0}
+            if item.params:
+                report["params"] = item.params
+            try:
+                rejection = self.query_rejection(item.query)
+                if rejection is not None:
+                    self.logger.warning(f"Blocked unsafe or invalid query: {item.query}")
+                    report["status"] = "blocked"
+                    report["reason"] = rejection
+                else:
+                    report["truncated"] = False
+                    sql, params, report["source"] = await self.route_query(item)
+                    capped = cap_query(sql, MAX_STREAM_ROWS + 1)
+                    rejection = await self.cost_rejection(capped, params)
+                    if rejection is not None:
+                        report["status"] = "rejected"
+                        report["rejected_by"] = rejection["rejected_by"]
+                        report["reason"] = rejection["reason"]
+                    else:
+                        report["query_id"] = query_registry.register(
+                            item.question, item.query, item.params, admitted=True
+                        )
+                        version = await self.data_version.current()
+                        cached = self.result_cache.get(fingerprint_sql(capped, params), version)
+                        record_cache("result_cache", "miss" if cached is None else "hit")
+                        batches = (
+                            _single_batch(cached) if cached is not None
+                            else db_executor.stream(capped, params, timeout_ms=self.statement_timeout_ms)
+                        )
+                        # includes time spent waiting for the client to take the rows
+                        with span("execute_query_stream"):
+                            async with aclosing(batches):
+                                async for batch in batches:
+                                    room = MAX_STREAM_ROWS - report["row_count"]
+                                    if len(batch) > room:
+                                        batch = batch[:room]
+                                        report["truncated"] = True
+                                    if batch:
+                                        report["row_count"] += len(batch)
+                                        await events.put(("rows", {"index": index, "rows": batch}))
+                                    if report["truncated"]:
+                                        break
+                        report["status"] = "ok"
+            except Exception as e:
+                self.logger.error(f"Error streaming query: {str(e)}")
+                report["status"] = "failed"
+            record_rows(report["row_count"])
+            report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            await events.put(("sub_query", report))
+
+    async def stream_database_query(
+        self, questions: str, chat_history: list = None, session_id: str | None = None
+    ):
+        """
+        Async generator of (event, data) pairs for the SSE endpoint: intent,
+        generated SQL, row batches as they come off the server-side cursors,
+        per-sub-query reports and a summary. With the answer stage on, the
+        summary is followed by `answer_token` chunks and a final `answer`.
+        With `session_id`, history comes from (and the turn is saved to) the
+        server-side session.
+        """
+        session = self.sessions.get(session_id) if session_id else None
+        if session is not None:
+            chat_history = session.history()
+        if chat_history is None:
+            chat_history = []
+        self.logger.info(f"Streaming database query for questions: {questions}")
+        tasks = []
+        try:
+            yield "intent", {"intent": "database_query"}
+            queries = await self.plan_queries(questions, chat_history, session)
+            for index, item in enumerate(queries):
+                yield "sql", {"index": index, "question": item.question, "query": item.query}
+
+            events = asyncio.Queue(maxsize=SUBQUERY_CONCURRENCY * 2)
+            semaphore = asyncio.Semaphore(SUBQUERY_CONCURRENCY)
+            tasks = [
+                asyncio.create_task(self.stream_sub_query(index, item, semaphore, events))
+                for index, item in enumerate(queries)
+            ]
+            sub_queries = [None] * len(tasks)
+            samples = [[] for _ in tasks]  # first rows of each sub-query, for the answer
+            total_rows = 0
+            while any(report is None for report in sub_queries):
+                event, data = await events.get()
+                if event == "sub_query":
+                    sub_queries[data["index"]] = data
+                elif event == "rows":
+                    total_rows += len(data["rows"])
+                    sample = samples[data["index"]]
+                    sample.extend(data["rows"][: ANSWER_SAMPLE_ROWS - len(sample)])
+                yield event, data
+
+            truncated = any(report.get("truncated") for report in sub_queries)
+            summary = {
+                "success": total_rows > 0,
+                "response": (
+                    _found_rows_message(total_rows, truncated)
+                    if total_rows else _no_rows_message(sub_queries)
+                ),
+                "row_count": total_rows,
+                "truncated": truncated,
+                "sub_queries": sub_queries,
+            }
+            if session is not None:
+                summary["session_id"] = session.session_id
+            yield "summary", summary
+            answer_text = None
+
+            if self.answer_stage and total_rows:
+                results = [
+                    _result_text(sample, report["row_count"], report.get("truncated"))
+                    for sample, report in zip(samples, sub_queries)
+                ]
+                try:
+                    answer = self.stream_answer(questions, queries, results, chat_history)
+                    async with aclosing(answer):
+                        async for chunk in answer:
+                            if isinstance(chunk, str):
+                                yield "answer_token", {"text": chunk}
+                            else:
+                                answer_text = chunk["response"]
+                                yield "answer", {"success": True, **chunk}
+                except Exception as e:
+                    self.logger.error(f"Error streaming answer: {str(e)}")
+                    yield "answer", {"success": False, "response": None}
+
+            if session is not None:
+                self.record_turn(
+                    session, questions, sub_queries, summary["response"], total_rows, answer_text
+                )
+        except Exception as e:
+            self.logger.error(f"Error streaming database query: {str(e)}")
+            yield "error", {"response": "An unexpected error occurred while processing your query."}
+        finally:
+            for task in tasks:
+                task.cancel()
 
 
 
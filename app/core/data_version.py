@@ -0,0 +1,87 @@
+import time
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from app.db import engine, db_executor
+
+
+DATA_VERSION_TABLE = "drt_data_version"
+
+CREATE_DATA_VERSION_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+BUMP_DATA_VERSION = f"""
+INSERT INTO {DATA_VERSION_TABLE} (id, version) VALUES (1, 1)
+ON CONFLICT (id) DO UPDATE
+SET version = {DATA_VERSION_TABLE}.version + 1, updated_at = now()
+RETURNING version
+"""
+
+
+def bump_data_version(connection) -> int:
+    """
+    Advance the data version inside the caller's transaction. Every data reload
+    must call this so cached results computed from the old data stop matching.
+    """
+    connection.execute(text(CREATE_DATA_VERSION_TABLE))
+    return connection.execute(text(BUMP_DATA_VERSION)).scalar_one()
+
+
+class DataVersion:
+    """
+    Token identifying the current generation of the case data: the row in
+    drt_data_version (re-read at most every `check_seconds`) plus a local epoch
+    that the admin invalidate endpoint advances.
+    """
+
+    def __init__(self, check_seconds: float = 30):
+        self.check_seconds = check_seconds
+        self.logger = logging.getLogger("DataVersion")
+        self._db_version = None
+        self._checked_at = 0.0
+        self._local_epoch = 0
+        self._lock = asyncio.Lock()
+
+    async def current(self) -> str:
+        if time.monotonic() - self._checked_at > self.check_seconds:
+            async with self._lock:
+                if time.monotonic() - self._checked_at > self.check_seconds:
+                    self._db_version = await self._read_db_version()
+                    self._checked_at = time.monotonic()
+        return f"{self._db_version}:{self._local_epoch}"
+
+    async def db_version(self):
+        """The shared (database) part of the token, or None if it cannot be read."""
+        await self.current()
+        return self._db_version
+
+    async def invalidate(self) -> str:
+        """Bump the shared version in the database (all workers) and locally."""
+        try:
+            self._db_version = await asyncio.to_thread(self._bump_db_version)
+            self._checked_at = time.monotonic()
+        except Exception as e:
+            self.logger.error(f"Could not bump {DATA_VERSION_TABLE}: {str(e)}")
+        self._local_epoch += 1
+        return await self.current()
+
+    async def _read_db_version(self):
+        try:
+            rows = await db_executor.run(
+                f"SELECT version FROM {DATA_VERSION_TABLE} WHERE id = 1", record=False
+            )
+            return rows[0]["version"] if rows else None
+        except Exception as e:
+            self.logger.warning(f"Could not read {DATA_VERSION_TABLE}: {str(e)}")
+            return None
+
+    def _bump_db_version(self) -> int:
+        with engine.begin() as connection:
+            return bump_data_version(connection)
@@ -0,0 +1,243 @@
+"""
+Bulk export of a registered query's full result.
+
+Only registry entries the chat admitted can be exported: they passed the
+allow-list, and the governor accepted them with the chat's row cap. The chat
+only ever EXPLAINed the capped statement, so the endpoint checks the
+uncapped SQL with the governor again before the export starts. This second
+check uses its own cost ceiling (EXPORT_MAX_COST). The query runs on a
+server-side cursor, and the file is written batch by batch, so memory stays
+flat whatever the row count is. There is no row cap. Instead, a longer
+statement timeout (EXPORT_STATEMENT_TIMEOUT_MS) applies, and at most
+EXPORT_MAX_CONCURRENT exports run at once. This keeps bulk pulls from taking
+every DB worker thread the chat needs.
+
+CSV is always available. Parquet needs the optional `pyarrow` package. Its
+column types come from the first batch, and values in later batches that do
+not fit a text column are written as text.
+"""
+import io
+import os
+import csv
+import asyncio
+import importlib.util
+from contextlib import aclosing
+
+from fastapi.responses import StreamingResponse
+
+from app.db import db_executor
+from app.core.pagination import strip_sql
+from app.core.result_format import UnsupportedFormat
+
+
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.getenv("EXPORT_STATEMENT_TIMEOUT_MS", "600000"))
+# Planner cost limit for the uncapped export query (the chat limit is QUERY_MAX_COST).
+EXPORT_MAX_COST = float(os.getenv("EXPORT_MAX_COST", "50000000"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+CSV = "csv"
+PARQUET = "parquet"
+
+# format -> (media type, module it needs)
+EXPORT_FORMATS = {
+    CSV: ("text/csv; charset=utf-8", None),
+    PARQUET: ("application/vnd.apache.parquet", "pyarrow"),
+}
+
+
+class ExportBusy(Exception):
+    pass
+
+
+def export_media_type(export_format: str) -> str:
+    """Media type of `export_format`; raises UnsupportedFormat when it cannot be produced here."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}.")
+    media_type, module = EXPORT_FORMATS[export_format]
+    if module and importlib.util.find_spec(module) is None:
+        raise UnsupportedFormat(f"{export_format} export needs the optional '{module}' package.")
+    return media_type
+
+
+async def export_rejection(bot, entry: dict) -> dict | None:
+    """The governor's verdict when it refuses the uncapped export of `entry`, or None."""
+    return await bot.cost_rejection(strip_sql(entry["query"]), entry["params"], max_cost=EXPORT_MAX_COST)
+
+
+async def _batches(entry: dict):
+    async for batch in db_executor.stream(
+        strip_sql(entry["query"]), entry["params"],
+        batch_size=EXPORT_BATCH_SIZE, timeout_ms=EXPORT_STATEMENT_TIMEOUT_MS or None,
+    ):
+        yield batch
+
+
+async def _columns(entry: dict) -> list[str]:
+    if entry["columns"] is None:
+        entry["columns"] = await db_executor.columns(strip_sql(entry["query"]), entry["params"])
+    return entry["columns"]
+
+
+async def csv_chunks(entry: dict):
+    """The result as CSV, one encoded chunk per fetched batch."""
+    columns = None
+    async with aclosing(_batches(entry)) as batches:
+        async for batch in batches:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if columns is None:
+                columns = list(batch[0])
+                writer.writerow(columns)
+            writer.writerows([row.get(column) for column in columns] for row in batch)
+            yield buffer.getvalue().encode("utf-8")
+    if columns is None:
+        # empty result: still send the header
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(await _columns(entry))
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands what was written back out in chunks."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _arrow_batch(pa, schema, batch: list[dict]):
+    arrays = []
+    for field in schema:
+        values = [row.get(field.name) for row in batch]
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if not pa.types.is_string(field.type):
+                raise
+            arrays.append(pa.array([None if value is None else str(value) for value in values], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+async def parquet_chunks(entry: dict):
+    """The result as a Parquet file, one row group (and chunk) per fetched batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    try:
+        async with aclosing(_batches(entry)) as batches:
+            async for batch in batches:
+                if writer is None:
+                    inferred = pa.Table.from_pylist(batch).schema
+                    # a column that is all NULL in the first batch can still hold text later
+                    schema = pa.schema([
+                        pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                        for field in inferred
+                    ])
+                    writer = pq.ParquetWriter(sink, schema)
+                writer.write_table(_arrow_batch(pa, schema, batch))
+                yield sink.drain()
+        if writer is None:
+            schema = pa.schema([pa.field(name, pa.string()) for name in await _columns(entry)])
+            writer = pq.ParquetWriter(sink, schema)
+        writer.close()
+        writer = None
+        yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+class ExportLimiter:
+    """Caps how many exports hold a DB worker thread at once."""
+
+    def __init__(self, max_concurrent: int = EXPORT_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self.running = 0
+
+    def acquire(self):
+        if self.running >= self.max_concurrent:
+            raise ExportBusy(f"{self.running} exports are already running; try again shortly.")
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+
+
+export_limiter = ExportLimiter()
+
+
+async def export_chunks(entry: dict, export_format: str):
+    """
+    Chunks of the exported file, and an async `close` that stops the query
+    and frees the export slot. The first chunk is fetched before this
+    returns, so a failing statement can still get an error response
+    instead of a truncated download. `close` must be awaited once the
+    response is over, whether or not the body was sent (ExportResponse does
+    this); awaiting it again does nothing.
+    """
+    export_limiter.acquire()
+    chunks = parquet_chunks(entry) if export_format == PARQUET else csv_chunks(entry)
+    try:
+        first = await anext(chunks)
+    except BaseException:
+        await chunks.aclose()
+        export_limiter.release()
+        raise
+
+    closed = False
+
+    async def close():
+        nonlocal closed
+        if closed:
+            return
+        closed = True
+        try:
+            await chunks.aclose()
+        finally:
+            export_limiter.release()
+
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await close()
+
+    return body(), close
+
+
+class ExportResponse(StreamingResponse):
+    """
+    StreamingResponse that awaits the export's `close` when the response
+    ends, also when the client disconnects or the body is never sent.
+    """
+
+    def __init__(self, content, close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.close = close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.close()
@@ -0,0 +1,129 @@
+"""
+Local stand-in for an LLM provider, for load tests and router experiments.
+
+FakeChatModel answers after a configurable (jittered) latency and can fail a
+fraction of calls. Its replies are shaped for the prompt it receives, so the
+whole chat pipeline runs end to end without a real model:
+
+    LLM_PROVIDER=fake                      # one fake provider
+    LLM_PROVIDERS=fake:80,fake:400:0.1     # router over a fast and a slow, flaky one
+
+Set FAKE_LLM_SEED to make the latencies and injected failures repeatable.
+FAKE_LLM_QUERIES names a JSON file of {question: SQL} (see
+bench/fake_queries.json). Questions found there get their canned SQL, with
+{case_table} and {case_type_table} filled in. Any other question gets a
+plain count of cases.
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+
+from app.table_info import CASE_SERVING_VIEW, CASE_TYPE_TABLE
+from app.core.query_cache import normalize_question
+
+
+class FakeProviderError(RuntimeError):
+    pass
+
+
+def load_fake_queries(path: str | None) -> dict[str, str]:
+    """Canned SQL by normalized question, from a JSON file of {question: SQL}."""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as handle:
+        queries = json.load(handle)
+    return {
+        normalize_question(question): sql.format(case_table=CASE_SERVING_VIEW, case_type_table=CASE_TYPE_TABLE)
+        for question, sql in queries.items()
+    }
+
+
+def fake_reply(prompt: str, queries: dict[str, str] | None = None) -> str:
+    """A plausible reply for one of the chatbot's prompts; `queries` is from load_fake_queries."""
+    if "'general_query' or 'database_query'" in prompt:
+        return "database_query"
+    if '"queries"' in prompt:
+        question = re.search(r'User question:\s*"(.*)"', prompt, re.DOTALL)
+        question = question.group(1).strip() if question else "How many cases are there?"
+        query = (queries or {}).get(normalize_question(question))
+        return json.dumps({"queries": [{
+            "question": question,
+            "query": query or f"SELECT COUNT(DISTINCT diary_no) AS case_count FROM {CASE_SERVING_VIEW}",
+        }]})
+    return "Here is a summary of the matching cases based on the data found."
+
+
+class FakeChatModel(BaseChatModel):
+    latency_ms: float = 100.0
+    jitter: float = 0.2
+    error_rate: float = 0.0
+    # delay between streamed tokens
+    token_delay_ms: float = 5.0
+    name: str = "fake"
+    seed: int | None = None
+    # normalized question -> canned SQL (see load_fake_queries)
+    queries: dict[str, str] = Field(default_factory=dict)
+    _rng: random.Random | None = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def rng(self) -> random.Random:
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        return self._rng
+
+    def _delay(self) -> float:
+        spread = self.latency_ms * self.jitter
+        return max(0.0, self.rng.uniform(self.latency_ms - spread, self.latency_ms + spread)) / 1000
+
+    def _reply(self, messages: list[BaseMessage]) -> str:
+        if self.rng.random() < self.error_rate:
+            raise FakeProviderError(f"{self.name}: injected failure")
+        return fake_reply("\n".join(str(m.content) for m in messages), self.queries)
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._delay())
+        for token in re.findall(r"\S+\s*", self._reply(messages)):
+            time.sleep(self.token_delay_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._delay())
+        for token in re.findall(r"\S+\s*", self._reply(messages)):
+            await asyncio.sleep(self.token_delay_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def create_fake_llm(spec: str = "fake") -> FakeChatModel:
+    """Build from 'fake[:latency_ms[:error_rate]]'."""
+    parts = spec.split(":")
+    seed = os.getenv("FAKE_LLM_SEED")
+    return FakeChatModel(
+        name=spec,
+        latency_ms=float(parts[1]) if len(parts) > 1 and parts[1] else 100.0,
+        error_rate=float(parts[2]) if len(parts) > 2 and parts[2] else 0.0,
+        seed=int(seed) if seed else None,
+        queries=load_fake_queries(os.getenv("FAKE_LLM_QUERIES")),
+    )
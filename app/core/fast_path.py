@@ -0,0 +1,271 @@
+"""
+Rule-based NL-to-SQL for the fixed question shapes in the `help` file.
+
+Recognized questions get parameterized SQL straight away, without an LLM
+round trip; anything else returns None and goes to Chatbot.write_query.
+Values from the question are always bound as parameters, never inlined.
+"""
+import re
+import logging
+import threading
+from collections import Counter
+
+from app.table_info import CASE_SERVING_VIEW
+
+
+# Columns returned for "show cases ..." questions, as WRITE_QUERY_PROMPT asks.
+ROW_COLUMNS = (
+    "diary_no, case_no, filing_no, petitioner_name, respondent_name, drt_name, "
+    "case_status, case_filing_date, case_disposed_off_date, disposal_diffdays, "
+    "doc_name, document_upload_url"
+)
+
+# A value is either quoted (anything inside the quotes) or bare; bare values
+# are checked against BARE_NAME / BARE_DRT in FastPathParser.parse.
+_VALUE = r"(?:(?P<{name}_quote>['\"])(?P<{name}>[^'\"]+)(?P={name}_quote)|(?P<{name}_bare>[^'\"]+))"
+# Diary, filing and case numbers: one token, nothing after it.
+_IDENT = r"['\"]?(?P<{name}>[A-Za-z0-9][\w/.-]*)['\"]?"
+_DATE = r"(?P<{name}>\d{{4}}-\d{{2}}-\d{{2}})"
+_YEAR = r"(?P<{name}>(?:19|20)\d{{2}})"
+
+_WORD = r"[A-Za-z][A-Za-z.&'/()-]*"
+# Unquoted party names: up to 8 words, no digits.
+BARE_NAME = re.compile(rf"{_WORD}(?: {_WORD}){{0,7}}")
+# Unquoted tribunal names may end in a bench number glued on ("chandigarh1", "Delhi-2").
+_DRT_WORD = rf"{_WORD}?\d{{0,2}}"
+BARE_DRT = re.compile(rf"{_DRT_WORD}(?: {_DRT_WORD}){{0,3}}")
+
+
+def _value(name: str) -> str:
+    return _VALUE.format(name=name)
+
+
+def _ident(name: str) -> str:
+    return _IDENT.format(name=name)
+
+
+def _date(name: str) -> str:
+    return _DATE.format(name=name)
+
+
+def _year(name: str) -> str:
+    return _YEAR.format(name=name)
+
+
+def like_pattern(value: str) -> str:
+    """'%value%' for LIKE, with LIKE wildcards in the user's text escaped."""
+    escaped = value.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _like(column: str, param: str) -> str:
+    return f"LOWER({column}) LIKE LOWER(:{param})"
+
+
+class Template:
+    def __init__(self, name: str, pattern: str, build):
+        self.name = name
+        self.regex = re.compile(rf"^{pattern}$", re.IGNORECASE)
+        self.build = build
+
+
+def _count(where: str) -> str:
+    # a case has one row per document; "how many cases" counts diary numbers
+    return f"SELECT COUNT(DISTINCT diary_no) AS case_count FROM {CASE_SERVING_VIEW} WHERE {where}"
+
+
+def _rows(where: str, columns: str = ROW_COLUMNS) -> str:
+    return f"SELECT {columns} FROM {CASE_SERVING_VIEW} WHERE {where}"
+
+
+TEMPLATES = [
+    Template(
+        "count_by_drt_disposed_year",
+        rf"how many cases (?:in|for|from|belonging to) drt {_value('drt')} were disposed (?:of )?in {_year('year')}",
+        lambda m: (
+            _count(f"{_like('drt_name', 'drt')} AND case_status = 'D' AND disposal_year = :year"),
+            {"drt": like_pattern(m["drt"]), "year": int(m["year"])},
+        ),
+    ),
+    Template(
+        "count_by_drt",
+        rf"how many cases (?:are |were )?(?:in|for|from|belong to|belonging to) drt {_value('drt')}",
+        lambda m: (_count(_like("drt_name", "drt")), {"drt": like_pattern(m["drt"])}),
+    ),
+    Template(
+        "count_filed_year",
+        rf"how many cases (?:were|are) filed in {_year('year')}",
+        lambda m: (_count("filing_year = :year"), {"year": int(m["year"])}),
+    ),
+    Template(
+        "count_disposed_year",
+        rf"how many cases (?:were disposed (?:of )?in|have disposal_?date in|have disposal date in) {_year('year')}",
+        lambda m: (
+            _count("case_status = 'D' AND disposal_year = :year"),
+            {"year": int(m["year"])},
+        ),
+    ),
+    Template(
+        "count_by_party",
+        rf"how many cases (?:are |were )?(?:from|of|filed by) {_value('party')}",
+        lambda m: (_count(_like("petitioner_name", "party")), {"party": like_pattern(m["party"])}),
+    ),
+    Template(
+        "details_by_diary_no",
+        rf"show (?:the )?(?:full )?details (?:for|of) (?:case with )?diary (?:number|no\.?) {_ident('diary_no')}",
+        lambda m: (
+            f"SELECT * FROM {CASE_SERVING_VIEW} WHERE diary_no = :diary_no",
+            {"diary_no": m["diary_no"].strip()},
+        ),
+    ),
+    Template(
+        "details_by_filing_no",
+        rf"show (?:the )?(?:full )?details (?:for|of) (?:case with )?filing[_ ](?:no|number) {_ident('filing_no')}",
+        lambda m: (
+            f"SELECT * FROM {CASE_SERVING_VIEW} WHERE filing_no = :filing_no",
+            {"filing_no": m["filing_no"].strip()},
+        ),
+    ),
+    Template(
+        "details_by_case_no",
+        rf"show (?:the )?(?:full )?details (?:for|of) case[_ ](?:no|number) {_ident('case_no')}",
+        lambda m: (
+            f"SELECT * FROM {CASE_SERVING_VIEW} WHERE case_no = :case_no",
+            {"case_no": m["case_no"].strip()},
+        ),
+    ),
+    Template(
+        "cases_filed_between",
+        rf"(?:show|list) (?:all )?cases filed between {_date('start')} and {_date('end')}",
+        lambda m: (
+            _rows("case_filing_date BETWEEN :start AND :end"),
+            {"start": m["start"], "end": m["end"]},
+        ),
+    ),
+    Template(
+        "cases_disposed_between",
+        rf"(?:show|list) (?:all )?cases with disposal[_ ]date between {_date('start')} and {_date('end')}",
+        lambda m: (
+            _rows("case_disposed_off_date BETWEEN :start AND :end"),
+            {"start": m["start"], "end": m["end"]},
+        ),
+    ),
+    Template(
+        "cases_by_petitioner",
+        rf"(?:show|list) (?:all )?cases where (?:the )?petitioner is {_value('party')}",
+        lambda m: (_rows(_like("petitioner_name", "party")), {"party": like_pattern(m["party"])}),
+    ),
+    Template(
+        "cases_filed_by",
+        rf"(?:show|list) (?:all )?cases filed by {_value('party')}",
+        lambda m: (_rows(_like("petitioner_name", "party")), {"party": like_pattern(m["party"])}),
+    ),
+    Template(
+        "cases_by_respondent",
+        rf"(?:show|list) (?:all )?cases where (?:the )?respondent is {_value('party')}",
+        lambda m: (_rows(_like("respondent_name", "party")), {"party": like_pattern(m["party"])}),
+    ),
+    Template(
+        "cases_by_document_text",
+        rf"(?:show|list) (?:all )?cases where (?P<column>doc_name|master_doc_name|document_upload_url) "
+        rf"(?:contains|is) {_value('text')}",
+        lambda m: (
+            _rows(_like(m["column"].lower(), "text")),
+            {"text": like_pattern(m["text"])},
+        ),
+    ),
+    Template(
+        "cases_by_master_doc_name",
+        rf"(?:show|list) (?:all )?cases which have {_value('text')} as master_doc_name",
+        lambda m: (_rows(_like("master_doc_name", "text")), {"text": like_pattern(m["text"])}),
+    ),
+    Template(
+        "cases_by_drt",
+        rf"(?:show|list) (?:all )?cases (?:belonging to|for|in) drt {_value('drt')}",
+        lambda m: (_rows(_like("drt_name", "drt")), {"drt": like_pattern(m["drt"])}),
+    ),
+]
+
+
+# An unquoted value containing one of these words is more likely a further
+# condition ("SBI in 2024", "DRT x where ...") than part of a name, so leave
+# it to the LLM.
+# Quantifiers ("each DRT", "all banks"), relative times ("today", "last
+# year") and kinds of party ("private banks") are conditions too.
+_CLAUSE_WORDS = re.compile(
+    r"\b(?:where|and|or|with|whose|which|that|between|not|null|greater|less|than|were|was"
+    r"|are|is|be|been|pending|disposed|filed|listed|registered|status|in|after|before|from"
+    r"|by|on|since|during|until|till|vs|versus|against|year|month|cases?|how|many"
+    r"|each|every|all|any|today|yesterday|tomorrow|this|last|week|private|public|drts?)\b",
+    re.IGNORECASE,
+)
+
+# Seats of the Debt Recovery Tribunals. A bare party value that is just one
+# of these ("from Chandigarh") asks about a tribunal, not a petitioner.
+DRT_LOCATIONS = (
+    "ahmedabad", "allahabad", "aurangabad", "bangalore", "bengaluru", "chandigarh", "chennai",
+    "coimbatore", "cuttack", "dehradun", "delhi", "ernakulam", "guwahati", "hyderabad",
+    "jabalpur", "jaipur", "kolkata", "lucknow", "madurai", "mumbai", "nagpur", "patna",
+    "pune", "ranchi", "siliguri", "visakhapatnam",
+)
+_DRT_LOCATION = re.compile(rf"(?:{'|'.join(DRT_LOCATIONS)})[\s-]*\d{{0,2}}", re.IGNORECASE)
+
+
+def normalize(question: str) -> str:
+    text = re.sub(r"\s+", " ", (question or "").strip())
+    return text.rstrip(" ?.!")
+
+
+class FastPathParser:
+    """Matches a question against TEMPLATES and counts how often that works."""
+
+    def __init__(self, templates: list[Template] = None):
+        self.templates = templates if templates is not None else TEMPLATES
+        self.hits = 0
+        self.misses = 0
+        self.template_hits = Counter()
+        self.logger = logging.getLogger("FastPathParser")
+        self._lock = threading.Lock()
+
+    def parse(self, question: str) -> tuple[str, str, dict] | None:
+        """(template name, SQL, bind parameters) for a recognized question, else None."""
+        text = normalize(question)
+        for template in self.templates:
+            match = template.regex.match(text)
+            slots = self._slots(match) if match else None
+            if slots is not None:
+                sql, params = template.build(slots)
+                with self._lock:
+                    self.hits += 1
+                    self.template_hits[template.name] += 1
+                self.logger.info(f"Fast path '{template.name}' matched: {question}")
+                return template.name, sql, params
+        with self._lock:
+            self.misses += 1
+        return None
+
+    @staticmethod
+    def _slots(match: re.Match) -> dict | None:
+        """The match's values by slot name, or None when a bare value is not plainly a name."""
+        slots = {}
+        for name, value in match.groupdict().items():
+            if name.endswith("_quote") or value is None:
+                continue
+            if name.endswith("_bare"):
+                name = name[: -len("_bare")]
+                pattern = BARE_DRT if name == "drt" else BARE_NAME
+                if not pattern.fullmatch(value) or _CLAUSE_WORDS.search(value):
+                    return None
+                if name == "party" and _DRT_LOCATION.fullmatch(value.strip()):
+                    return None
+            slots[name] = value
+        return slots
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "templates": dict(self.template_hits),
+        }
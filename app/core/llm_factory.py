@@ -1,29 +1,119 @@
 # app/core/llm_factory.py
 import os
+import logging
+import importlib.util
 from langchain_core.language_models import BaseChatModel
-from langchain_community.chat_models import ChatOllama
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
 import httpx
 
-def create_llm() -> BaseChatModel:
-    provider = os.getenv("LLM_PROVIDER", "ollama").lower()
+from app.core.fake_llm import create_fake_llm
+from app.core.llm_router import LLMRouter
+
+logger = logging.getLogger("llm_factory")
+
+# Connection pool shared by every request to the LLM provider. The chatbot
+# awaits `ainvoke`/`astream` on these clients, so concurrency is bounded by
+# the pool rather than by the default thread pool.
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "30"))
+LLM_HTTP_TIMEOUT_SECONDS = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "30"))
+# HTTP/2 needs the optional `h2` package (pip install "httpx[http2]").
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+
+_http_clients: dict[str, httpx.Client | httpx.AsyncClient] = {}
+
+
+def http_client_options(verify: bool = True) -> dict:
+    """httpx keyword arguments for the pooled LLM clients."""
+    http2 = LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+    if LLM_HTTP2 and not http2:
+        logger.info("h2 is not installed; LLM clients use HTTP/1.1 keep-alive.")
+    return {
+        "timeout": httpx.Timeout(LLM_HTTP_TIMEOUT_SECONDS),
+        "limits": httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_SECONDS,
+        ),
+        "http2": http2,
+        "verify": verify,
+    }
+
+
+def _shared_client(name: str, client_class, verify: bool):
+    if name not in _http_clients:
+        _http_clients[name] = client_class(**http_client_options(verify))
+    return _http_clients[name]
+
+
+async def close_http_clients():
+    """Close the pooled clients; call on application shutdown."""
+    for client in list(_http_clients.values()):
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+        else:
+            client.close()
+    _http_clients.clear()
+
+
+def create_provider(provider: str) -> BaseChatModel:
+    """
+    One chat model for `provider` (ollama, gemini, groq or fake[:latency_ms[:error_rate]]).
+    Each provider's SDK is imported only when that provider is selected.
+    """
+    provider = provider.strip().lower()
 
     if provider == "ollama":
+        from langchain_ollama import ChatOllama
+
         model = os.getenv("OLLAMA_MODEL", "gpt-oss:120b")
-        return ChatOllama(model=model,temperature=0.2,)
+        # the ollama client builds its own httpx clients from these options
+        return ChatOllama(model=model, temperature=0.2, client_kwargs=http_client_options())
 
     if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        # uses the Google client's own (gRPC) channel, which is natively async
         api_key = os.getenv("GEMINI_API_KEY")
         model = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
         return ChatGoogleGenerativeAI(model=model,api_key=api_key,)
 
     if provider == "groq":
+        from langchain_groq import ChatGroq
+
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY not set")
         model = os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile")
-        insecure_client = httpx.Client(verify=False, timeout=30.0)
-        return ChatGroq(model=model,api_key=api_key,http_client=insecure_client,)
+        # certificate verification stays off by default, as before
+        verify = os.getenv("GROQ_VERIFY_SSL", "false").lower() == "true"
+        return ChatGroq(
+            model=model,
+            api_key=api_key,
+            http_client=_shared_client("groq", httpx.Client, verify),
+            http_async_client=_shared_client("groq_async", httpx.AsyncClient, verify),
+        )
+
+    if provider == "fake" or provider.startswith("fake:"):
+        return create_fake_llm(provider)
 
     raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+
+
+def create_llm() -> BaseChatModel | LLMRouter:
+    """
+    The chat model named by LLM_PROVIDER, or, when LLM_PROVIDERS lists several
+    (e.g. "ollama,groq,gemini"), an LLMRouter over all of them.
+    """
+    providers = [p.strip() for p in os.getenv("LLM_PROVIDERS", "").split(",") if p.strip()]
+    if len(providers) <= 1:
+        return create_provider(providers[0] if providers else os.getenv("LLM_PROVIDER", "ollama"))
+
+    return LLMRouter(
+        {provider: create_provider(provider) for provider in providers},
+        window=int(os.getenv("LLM_ROUTER_WINDOW", "50")),
+        max_error_rate=float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5")),
+        cooldown_seconds=float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "30")),
+        hedge=os.getenv("LLM_HEDGE", "false").lower() == "true",
+        hedge_min_delay_seconds=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250")) / 1000,
+    )
@@ -0,0 +1,221 @@
+"""
+Routes LLM calls across several providers by observed latency and health.
+
+Every provider keeps a rolling window of call latencies and outcomes. A call
+goes to the healthy provider with the lowest median latency (providers with
+too few samples are tried first so they get measured). A provider whose
+error rate in the window crosses the threshold is skipped for a cooldown.
+Failed calls fail over to the next provider. With hedging on, a second
+provider is asked as well once the first has taken longer than its own p95,
+and whichever answers first wins. The loser is cancelled and recorded with
+the time it had taken so far, a lower bound on its latency, so a slow
+provider that keeps losing hedges still gets measured and ranked down.
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+
+
+class ProviderStats:
+    def __init__(self, window: int):
+        self.samples: deque[tuple[float, bool]] = deque(maxlen=window)
+        self.unhealthy_until = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.hedge_wins = 0
+
+    def record(self, seconds: float, ok: bool):
+        self.samples.append((seconds, ok))
+        self.calls += 1
+        if not ok:
+            self.failures += 1
+
+    def latency(self, quantile: float) -> float | None:
+        latencies = sorted(seconds for seconds, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+
+class LLMRouter:
+    """Duck-types the chat model methods the chatbot uses (invoke/ainvoke/astream)."""
+
+    def __init__(
+        self,
+        providers: dict,
+        window: int = 50,
+        min_samples: int = 3,
+        max_error_rate: float = 0.5,
+        cooldown_seconds: float = 30.0,
+        hedge: bool = False,
+        hedge_min_delay_seconds: float = 0.25,
+    ):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider.")
+        self.providers = providers
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.hedge = hedge
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.logger = logging.getLogger("LLMRouter")
+        self._stats = {name: ProviderStats(window) for name in providers}
+
+    @property
+    def primary(self):
+        """The configured first provider, for code that needs one concrete model."""
+        return next(iter(self.providers.values()))
+
+    def ranked(self) -> list[str]:
+        """Provider names, best first; providers in cooldown go last."""
+        now = time.monotonic()
+
+        def key(name):
+            stats = self._stats[name]
+            cooling = stats.unhealthy_until > now
+            measured = len(stats.samples) >= self.min_samples
+            return (cooling, measured, stats.latency(0.5) or 0.0)
+
+        return sorted(self.providers, key=key)
+
+    # ---------- calls ----------
+
+    async def ainvoke(self, prompt, **kwargs):
+        order, tried = self.ranked(), set()
+        last_error = None
+        while order:
+            backup = order[1] if self.hedge and len(order) > 1 else None
+            try:
+                _, response = await self._hedged(order[0], backup, prompt, kwargs, tried)
+                return response
+            except Exception as e:
+                last_error = e
+                self.logger.warning(f"LLM provider(s) {sorted(tried)} failed ({str(e)}); trying the next one.")
+            order = [name for name in order if name not in tried]
+        raise last_error
+
+    def invoke(self, prompt, **kwargs):
+        last_error = None
+        for name in self.ranked():
+            started = time.monotonic()
+            try:
+                response = self.providers[name].invoke(prompt, **kwargs)
+            except Exception as e:
+                self._record(name, started, ok=False)
+                last_error = e
+                continue
+            self._record(name, started, ok=True)
+            return response
+        raise last_error
+
+    async def astream(self, prompt, **kwargs):
+        """Stream from the best provider, failing over only before the first chunk."""
+        last_error = None
+        for name in self.ranked():
+            started = time.monotonic()
+            yielded = False
+            try:
+                async for chunk in self.providers[name].astream(prompt, **kwargs):
+                    if not yielded:
+                        # time to first token is what routing should optimize here
+                        self._record(name, started, ok=True)
+                        yielded = True
+                    yield chunk
+                return
+            except Exception as e:
+                if yielded:
+                    raise
+                self._record(name, started, ok=False)
+                last_error = e
+        raise last_error
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            name: {
+                "calls": stats.calls,
+                "failures": stats.failures,
+                "error_rate": round(stats.error_rate, 4),
+                "p50_ms": _ms(stats.latency(0.5)),
+                "p95_ms": _ms(stats.latency(0.95)),
+                "cooling_down": stats.unhealthy_until > now,
+                "hedge_wins": stats.hedge_wins,
+            }
+            for name, stats in self._stats.items()
+        }
+
+    # ---------- internals ----------
+
+    async def _call(self, name: str, prompt, kwargs, tried: set):
+        tried.add(name)
+        started = time.monotonic()
+        try:
+            response = await self.providers[name].ainvoke(prompt, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._record(name, started, ok=False)
+            raise
+        self._record(name, started, ok=True)
+        return name, response
+
+    async def _hedged(self, name: str, backup: str | None, prompt, kwargs, tried: set):
+        first = asyncio.create_task(self._call(name, prompt, kwargs, tried))
+        tasks = {first}
+        # task -> (provider, start), to record the loser of a hedge
+        started = {first: (name, time.monotonic())}
+        try:
+            if backup is not None:
+                done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay(name))
+                if not done:
+                    self.logger.info(f"{name} is slow; hedging with {backup}.")
+                    second = asyncio.create_task(self._call(backup, prompt, kwargs, tried))
+                    tasks.add(second)
+                    started[second] = (backup, time.monotonic())
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner, response = task.result()
+                        if winner == backup:
+                            self._stats[backup].hedge_wins += 1
+                        for loser in tasks:
+                            # censored sample: it would have taken at least this long
+                            self._record(*started[loser], ok=True)
+                        return winner, response
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _hedge_delay(self, name: str) -> float:
+        p95 = self._stats[name].latency(0.95)
+        return max(self.hedge_min_delay_seconds, p95 or 0.0)
+
+    def _record(self, name: str, started: float, ok: bool):
+        stats = self._stats[name]
+        stats.record(time.monotonic() - started, ok)
+        if (
+            not ok
+            and len(stats.samples) >= self.min_samples
+            and stats.error_rate > self.max_error_rate
+            and stats.unhealthy_until <= time.monotonic()
+        ):
+            stats.unhealthy_until = time.monotonic() + self.cooldown_seconds
+            self.logger.warning(
+                f"LLM provider {name} error rate {stats.error_rate:.0%}; "
+                f"cooling down for {self.cooldown_seconds:.0f}s."
+            )
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 1)
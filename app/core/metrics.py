@@ -0,0 +1,273 @@
+"""
+Per-stage latency and counters for the chat pipeline.
+
+`span("write_query")` times a block. The duration always goes to the
+process-wide `drt_stage_seconds` histogram, and also to the request's
+timing block when a trace is active (see `trace()`). The trace is kept in
+a context variable, so sub-query tasks and DB worker threads started for a
+request report into it as well.
+
+`render()` produces the Prometheus text exposition format served on
+/metrics. The registry is per process: with several uvicorn workers, each
+scrape sees one worker.
+"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+
+from app.core.prompt_builder import estimate_tokens
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # per label set: [bucket counts..., sum, count]
+        self._values: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            entry = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    labels = _label_text(self.labelnames, key, f'le="{_number(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_text(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_number(entry[-2])}")
+                lines.append(f"{self.name}_count{labels} {entry[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[Counter | Histogram] = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "drt_request_seconds", "End-to-end chat request latency.", ("endpoint",)
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "drt_stage_seconds", "Time spent in each pipeline stage.", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "drt_stage_errors_total", "Pipeline stages that raised.", ("stage",)
+)
+LLM_TOKENS = REGISTRY.histogram(
+    "drt_llm_tokens", "Tokens per LLM call (provider-reported, else estimated).",
+    ("call", "direction"), buckets=TOKEN_BUCKETS,
+)
+ROWS_RETURNED = REGISTRY.histogram(
+    "drt_rows_returned", "Rows returned per sub-query.", buckets=ROW_BUCKETS
+)
+DB_WAIT_SECONDS = REGISTRY.histogram(
+    "drt_db_wait_seconds",
+    "Time a statement waited for a DB worker thread (executor) or a pooled connection (connection).",
+    ("kind",),
+)
+CACHE_EVENTS = REGISTRY.counter(
+    "drt_cache_events_total", "Cache and shortcut outcomes.", ("cache", "outcome")
+)
+
+
+class Trace:
+    """What one request spent its time on; returned as the optional timing block."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        self.stages: dict[str, float] = defaultdict(float)
+        self.llm_tokens: dict[str, int] = defaultdict(int)
+        self.db_wait_ms: dict[str, float] = defaultdict(float)
+        self.cache: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] += seconds * 1000
+
+    def add_tokens(self, direction: str, tokens: int):
+        with self._lock:
+            self.llm_tokens[direction] += tokens
+
+    def add_rows(self, count: int):
+        with self._lock:
+            self.rows += count
+
+    def add_db_wait(self, kind: str, seconds: float):
+        with self._lock:
+            self.db_wait_ms[kind] += seconds * 1000
+
+    def count_cache(self, cache: str, outcome: str):
+        with self._lock:
+            self.cache[cache][outcome] += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "total_ms": round(((self.finished or time.perf_counter()) - self.started) * 1000, 2),
+                # summed per stage; concurrent sub-queries can add up to more than the total
+                "stages": {stage: round(ms, 2) for stage, ms in self.stages.items()},
+                "llm_tokens": dict(self.llm_tokens),
+                "rows": self.rows,
+                "db_wait_ms": {kind: round(ms, 2) for kind, ms in self.db_wait_ms.items()},
+                "cache": {cache: dict(outcomes) for cache, outcomes in self.cache.items()},
+            }
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar(
+    "drt_trace", default=None
+)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(endpoint: str):
+    """Collect a Trace for the request running inside this block."""
+    active = Trace()
+    token = _current_trace.set(active)
+    try:
+        yield active
+    finally:
+        _current_trace.reset(token)
+        active.finished = time.perf_counter()
+        REQUEST_SECONDS.observe(active.finished - active.started, endpoint=endpoint)
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    active = _current_trace.get()
+    if active is not None:
+        active.add_stage(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def record_llm_tokens(call: str, prompt: str, response=None, completion: str | None = None):
+    """Token counts of one LLM call; uses the provider's usage metadata when it has any."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if completion is None:
+        completion = str(getattr(response, "content", "") or "")
+    counts = {
+        "prompt": usage.get("input_tokens") or estimate_tokens(prompt),
+        "completion": usage.get("output_tokens") or estimate_tokens(completion),
+    }
+    active = _current_trace.get()
+    for direction, tokens in counts.items():
+        LLM_TOKENS.observe(tokens, call=call, direction=direction)
+        if active is not None:
+            active.add_tokens(direction, tokens)
+
+
+def record_rows(count: int):
+    ROWS_RETURNED.observe(count)
+    active = _current_trace.get()
+    if active is not None:
+        active.add_rows(count)
+
+
+def record_db_wait(kind: str, seconds: float):
+    DB_WAIT_SECONDS.observe(seconds, kind=kind)
+    active = _current_trace.get()
+    if active is not None:
+        active.add_db_wait(kind, seconds)
+
+
+def record_cache(cache: str, outcome: str):
+    CACHE_EVENTS.inc(cache=cache, outcome=outcome)
+    active = _current_trace.get()
+    if active is not None:
+        active.count_cache(cache, outcome)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,192 @@
+import os
+import json
+import base64
+import threading
+from collections import OrderedDict
+
+from app.db import db_executor
+from app.core.result_cache import fingerprint_sql
+from app.core.sql_analysis import parse_sql
+from app.core.query_governor import QUERY_STATEMENT_TIMEOUT_MS
+from app.table_info import CASE_SERVING_VIEW
+
+
+# Rows returned for one sub-query in a chat answer (/api/chat).
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", "1000"))
+# Rows streamed for one sub-query over /api/chat/stream.
+MAX_STREAM_ROWS = int(os.getenv("MAX_STREAM_ROWS", "10000"))
+# Largest page the pagination API hands out.
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+# Unique, non-NULL column of the serving view used as the keyset for paging.
+PAGINATION_KEY = os.getenv("PAGINATION_KEY", "serving_row_id")
+# Deepest row LIMIT/OFFSET paging reaches; past it, export the result instead.
+MAX_PAGE_OFFSET = int(os.getenv("MAX_PAGE_OFFSET", "100000"))
+
+
+class PageRejected(Exception):
+    """The governor refused the OFFSET page query; `verdict` says why."""
+
+    def __init__(self, verdict: dict):
+        super().__init__(verdict["reason"])
+        self.verdict = verdict
+
+
+def strip_sql(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def cap_query(sql: str, limit: int) -> str:
+    """Limit a SELECT so the database itself stops after `limit` rows."""
+    return parse_sql(sql).with_limit(limit)
+
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str | None) -> dict:
+    if not cursor:
+        return {}
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid pagination cursor.")
+
+
+def cursor_offset(state: dict) -> int:
+    """The row offset in a decoded cursor, checked to be an int in 0..MAX_PAGE_OFFSET."""
+    offset = state.get("offset", 0)
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid pagination cursor.")
+    if offset > MAX_PAGE_OFFSET:
+        raise ValueError(
+            f"Paging stops after {MAX_PAGE_OFFSET} rows for this query; export the result instead."
+        )
+    return offset
+
+
+def keyset_column(sql: str) -> str | None:
+    """
+    PAGINATION_KEY when `sql` returns it unchanged, one row per serving view
+    row, so it is unique in the result; otherwise None.
+    """
+    if parse_sql(strip_sql(sql)).rows_unique_on(PAGINATION_KEY, CASE_SERVING_VIEW):
+        return PAGINATION_KEY
+    return None
+
+
+def keyset_page_query(sql: str, key: str, after: str | None) -> tuple[str, dict]:
+    """
+    Page of `sql` ordered by the unique column `key`, starting strictly after
+    `after`. The plain column comparison lets the planner use its index.
+    """
+    params = {}
+    where = ""
+    if after is not None:
+        where = f'WHERE page."{key}" > :after'
+        params = {"after": after}
+    query = (
+        f"SELECT * FROM (\n{strip_sql(sql)}\n) AS page {where} "
+        f'ORDER BY page."{key}" LIMIT :page_limit'
+    )
+    return query, params
+
+
+def offset_page_query(sql: str, offset: int) -> tuple[str, dict]:
+    """
+    Fallback for results without a unique key. Ordering by the whole row
+    keeps the page boundaries the same from one request to the next.
+    """
+    query = (
+        f"SELECT * FROM (\n{strip_sql(sql)}\n) AS page "
+        f"ORDER BY page::text LIMIT :page_limit OFFSET :page_offset"
+    )
+    return query, {"page_offset": offset}
+
+
+class QueryRegistry:
+    """
+    Remembers validated SQL by id so clients can page through (or export) a
+    result without another LLM round trip. In-process and LRU-bounded, so a
+    query id is only valid on the worker that produced it.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, question: str, sql: str, params: dict | None = None, admitted: bool = False) -> str:
+        """
+        Remember `sql` under an id. `admitted` records that it passed the
+        allow-list and the cost governor; only such entries may be paged or
+        exported.
+        """
+        query_id = fingerprint_sql(sql, params)[:16]
+        with self._lock:
+            entry = self._entries.pop(query_id, None) or {
+                "question": question, "query": sql, "params": params or {}, "columns": None,
+            }
+            entry["admitted"] = admitted
+            self._entries[query_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return query_id
+
+    def get(self, query_id: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(query_id)
+            if entry is not None:
+                self._entries.move_to_end(query_id)
+            return entry
+
+
+query_registry = QueryRegistry(max_entries=int(os.getenv("QUERY_REGISTRY_SIZE", "2048")))
+
+
+async def fetch_page(bot, entry: dict, cursor: str | None, limit: int) -> dict:
+    """
+    One page of a registered query. Uses a keyset on PAGINATION_KEY when the
+    query returns that column unique (see `keyset_column`), otherwise falls
+    back to LIMIT/OFFSET. The fallback sorts the whole uncapped result, so
+    `bot`'s governor checks each OFFSET page query before it runs (raising
+    PageRejected), and offsets past MAX_PAGE_OFFSET are refused.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    state = decode_cursor(cursor)
+    if entry["columns"] is None:
+        entry["columns"] = await db_executor.columns(strip_sql(entry["query"]), entry["params"])
+    key = keyset_column(entry["query"])
+    if key is not None and key not in entry["columns"]:
+        key = None
+
+    if key and state.get("after") is not None and not isinstance(state["after"], str):
+        raise ValueError("Invalid pagination cursor.")
+    if key:
+        query, params = keyset_page_query(entry["query"], key, state.get("after"))
+    else:
+        query, params = offset_page_query(entry["query"], cursor_offset(state))
+    params = {**entry["params"], **params, "page_limit": limit + 1}
+    if not key:
+        rejection = await bot.cost_rejection(query, params)
+        if rejection is not None:
+            raise PageRejected(rejection)
+
+    rows = await db_executor.run(
+        query, params, max_rows=limit + 1, timeout_ms=QUERY_STATEMENT_TIMEOUT_MS or None
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        if key:
+            next_cursor = encode_cursor({"after": str(rows[-1][key])})
+        else:
+            next_cursor = encode_cursor({"offset": params["page_offset"] + limit})
+    return {
+        "rows": rows,
+        "columns": entry["columns"],
+        "keys": [key] if key else [],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,209 @@
+"""
+Prompt assembly under a per-call token budget.
+
+Each prompt gets only the schema columns relevant to the question (plus the
+identifying columns every answer uses), the most recent chat turns that fit
+the remaining budget, and, for the answer prompt, result data truncated to
+what is left. Token counts are estimated (about four characters per token),
+which is close enough for budgeting without a tokenizer dependency.
+"""
+import re
+import json
+import logging
+from collections import defaultdict
+
+
+# Columns always described, because the prompts ask for them in row results.
+CORE_COLUMNS = {
+    "diary_no", "filing_no", "case_no", "petitioner_name", "respondent_name",
+    "drt_name", "case_status", "case_filing_date", "case_disposed_off_date",
+    "disposal_diffdays", "doc_name", "document_upload_url", "filing_year",
+    "disposal_year",
+}
+
+# Question words that make a column relevant although its name does not appear.
+COLUMN_HINTS = {
+    r"\b(?:fy|financial)\b": ("filing_fy", "disposal_fy"),
+    r"\bmonth": ("filing_month",),
+    r"\b(?:amount|suit|claim|rupee|rs|crore|lakh)": ("suit_amount",),
+    r"\b(?:scrutin|objection|defect|compliance|notification)": (
+        "scrutiny_notification_date", "scrutiny_compliance_date",
+        "scrutiny_objection_status_1_2", "scrutiney_time",
+    ),
+    r"\b(?:list(?:ed|ing)|hearing)": ("case_first_listing_date", "case_listing_time"),
+    r"\b(?:order|upload)": ("daily_order_uploaded_date", "final_order_upload"),
+    r"\b(?:document|doc|master)": ("master_doc_name",),
+    r"\bregist": ("case_registration_date",),
+    r"\brank": ("filing_no_rank_no",),
+    r"\b(?:type|applications?|oa|sa|securiti[sz]ation)\b": ("case_type",),
+}
+
+# Name parts too common to mark a column as relevant on their own.
+_GENERIC_PARTS = {"case", "date", "name", "no", "time", "status", "of", "off", "1", "2"}
+
+_COLUMN_LINE = re.compile(r"^- (\w+) \(")
+_TABLE_LINE = re.compile(r"^Table: (\w+)")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    limit = max(tokens, 0) * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit] + "\n... (truncated)"
+
+
+class SchemaBlock:
+    """One 'Table:' section of TABLE_INFO, split into column lines and notes."""
+
+    def __init__(self, table: str):
+        self.table = table
+        self.lines: list[tuple[str | None, str]] = []  # (column or None, text)
+
+    @property
+    def columns(self) -> list[str]:
+        return [column for column, _ in self.lines if column]
+
+
+def parse_schema(table_info: str) -> list[SchemaBlock]:
+    blocks = []
+    for line in table_info.strip().splitlines():
+        table = _TABLE_LINE.match(line)
+        if table:
+            blocks.append(SchemaBlock(table.group(1)))
+        elif blocks and line.strip():
+            column = _COLUMN_LINE.match(line.strip())
+            blocks[-1].lines.append((column.group(1) if column else None, line))
+    return blocks
+
+
+class PromptBuilder:
+    """Renders prompt templates within `token_budget` and records their sizes."""
+
+    def __init__(
+        self,
+        table_info: str,
+        token_budget: int = 6000,
+        history_budget: int = 1500,
+        history_message_chars: int = 1000,
+        prune_schema: bool = True,
+    ):
+        self.table_info = table_info
+        self.blocks = parse_schema(table_info)
+        self.token_budget = token_budget
+        self.history_budget = history_budget
+        self.history_message_chars = history_message_chars
+        self.prune_schema = prune_schema
+        self.logger = logging.getLogger("PromptBuilder")
+        self._stats = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "unbudgeted_tokens": 0})
+
+    # ---------- schema ----------
+
+    def relevant_columns(self, question: str) -> set[str]:
+        text = (question or "").lower()
+        words = set(re.findall(r"[a-z0-9_]+", text))
+        columns = set(CORE_COLUMNS)
+        for pattern, hinted in COLUMN_HINTS.items():
+            if re.search(pattern, text):
+                columns.update(hinted)
+        for block in self.blocks:
+            for column in block.columns:
+                parts = set(column.split("_")) - _GENERIC_PARTS
+                if column in words or parts & words:
+                    columns.add(column)
+        return columns
+
+    def schema_for(self, question: str) -> str:
+        """TABLE_INFO restricted to relevant columns, in the original order."""
+        if not self.prune_schema:
+            return self.table_info
+        columns = self.relevant_columns(question)
+        sections = []
+        for block in self.blocks:
+            # lookup tables are only described when a column pointing at them is
+            if block is not self.blocks[0] and block.table not in columns and not (
+                set(block.columns) & columns
+            ):
+                continue
+            lines = [f"Table: {block.table}"]
+            lines += [text for column, text in block.lines if column is None or column in columns]
+            sections.append("\n".join(lines))
+        return "\n\n".join(sections)
+
+    # ---------- history ----------
+
+    def history_for(self, chat_history: list | None, tokens: int | None = None) -> str:
+        """The most recent messages that fit in `tokens`, as a JSON list."""
+        tokens = self.history_budget if tokens is None else tokens
+        kept, used = [], estimate_tokens("[]")
+        messages = [m for m in (chat_history or []) if isinstance(m, dict)]
+        for message in reversed(messages):
+            content = str(message.get("content", ""))
+            if len(content) > self.history_message_chars:
+                content = content[: self.history_message_chars] + " ..."
+            entry = {"role": message.get("role", "user"), "content": content}
+            cost = estimate_tokens(json.dumps(entry)) + 1
+            if used + cost > tokens:
+                break
+            kept.append(entry)
+            used += cost
+        kept.reverse()
+        omitted = len(messages) - len(kept)
+        if omitted:
+            kept.insert(0, {"role": "system", "content": f"{omitted} earlier message(s) omitted"})
+        return json.dumps(kept)
+
+    # ---------- assembly ----------
+
+    def build(
+        self,
+        kind: str,
+        template: str,
+        question: str,
+        chat_history: list | None,
+        fit: str | None = None,
+        **fields,
+    ) -> str:
+        """
+        Render `template` (which uses {table_info} and {chat_history}) for
+        `question`. When `fit` names one of `fields`, that value is truncated
+        so the prompt stays within budget; history gets what remains, up to
+        `history_budget`.
+        """
+        schema = self.schema_for(question)
+        prompt = template.format(table_info=schema, chat_history="[]", **fields)
+        if fit is not None:
+            excess = estimate_tokens(prompt) - self.token_budget
+            if excess > 0:
+                value = str(fields[fit])
+                fields[fit] = _truncate_to_tokens(value, estimate_tokens(value) - excess - 32)
+                prompt = template.format(table_info=schema, chat_history="[]", **fields)
+        history_tokens = max(0, min(self.history_budget, self.token_budget - estimate_tokens(prompt)))
+        history = self.history_for(chat_history, history_tokens)
+        prompt = template.format(table_info=schema, chat_history=history, **fields)
+
+        tokens = estimate_tokens(prompt)
+        unbudgeted = (
+            tokens
+            + estimate_tokens(self.table_info) - estimate_tokens(schema)
+            + estimate_tokens(json.dumps(chat_history or [])) - estimate_tokens(history)
+        )
+        stats = self._stats[kind]
+        stats["calls"] += 1
+        stats["prompt_tokens"] += tokens
+        stats["unbudgeted_tokens"] += max(unbudgeted, tokens)
+        self.logger.info(
+            f"Prompt {kind}: ~{tokens} tokens (schema ~{estimate_tokens(schema)}, "
+            f"history ~{estimate_tokens(history)}; ~{max(unbudgeted, tokens)} without budgeting)"
+        )
+        return prompt
+
+    def stats(self) -> dict:
+        return {
+            "token_budget": self.token_budget,
+            "history_budget": self.history_budget,
+            "prompts": {kind: dict(values) for kind, values in self._stats.items()},
+        }
@@ -0,0 +1,154 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", (question or "").strip().lower())
+    return text.rstrip(" ?.!")
+
+
+def history_context(question: str, chat_history: list, turns: int) -> list:
+    """
+    The part of the chat history that can change the generated SQL: the last
+    `turns` user messages before the current question. Assistant messages are
+    left out because they only echo row counts.
+    """
+    user_messages = [
+        normalize_question(m.get("content", ""))
+        for m in (chat_history or [])
+        if isinstance(m, dict) and m.get("role") == "user"
+    ]
+    # the UI appends the current question to the history before sending it
+    if user_messages and user_messages[-1] == normalize_question(question):
+        user_messages = user_messages[:-1]
+    return user_messages[-turns:] if turns > 0 else []
+
+
+class QueryCache:
+    """
+    LRU + TTL cache for write_query output (the parsed list of QueryItems),
+    keyed on the normalized question plus the recent chat context. With `path`
+    set, entries are also kept in a SQLite file so they survive restarts.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        path: str | None = None,
+        namespace: str = "",
+        history_turns: int = 2,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self.history_turns = history_turns
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger("QueryCache")
+        self._entries: OrderedDict[str, tuple[float, list]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "DELETE FROM query_cache WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+            self._conn.commit()
+            self.logger.info(f"Persistent NL-to-SQL cache at {path}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def make_key(self, question: str, chat_history: list) -> str:
+        payload = json.dumps(
+            [
+                self.namespace,
+                normalize_question(question),
+                history_context(question, chat_history, self.history_turns),
+            ]
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> list | None:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT created_at, value FROM query_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._store(key, entry)
+            if entry is not None and now - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self._delete_persisted(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: list):
+        if not self.enabled:
+            return
+        entry = (time.time(), value)
+        with self._lock:
+            self._store(key, entry)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), entry[0]),
+                )
+                self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM query_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._conn is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ---------- internals (caller holds the lock) ----------
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._delete_persisted(evicted)
+
+    def _delete_persisted(self, key: str):
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+            self._conn.commit()
@@ -0,0 +1,148 @@
+"""
+Pre-execution cost check for generated SQL.
+
+Before a sub-query runs, the planner's estimate for it is fetched with
+EXPLAIN (no execution) and compared against configurable limits, so a bad
+generation such as a cross join over the case data is turned away before it
+reaches the executor. Verdicts are cached per SQL fingerprint and data
+version, so a reload re-plans against the new data; a statement that could
+not be planned at all is not cached, since the failure may be transient.
+Admitted statements run with a per-statement statement_timeout as a backstop
+for estimates that turn out wrong.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+from app.db import db_executor
+from app.core.result_cache import fingerprint_sql
+
+
+# Planner total cost above which a statement is rejected.
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "5000000"))
+# Estimated rows produced by any single join node above which a statement is
+# rejected; catches cross joins and runaway self-joins.
+QUERY_MAX_JOIN_ROWS = float(os.getenv("QUERY_MAX_JOIN_ROWS", "10000000"))
+# statement_timeout applied to every admitted statement (0 disables it).
+QUERY_STATEMENT_TIMEOUT_MS = int(os.getenv("QUERY_STATEMENT_TIMEOUT_MS", "30000"))
+
+_JOIN_NODES = {"Nested Loop", "Hash Join", "Merge Join"}
+
+# verdict["rejected_by"] values
+COST = "cost"
+JOIN_ROWS = "join_rows"
+PLAN_ERROR = "plan_error"
+
+
+def _walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def plan_summary(plan: dict) -> dict:
+    """Top-level cost and the largest join estimate of an EXPLAIN (FORMAT JSON) plan."""
+    join_rows = [node.get("Plan Rows", 0) for node in _walk(plan) if node.get("Node Type") in _JOIN_NODES]
+    return {
+        "cost": plan.get("Total Cost", 0.0),
+        "rows": plan.get("Plan Rows", 0),
+        "max_join_rows": max(join_rows, default=0),
+    }
+
+
+class QueryGovernor:
+    """EXPLAINs statements and admits only those within the cost limits."""
+
+    def __init__(
+        self,
+        max_cost: float = QUERY_MAX_COST,
+        max_join_rows: float = QUERY_MAX_JOIN_ROWS,
+        statement_timeout_ms: int = QUERY_STATEMENT_TIMEOUT_MS,
+        cache_size: int = 1024,
+    ):
+        self.max_cost = max_cost
+        self.max_join_rows = max_join_rows
+        self.statement_timeout_ms = statement_timeout_ms or None
+        self.cache_size = cache_size
+        self.logger = logging.getLogger("QueryGovernor")
+        self.admitted = 0
+        self.rejected = 0
+        self._verdicts: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def check(
+        self, query: str, params: dict | None = None, max_cost: float | None = None,
+        data_version: str | None = None,
+    ) -> dict:
+        """
+        Verdict for `query`: {"allowed", "rejected_by", "reason", "cost",
+        "rows", "max_join_rows"}. `rejected_by` (COST, JOIN_ROWS or
+        PLAN_ERROR) and `reason` explain a rejection and are None otherwise.
+        `max_cost` overrides the cost limit for this check (exports allow
+        more). `data_version` is part of the cache key, so estimates made
+        against older data are not reused.
+        """
+        max_cost = max_cost or self.max_cost
+        key = f"{fingerprint_sql(query, params)}:{max_cost:g}:{data_version}"
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+        if verdict is None:
+            verdict = await self._explain(query, params, max_cost)
+            if verdict["rejected_by"] != PLAN_ERROR:
+                with self._lock:
+                    self._verdicts[key] = verdict
+                    while len(self._verdicts) > self.cache_size:
+                        self._verdicts.popitem(last=False)
+
+        with self._lock:
+            if verdict["allowed"]:
+                self.admitted += 1
+            else:
+                self.rejected += 1
+        if not verdict["allowed"]:
+            self.logger.warning(f"Rejected query ({verdict['reason']}): {query}")
+        return verdict
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "cached_plans": len(self._verdicts),
+            "max_cost": self.max_cost,
+            "max_join_rows": self.max_join_rows,
+            "statement_timeout_ms": self.statement_timeout_ms,
+        }
+
+    async def _explain(self, query: str, params: dict | None, max_cost: float) -> dict:
+        try:
+            rows = await db_executor.run(
+                f"EXPLAIN (FORMAT JSON) {query}", params, timeout_ms=self.statement_timeout_ms,
+                record=False,
+            )
+            plan = list(rows[0].values())[0][0]["Plan"]
+        except Exception as e:
+            self.logger.error(f"Could not EXPLAIN query: {str(e)}")
+            return {
+                "allowed": False, "rejected_by": PLAN_ERROR,
+                "reason": f"EXPLAIN failed: {str(e).splitlines()[0]}",
+                "cost": None, "rows": None, "max_join_rows": None,
+            }
+
+        summary = plan_summary(plan)
+        rejected_by = reason = None
+        if summary["cost"] > max_cost:
+            rejected_by = COST
+            reason = (
+                f"Estimated cost {summary['cost']:.0f} exceeds the limit of {max_cost:.0f}; "
+                f"try narrowing the question (e.g. a DRT, year or party)."
+            )
+        elif summary["max_join_rows"] > self.max_join_rows:
+            rejected_by = JOIN_ROWS
+            reason = (
+                f"A join is estimated to produce {summary['max_join_rows']:.0f} rows "
+                f"(limit {self.max_join_rows:.0f}); the query probably joins without a condition."
+            )
+        return {"allowed": reason is None, "rejected_by": rejected_by, "reason": reason, **summary}
@@ -0,0 +1,124 @@
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from app.core.sql_analysis import parse_sql
+
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')         # string literal, kept verbatim
+    | (?P<ident>"(?:[^"]|"")*")        # quoted identifier, kept verbatim
+    | (?P<comment>--[^\n]*|/\*.*?\*/)  # comments are dropped
+    | (?P<space>\s+)
+    | (?P<other>[^'"\s-]+|-)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+def canonicalize_sql(sql: str) -> str:
+    """Lower-case everything except literals, drop comments and collapse whitespace."""
+    parts = []
+    for match in _TOKEN_RE.finditer(sql or ""):
+        kind = match.lastgroup
+        if kind in ("string", "ident"):
+            parts.append(match.group())
+        elif kind in ("space", "comment"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        else:
+            parts.append(match.group().lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def fingerprint_sql(sql: str, params: dict | None = None) -> str:
+    """
+    Fingerprint of the canonical SQL plus its bind parameters, if any. Uses
+    the parsed form when the SQL parses, the token-level canonicalization
+    otherwise.
+    """
+    payload = parse_sql(sql).canonical or canonicalize_sql(sql)
+    if params:
+        payload += "\n" + json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def estimate_size(rows: list) -> int:
+    """Approximate in-memory cost of a result, in bytes of its JSON form."""
+    return len(json.dumps(rows, default=str))
+
+
+class ResultCache:
+    """
+    LRU cache of SQL results keyed on the SQL fingerprint, bounded by total
+    (estimated) bytes. Each entry remembers the data version it was computed
+    under and is only served while that version is current.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self.hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+        self.logger = logging.getLogger("ResultCache")
+        self._entries: OrderedDict[str, tuple[str, list, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, fingerprint: str, version: str) -> list | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None and entry[0] != version:
+                self._remove(fingerprint)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, fingerprint: str, version: str, rows: list):
+        if not self.enabled:
+            return
+        size = estimate_size(rows)
+        if size > self.max_entry_bytes:
+            self.logger.info(f"Result of {size} bytes too large to cache.")
+            return
+        with self._lock:
+            self._remove(fingerprint)
+            self._entries[fingerprint] = (version, rows, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, fingerprint: str):
+        entry = self._entries.pop(fingerprint, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
@@ -0,0 +1,92 @@
+"""
+Compact encodings of chat results.
+
+The default payload is a list of row objects, which repeats every column
+name in every row. The columnar form sends the column names once and each
+row as an array:
+
+    {"columns": ["diary_no", "case_status"], "rows": [["1258/2021", "D"], ...]}
+
+Binary forms of the columnar payload are available when their optional
+package is installed: msgpack (`pip install msgpack`) and Arrow IPC
+streams (`pip install pyarrow`). The Arrow stream carries the rows as
+record batches. The rest of the result goes in the schema metadata under
+`result`, as JSON.
+"""
+import json
+import importlib.util
+
+from fastapi.encoders import jsonable_encoder
+
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# media type -> module it needs
+BINARY_FORMATS = {MSGPACK: "msgpack", ARROW: "pyarrow"}
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def to_columnar(rows: list[dict]) -> dict:
+    """Column names (in first-seen order) once, then one array per row."""
+    columns: dict[str, None] = {}
+    for row in rows:
+        for column in row:
+            columns.setdefault(column, None)
+    names = list(columns)
+    return {"columns": names, "rows": [[row.get(name) for name in names] for row in rows]}
+
+
+def columnar_result(result: dict) -> dict:
+    """`result` with its `rows` in columnar form."""
+    if "rows" not in result:
+        return result
+    return {**result, "format": "columnar", **to_columnar(result.get("rows") or [])}
+
+
+def negotiate(accept: str | None) -> str:
+    """The binary media type the client asked for in Accept, else JSON."""
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in BINARY_FORMATS:
+            if importlib.util.find_spec(BINARY_FORMATS[media_type]) is None:
+                raise UnsupportedFormat(
+                    f"{media_type} needs the optional '{BINARY_FORMATS[media_type]}' package."
+                )
+            return media_type
+    return JSON
+
+
+def _arrow_column(pa, values: list):
+    # values were made JSON-safe; Arrow infers a type unless the column mixes them
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values])
+
+
+def encode(result: dict, media_type: str) -> bytes:
+    """Serialize a columnar result as `media_type` (msgpack or Arrow IPC)."""
+    payload = jsonable_encoder(result)
+    if media_type == MSGPACK:
+        import msgpack
+
+        return msgpack.packb(payload, use_bin_type=True)
+    if media_type == ARROW:
+        import pyarrow as pa
+
+        columns, rows = payload.get("columns") or [], payload.get("rows") or []
+        rest = {key: value for key, value in payload.items() if key not in ("columns", "rows")}
+        table = pa.table(
+            {name: _arrow_column(pa, [row[index] for row in rows]) for index, name in enumerate(columns)},
+            metadata={"result": json.dumps(rest)},
+        )
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise UnsupportedFormat(f"Unsupported media type: {media_type}")
@@ -0,0 +1,328 @@
+"""
+Answer simple aggregate SQL from drt_case_rollup instead of the serving view.
+
+Only a conservative shape is rewritten:
+
+    SELECT [dims,] COUNT(*) | COUNT(DISTINCT diary_no) | AVG(disposal_diffdays)
+           | ROUND(AVG(disposal_diffdays), n) ...
+    FROM drt_case_serving
+    [WHERE predicate AND predicate ...]
+    [GROUP BY dims] [ORDER BY dims/aliases] [LIMIT n]
+
+where every predicate is a rollup dimension compared to a value, the
+LOWER(drt_name) LIKE LOWER(...) text match, a whole calendar year or Indian
+financial year expressed as a date BETWEEN, or disposal_diffdays IS NOT NULL.
+Anything else returns None and runs against the serving view as generated.
+COUNT(DISTINCT diary_no) is only answered from a rollup whose case counts
+are exact (see app/maintenance/rollups.py).
+"""
+import os
+import re
+import time
+import logging
+
+from app.db import db_executor
+from app.maintenance.rollups import ROLLUP_DIMENSIONS, ROLLUP_FORMAT
+from app.table_info import CASE_SERVING_VIEW, CASE_ROLLUP_TABLE
+
+
+# How long a "missing or stale" answer is trusted. The data version is bumped
+# before the rollup is rebuilt for it, so the rollup usually turns current
+# within the same version.
+ROLLUP_RECHECK_SECONDS = float(os.getenv("ROLLUP_RECHECK_SECONDS", "30"))
+
+_I = re.IGNORECASE | re.DOTALL
+_DIMS = "|".join(ROLLUP_DIMENSIONS)
+_VALUE = r"(?:'(?:[^']|'')*'|:\w+|-?\d+)"
+_ALIAS = r"(?:\s+(?:as\s+)?(?P<alias>\w+))?"
+
+_STATEMENT = re.compile(
+    rf"^select\s+(?P<select>.+?)\s+from\s+{CASE_SERVING_VIEW}"
+    r"(?:\s+where\s+(?P<where>.+?))?"
+    r"(?:\s+group\s+by\s+(?P<group>.+?))?"
+    r"(?:\s+order\s+by\s+(?P<order>.+?))?"
+    r"(?:\s+limit\s+(?P<limit>\d+))?$",
+    _I,
+)
+
+_COUNT = re.compile(rf"^count\(\s*\*\s*\){_ALIAS}$", _I)
+_COUNT_CASES = re.compile(rf"^count\(\s*distinct\s+diary_no\s*\){_ALIAS}$", _I)
+_COUNTS_CASES = re.compile(r"\bcount\(\s*distinct\s+diary_no\s*\)", _I)
+_AVG = re.compile(rf"^avg\(\s*disposal_diffdays\s*\){_ALIAS}$", _I)
+_ROUND_AVG = re.compile(
+    rf"^round\(\s*avg\(\s*disposal_diffdays\s*\)\s*,\s*(?P<digits>\d+)\s*\){_ALIAS}$", _I
+)
+_DIM_ITEM = re.compile(rf"^(?P<column>{_DIMS}){_ALIAS}$", _I)
+
+_DIM_EQUALS = re.compile(rf"^(?P<column>{_DIMS})\s*=\s*(?P<value>{_VALUE})$", _I)
+_DRT_LIKE = re.compile(rf"^lower\(\s*drt_name\s*\)\s+like\s+lower\(\s*(?P<value>{_VALUE})\s*\)$", _I)
+_DATE_BETWEEN = re.compile(
+    r"^(?P<column>case_filing_date|case_disposed_off_date)\s+between\s+"
+    r"'(?P<start>\d{4}-\d{2}-\d{2})'\s+and\s+'(?P<end>\d{4}-\d{2}-\d{2})'$",
+    _I,
+)
+_YEAR_EXTRACT = re.compile(
+    r"^extract\(\s*year\s+from\s+(?P<column>case_filing_date|case_disposed_off_date)\s*\)"
+    r"\s*=\s*(?P<year>\d{4})$",
+    _I,
+)
+_DAYS_NOT_NULL = re.compile(r"^disposal_diffdays\s+is\s+not\s+null$", _I)
+_ORDER_ITEM = re.compile(r"^(?P<name>\w+)(?:\s+(?P<direction>asc|desc))?$", _I)
+
+_DATE_PREFIX = {"case_filing_date": "filing", "case_disposed_off_date": "disposal"}
+
+
+def split_top_level(text: str, separator: str) -> list[str] | None:
+    """
+    Split on a keyword (e.g. 'and') or ',' outside quotes and parentheses.
+    The AND inside 'BETWEEN x AND y' is not treated as a separator. Returns
+    None for input this splitter does not understand.
+    """
+    parts, current, depth, i = [], [], 0, 0
+    in_between = False
+    keyword = separator.isalpha()
+    pattern = re.compile(rf"\s+{separator}\s+", re.IGNORECASE) if keyword else None
+    while i < len(text):
+        ch = text[i]
+        if ch == "'":
+            end = i + 1
+            while end < len(text):
+                if text[end] == "'" and text[end + 1:end + 2] != "'":
+                    break
+                end += 2 if text[end] == "'" else 1
+            if end >= len(text):
+                return None
+            current.append(text[i:end + 1])
+            i = end + 1
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth < 0:
+                return None
+        if depth == 0:
+            if keyword:
+                match = pattern.match(text, i)
+                if match:
+                    if in_between:
+                        in_between = False
+                    else:
+                        parts.append("".join(current).strip())
+                        current = []
+                        i = match.end()
+                        continue
+                elif re.match(r"\s+between\s+", text[i:], re.IGNORECASE):
+                    in_between = True
+            elif ch == separator:
+                parts.append("".join(current).strip())
+                current = []
+                i += 1
+                continue
+        current.append(ch)
+        i += 1
+    if depth != 0:
+        return None
+    parts.append("".join(current).strip())
+    return parts
+
+
+def _strip_parens(text: str) -> str:
+    while text.startswith("(") and text.endswith(")"):
+        inner = text[1:-1]
+        if split_top_level(inner, ",") is None:
+            break
+        text = inner.strip()
+    return text
+
+
+def _fy_label(start_year: int) -> str:
+    return f"{start_year}-{(start_year + 1) % 100:02d}"
+
+
+def parse_rollup_note(note: str | None) -> dict:
+    """The rollup's table comment ('data_version=5;format=2;cases=exact') as a dict."""
+    fields = {}
+    for part in (note or "").split(";"):
+        key, _, value = part.partition("=")
+        if key:
+            fields[key.strip()] = value.strip()
+    return fields
+
+
+class RollupRouter:
+    """Rewrites qualifying aggregate SQL to read drt_case_rollup."""
+
+    def __init__(self, recheck_seconds: float = ROLLUP_RECHECK_SECONDS):
+        self.logger = logging.getLogger("RollupRouter")
+        self.recheck_seconds = recheck_seconds
+        self.routed = 0
+        self.skipped = 0
+        self._checked_version = object()
+        self._checked_at = 0.0
+        self._available = False
+        self._cases_exact = False
+
+    @staticmethod
+    def counts_cases(sql: str) -> bool:
+        """True when `sql` counts distinct cases (COUNT(DISTINCT diary_no))."""
+        return bool(_COUNTS_CASES.search(sql))
+
+    async def is_available(self, db_version, counts_cases: bool = False) -> bool:
+        """
+        True when the rollup exists and was built for the current data
+        version (and, with `counts_cases`, its case counts are exact). A
+        positive answer holds for the version; a negative one is re-checked
+        after `recheck_seconds`.
+        """
+        stale = not self._available and time.monotonic() - self._checked_at > self.recheck_seconds
+        if db_version != self._checked_version or stale:
+            try:
+                rows = await db_executor.run(
+                    f"SELECT obj_description(to_regclass('{CASE_ROLLUP_TABLE}'), 'pg_class') AS note",
+                    record=False,
+                )
+                note = parse_rollup_note(rows[0]["note"] if rows else None)
+                self._available = (
+                    note.get("data_version") == str(db_version)
+                    and note.get("format") == str(ROLLUP_FORMAT)
+                )
+                self._cases_exact = note.get("cases") == "exact"
+            except Exception as e:
+                self.logger.warning(f"Could not check {CASE_ROLLUP_TABLE}: {str(e)}")
+                self._available = False
+            self._checked_version = db_version
+            self._checked_at = time.monotonic()
+            if not self._available:
+                self.logger.info(f"{CASE_ROLLUP_TABLE} missing or stale; aggregates use the base view.")
+        return self._available and (self._cases_exact or not counts_cases)
+
+    def rewrite(self, sql: str) -> str | None:
+        """Equivalent query against the rollup, or None if `sql` does not qualify."""
+        rewritten = self._rewrite(sql.strip().rstrip(";").strip())
+        if rewritten is None:
+            self.skipped += 1
+        else:
+            self.routed += 1
+            self.logger.info(f"Routed aggregate to {CASE_ROLLUP_TABLE}: {rewritten}")
+        return rewritten
+
+    def stats(self) -> dict:
+        return {"routed": self.routed, "skipped": self.skipped}
+
+    # ---------- internals ----------
+
+    def _rewrite(self, sql: str) -> str | None:
+        statement = _STATEMENT.match(sql)
+        if not statement:
+            return None
+
+        conditions, known_days = [], False
+        for predicate in split_top_level(statement["where"] or "", "and") or [None]:
+            if predicate is None:
+                return None
+            if not predicate:
+                continue
+            predicate = _strip_parens(predicate)
+            if _DAYS_NOT_NULL.match(predicate):
+                known_days = True
+                continue
+            condition = self._condition(predicate)
+            if condition is None:
+                return None
+            conditions.append(condition)
+
+        groups = []
+        if statement["group"]:
+            for column in split_top_level(statement["group"], ",") or [None]:
+                if column is None or not re.fullmatch(_DIMS, column.strip(), re.IGNORECASE):
+                    return None
+                groups.append(column.strip().lower())
+
+        items, names = [], set(groups)
+        for item in split_top_level(statement["select"], ",") or [None]:
+            if item is None:
+                return None
+            rendered = self._select_item(item.strip(), known_days, groups)
+            if rendered is None:
+                return None
+            items.append(rendered[0])
+            names.add(rendered[1])
+        if not any(re.search(r"\bsum\(", item, re.IGNORECASE) for item in items):
+            return None
+
+        order = []
+        if statement["order"]:
+            for item in split_top_level(statement["order"], ",") or [None]:
+                match = _ORDER_ITEM.match(item.strip()) if item else None
+                if not match or match["name"].lower() not in names:
+                    return None
+                order.append(item.strip())
+
+        rewritten = f"SELECT {', '.join(items)} FROM {CASE_ROLLUP_TABLE}"
+        if conditions:
+            rewritten += f" WHERE {' AND '.join(conditions)}"
+        if groups:
+            rewritten += f" GROUP BY {', '.join(groups)}"
+            if known_days:
+                # the original query never sees groups whose rows all lack disposal_diffdays
+                rewritten += " HAVING SUM(disposal_days_count) > 0"
+        if order:
+            rewritten += f" ORDER BY {', '.join(order)}"
+        if statement["limit"]:
+            rewritten += f" LIMIT {statement['limit']}"
+        return rewritten
+
+    def _condition(self, predicate: str) -> str | None:
+        match = _DIM_EQUALS.match(predicate)
+        if match:
+            return f"{match['column'].lower()} = {match['value']}"
+        match = _DRT_LIKE.match(predicate)
+        if match:
+            return f"LOWER(drt_name) LIKE LOWER({match['value']})"
+        match = _YEAR_EXTRACT.match(predicate)
+        if match:
+            return f"{_DATE_PREFIX[match['column'].lower()]}_year = {int(match['year'])}"
+        match = _DATE_BETWEEN.match(predicate)
+        if match:
+            prefix = _DATE_PREFIX[match["column"].lower()]
+            start, end = match["start"], match["end"]
+            year = int(start[:4])
+            if start == f"{year}-01-01" and end == f"{year}-12-31":
+                return f"{prefix}_year = {year}"
+            if start == f"{year}-04-01" and end == f"{year + 1}-03-31":
+                return f"{prefix}_fy = '{_fy_label(year)}'"
+        return None
+
+    def _select_item(self, item: str, known_days: bool, groups: list) -> tuple[str, str] | None:
+        match = _COUNT.match(item)
+        if match:
+            alias = match["alias"] or "count"
+            column = "disposal_days_count" if known_days else "row_count"
+            return f"COALESCE(SUM({column}), 0)::bigint AS {alias}", alias.lower()
+        match = _COUNT_CASES.match(item)
+        if match:
+            alias = match["alias"] or "count"
+            column = "disposal_case_count" if known_days else "case_count"
+            return f"COALESCE(SUM({column}), 0)::bigint AS {alias}", alias.lower()
+        match = _AVG.match(item)
+        if match:
+            alias = match["alias"] or "avg"
+            return (
+                f"SUM(disposal_days_sum) / NULLIF(SUM(disposal_days_count), 0) AS {alias}",
+                alias.lower(),
+            )
+        match = _ROUND_AVG.match(item)
+        if match:
+            alias = match["alias"] or "round"
+            return (
+                f"ROUND(SUM(disposal_days_sum) / NULLIF(SUM(disposal_days_count), 0), "
+                f"{int(match['digits'])}) AS {alias}",
+                alias.lower(),
+            )
+        match = _DIM_ITEM.match(item)
+        if match and match["column"].lower() in groups:
+            column = match["column"].lower()
+            alias = match["alias"]
+            return (f"{column} AS {alias}" if alias else column), (alias or column).lower()
+        return None
@@ -0,0 +1,135 @@
+"""
+Reflected table metadata persisted to disk.
+
+Building a SQLDatabase reflects every included table over the network. The
+chatbot only needs one for the optional SQLDatabaseChain, so it is built on
+demand from this snapshot instead of at every worker start:
+
+    python -m app.manage schema-snapshot    # refresh after a schema change
+
+The snapshot is plain JSON (per column: name, DDL type, nullable, primary
+key), from which the Table objects are rebuilt; loading it never runs code.
+A missing or unreadable snapshot is rebuilt by reflecting once and saving it.
+"""
+import os
+import json
+import logging
+
+from sqlalchemy import Column, MetaData, Table
+from sqlalchemy.types import UserDefinedType
+
+from app.table_info import CASE_SERVING_VIEW, CASE_TYPE_TABLE
+
+
+SCHEMA_SNAPSHOT_PATH = os.getenv(
+    "SCHEMA_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schema_snapshot.json"),
+)
+# Tables the LLM may query through SQLDatabase.
+SNAPSHOT_TABLES = [CASE_SERVING_VIEW, CASE_TYPE_TABLE]
+
+logger = logging.getLogger("schema_snapshot")
+
+
+class SnapshotType(UserDefinedType):
+    """A column type restored from the snapshot; it compiles to the saved DDL type."""
+
+    cache_ok = True
+
+    def __init__(self, spec: str):
+        self.spec = spec
+
+    def get_col_spec(self, **kw) -> str:
+        return self.spec
+
+
+def reflect_schema(engine, tables: list[str] = SNAPSHOT_TABLES) -> MetaData:
+    metadata = MetaData()
+    metadata.reflect(bind=engine, only=list(tables), views=True)
+    return metadata
+
+
+def dump_schema(metadata: MetaData, dialect) -> dict:
+    """The columns of every table in `metadata`, with types compiled for `dialect`."""
+    return {
+        name: [
+            {
+                "name": column.name,
+                "type": column.type.compile(dialect=dialect),
+                "nullable": column.nullable,
+                "primary_key": column.primary_key,
+            }
+            for column in table.columns
+        ]
+        for name, table in metadata.tables.items()
+    }
+
+
+def build_schema(schema: dict) -> MetaData:
+    """MetaData rebuilt from `dump_schema` output."""
+    metadata = MetaData()
+    for name, columns in schema.items():
+        Table(name, metadata, *[
+            Column(
+                column["name"], SnapshotType(column["type"]),
+                nullable=column["nullable"], primary_key=column["primary_key"],
+            )
+            for column in columns
+        ])
+    return metadata
+
+
+def save_schema_snapshot(metadata: MetaData, dialect, tables: list[str] = SNAPSHOT_TABLES,
+                         path: str = SCHEMA_SNAPSHOT_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"tables": sorted(tables), "schema": dump_schema(metadata, dialect)}, f, indent=1)
+    # readers never see a half-written file
+    os.replace(tmp_path, path)
+    logger.info(f"Saved schema snapshot of {', '.join(tables)} to {path}.")
+
+
+def load_schema_snapshot(tables: list[str] = SNAPSHOT_TABLES,
+                         path: str = SCHEMA_SNAPSHOT_PATH) -> MetaData | None:
+    """The saved metadata, or None when there is no usable snapshot for `tables`."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if snapshot.get("tables") != sorted(tables):
+            logger.info(f"Schema snapshot {path} covers other tables; reflecting again.")
+            return None
+        return build_schema(snapshot["schema"])
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable schema snapshot {path}: {str(e)}")
+        return None
+
+
+def refresh_schema_snapshot(engine, tables: list[str] = SNAPSHOT_TABLES,
+                            path: str = SCHEMA_SNAPSHOT_PATH) -> MetaData:
+    metadata = reflect_schema(engine, tables)
+    save_schema_snapshot(metadata, engine.dialect, tables, path)
+    return metadata
+
+
+def snapshot_database(engine, tables: list[str] = SNAPSHOT_TABLES, path: str = SCHEMA_SNAPSHOT_PATH):
+    """A SQLDatabase over `tables` that takes its table metadata from the snapshot."""
+    # imported here: langchain_community is only needed once someone asks for the chain
+    from langchain_community.utilities import SQLDatabase
+
+    metadata = load_schema_snapshot(tables, path)
+    if metadata is None:
+        metadata = reflect_schema(engine, tables)
+        try:
+            save_schema_snapshot(metadata, engine.dialect, tables, path)
+        except OSError as e:
+            logger.warning(f"Could not save schema snapshot to {path}: {str(e)}")
+    return SQLDatabase(
+        engine=engine,
+        include_tables=list(tables),
+        metadata=metadata,
+        # CASE_SERVING_VIEW is a materialized view
+        view_support=True,
+        lazy_table_reflection=True,
+    )
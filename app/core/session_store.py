@@ -0,0 +1,216 @@
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from app.core.query_cache import normalize_question
+
+
+class ChatSession:
+    """
+    Compact server-side record of one conversation: per turn, the question,
+    the SQL that answered it, a short result summary and the context the
+    question was asked in (see `context`).
+    """
+
+    def __init__(self, session_id: str, turns: list | None = None, max_turns: int = 10,
+                 context_turns: int = 2):
+        self.session_id = session_id
+        self.turns: list[dict] = turns or []
+        self.max_turns = max_turns
+        self.context_turns = context_turns
+        # turns added since the session was loaded; SessionStore.save appends only these
+        self.new_turns: list[dict] = []
+
+    def history(self) -> list[dict]:
+        """The turns as chat_history messages, for prompts and cache keys."""
+        messages = []
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["question"]})
+            sql = " | ".join(query["query"] for query in turn["queries"])
+            content = turn["summary"]
+            if turn.get("answer"):
+                content += f"\n{turn['answer']}"
+            if sql:
+                content += f"\nSQL used: {sql}"
+            messages.append({"role": "assistant", "content": content})
+        return messages
+
+    def context(self) -> list[str]:
+        """
+        The normalized questions of the last `context_turns` turns, which a
+        follow-up may refer to. These are the same user messages that
+        QueryCache.make_key keys on.
+        """
+        if self.context_turns <= 0:
+            return []
+        return [normalize_question(turn["question"]) for turn in self.turns[-self.context_turns:]]
+
+    def find_queries(self, question: str) -> list[dict] | None:
+        """
+        SQL from an earlier turn that asked the same (normalized) question in
+        the same context. "And in 2019?" means something different after each
+        question.
+        """
+        wanted = normalize_question(question)
+        context = self.context()
+        for turn in reversed(self.turns):
+            if (
+                turn["queries"]
+                and normalize_question(turn["question"]) == wanted
+                and turn.get("context") == context
+            ):
+                return turn["queries"]
+        return None
+
+    def add_turn(self, question: str, sub_queries: list, summary: str, row_count: int,
+                 answer: str | None = None):
+        queries = [
+            {"question": report["question"], "query": report["query"], "params": report.get("params")}
+            for report in sub_queries or []
+            if report and report.get("status") == "ok"
+        ]
+        turn = {
+            "question": question,
+            "context": self.context(),
+            "queries": queries,
+            "summary": summary,
+            "row_count": row_count,
+            "answer": (answer or "")[:500] or None,
+        }
+        self.turns.append(turn)
+        self.new_turns.append(turn)
+        del self.turns[:-self.max_turns]
+
+
+class SessionStore:
+    """
+    LRU + TTL store of ChatSessions. Saving appends the session's new turns
+    to what is stored, so concurrent requests on one session do not drop each
+    other's turns. With `path` set, turns are kept as rows in a SQLite file,
+    which is then the only copy: sessions survive restarts, and every worker
+    on the same host reads the latest turns.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl_seconds: float = 86400,
+        max_turns: int = 10,
+        path: str | None = None,
+        context_turns: int = 2,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.context_turns = context_turns
+        self.logger = logging.getLogger("SessionStore")
+        self._sessions: OrderedDict[str, tuple[float, list]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            # several workers write the file; wait for each other's transactions
+            self._conn.execute("PRAGMA busy_timeout = 5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_session_turns ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "turn TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS chat_session_turns_session_idx "
+                "ON chat_session_turns (session_id, seq)"
+            )
+            self._conn.execute(
+                "DELETE FROM chat_session_turns WHERE session_id IN ("
+                "SELECT session_id FROM chat_session_turns GROUP BY session_id "
+                "HAVING MAX(created_at) < ?)",
+                (time.time() - self.ttl_seconds,),
+            )
+            self._conn.commit()
+            self.logger.info(f"Persistent chat sessions at {path}")
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> ChatSession:
+        """The session for `session_id`; unknown or expired ids start empty."""
+        now = time.time()
+        with self._lock:
+            if self._conn is not None:
+                entry = self._read(session_id)
+            else:
+                entry = self._sessions.get(session_id)
+                if entry is not None:
+                    self._sessions.move_to_end(session_id)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                return ChatSession(session_id, max_turns=self.max_turns, context_turns=self.context_turns)
+            return ChatSession(
+                session_id, list(entry[1]), max_turns=self.max_turns, context_turns=self.context_turns
+            )
+
+    def save(self, session: ChatSession):
+        """Append the turns added to `session` since it was loaded."""
+        turns, session.new_turns = session.new_turns, []
+        if not turns:
+            return
+        now = time.time()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT INTO chat_session_turns (session_id, turn, created_at) VALUES (?, ?, ?)",
+                    [(session.session_id, json.dumps(turn, default=str), now) for turn in turns],
+                )
+                self._conn.execute(
+                    "DELETE FROM chat_session_turns WHERE session_id = ? AND seq NOT IN ("
+                    "SELECT seq FROM chat_session_turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?)",
+                    (session.session_id, session.session_id, self.max_turns),
+                )
+                self._conn.commit()
+                return
+            entry = self._sessions.get(session.session_id)
+            stored = entry[1] if entry is not None and now - entry[0] <= self.ttl_seconds else []
+            self._sessions[session.session_id] = (now, (stored + turns)[-self.max_turns:])
+            self._sessions.move_to_end(session.session_id)
+            self._evict()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM chat_session_turns WHERE session_id = ?", (session_id,))
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        if self._conn is not None:
+            with self._lock:
+                sessions = self._conn.execute(
+                    "SELECT COUNT(DISTINCT session_id) FROM chat_session_turns"
+                ).fetchone()[0]
+        else:
+            sessions = len(self._sessions)
+        return {
+            "sessions": sessions,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._conn is not None,
+        }
+
+    def _read(self, session_id: str) -> tuple[float, list] | None:
+        """(time of the last turn, the last `max_turns` turns) from SQLite, or None."""
+        rows = self._conn.execute(
+            "SELECT created_at, turn FROM chat_session_turns WHERE session_id = ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (session_id, self.max_turns),
+        ).fetchall()
+        if not rows:
+            return None
+        return rows[0][0], [json.loads(turn) for _, turn in reversed(rows)]
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+
+from app.core.metrics import record_cache
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution whose
+    result (or exception) every caller receives. The shared task is shielded
+    from any single caller going away and is only cancelled once all of its
+    callers have been cancelled.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("SingleFlight")
+        self.executions = 0
+        self.coalesced = 0
+        self._calls: dict[str, _Call] = {}
+
+    async def do(self, key: str, factory):
+        """Await `factory()` for `key`, joining an in-flight call for the same key if any."""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+            self.executions += 1
+            record_cache("single_flight", "leader")
+        else:
+            self.coalesced += 1
+            record_cache("single_flight", "joined")
+            self.logger.info(f"Joined in-flight request ({call.waiters} already waiting).")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # nobody is left to receive the result
+                self._forget(key, call)
+                call.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
+
+    def _finished(self, key: str, call: _Call):
+        self._forget(key, call)
+        if not call.task.cancelled():
+            # mark the exception retrieved even if every caller has gone
+            call.task.exception()
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
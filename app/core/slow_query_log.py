@@ -0,0 +1,176 @@
+"""
+Per-fingerprint statement statistics and a slow-query log.
+
+Every statement the executor runs is reduced to a fingerprint of its shape:
+the canonical SQL with literals replaced by '?' (bind values are never part
+of it). Each fingerprint keeps a count, total/mean/max time and rows. The
+slowest samples over SLOW_QUERY_MS are kept with an `EXPLAIN (ANALYZE,
+BUFFERS)` plan. Plans are captured in the background, at most once per
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS, because ANALYZE runs the statement
+again. The admin API ranks fingerprints by
+total time, so the question shapes that need an index or a rollup come first.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from app.core.result_cache import canonicalize_sql
+from app.core.sql_analysis import parse_sql
+
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_FINGERPRINTS = int(os.getenv("SLOW_QUERY_FINGERPRINTS", "500"))
+SLOW_QUERY_SAMPLES = int(os.getenv("SLOW_QUERY_SAMPLES", "3"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", "60"))
+
+ORDER_BY = ("total_ms", "max_ms", "mean_ms", "count", "rows")
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def query_shape(sql: str) -> str:
+    """`sql` without its literal values; token-based when it does not parse."""
+    return parse_sql(sql).shape or _LITERAL_RE.sub("?", canonicalize_sql(sql))
+
+
+def shape_fingerprint(shape: str) -> str:
+    return hashlib.sha256(shape.encode("utf-8")).hexdigest()[:16]
+
+
+class FingerprintStats:
+    def __init__(self, query: str):
+        self.query = query
+        self.count = 0
+        self.slow_count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.last_seen = 0.0
+        # slowest samples first: {elapsed_ms, rows, params, at, plan}
+        self.samples: list[dict] = []
+
+    def as_dict(self, fingerprint: str) -> dict:
+        return {
+            "fingerprint": fingerprint,
+            "query": self.query,
+            "count": self.count,
+            "slow_count": self.slow_count,
+            "total_ms": round(self.total_ms, 2),
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "max_ms": round(self.max_ms, 2),
+            "rows": self.rows,
+            "last_seen": self.last_seen,
+            "samples": list(self.samples),
+        }
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        slow_ms: float = SLOW_QUERY_MS,
+        max_fingerprints: int = SLOW_QUERY_FINGERPRINTS,
+        samples: int = SLOW_QUERY_SAMPLES,
+        explain: bool = SLOW_QUERY_EXPLAIN,
+        explain_interval_seconds: float = SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+    ):
+        self.slow_ms = slow_ms
+        self.max_fingerprints = max_fingerprints
+        self.samples = samples
+        self.explain = explain
+        self.explain_interval_seconds = explain_interval_seconds
+        self.logger = logging.getLogger("SlowQueryLog")
+        self._stats: OrderedDict[str, FingerprintStats] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_explain = 0.0
+        self._explaining = False
+
+    def record(self, query: str, params: dict | None, elapsed_ms: float, rows: int) -> str | None:
+        """
+        Account one finished statement. Returns its fingerprint when a plan
+        should be captured for it (see `attach_plan`), otherwise None.
+        """
+        if query.lstrip()[:7].upper() == "EXPLAIN":
+            return None
+        shape = query_shape(query)
+        fingerprint = shape_fingerprint(shape)
+        now = time.time()
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                stats = self._stats[fingerprint] = FingerprintStats(shape)
+            self._stats.move_to_end(fingerprint)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.rows += rows
+            stats.last_seen = now
+            while len(self._stats) > self.max_fingerprints:
+                self._stats.popitem(last=False)
+
+            if elapsed_ms < self.slow_ms:
+                return None
+            stats.slow_count += 1
+            kept = len(stats.samples) >= self.samples and elapsed_ms <= stats.samples[-1]["elapsed_ms"]
+            if not kept:
+                stats.samples.append({
+                    "elapsed_ms": round(elapsed_ms, 2), "rows": rows, "query": query,
+                    "params": params, "at": now, "plan": None,
+                })
+                stats.samples.sort(key=lambda sample: -sample["elapsed_ms"])
+                del stats.samples[self.samples:]
+            capture = (
+                not kept
+                and self.explain
+                and not self._explaining
+                and now - self._last_explain >= self.explain_interval_seconds
+            )
+            if capture:
+                self._explaining = True
+                self._last_explain = now
+        self.logger.warning(f"Slow query ({elapsed_ms:.0f} ms, {rows} rows): {query}")
+        return fingerprint if capture else None
+
+    def attach_plan(self, fingerprint: str, elapsed_ms: float, plan):
+        """Store the plan captured for the sample recorded with `elapsed_ms`; None if capture failed."""
+        with self._lock:
+            self._explaining = False
+            stats = self._stats.get(fingerprint)
+            if stats is None or plan is None:
+                return
+            for sample in stats.samples:
+                if sample["elapsed_ms"] == round(elapsed_ms, 2) and sample["plan"] is None:
+                    sample["plan"] = plan
+                    return
+
+    def top(self, limit: int = 20, order_by: str = "total_ms", slow_only: bool = False) -> list[dict]:
+        if order_by not in ORDER_BY:
+            raise ValueError(f"order_by must be one of {', '.join(ORDER_BY)}")
+        with self._lock:
+            entries = [
+                stats.as_dict(fingerprint) for fingerprint, stats in self._stats.items()
+                if stats.slow_count or not slow_only
+            ]
+        entries.sort(key=lambda entry: entry[order_by] or 0, reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "fingerprints": len(self._stats),
+                "statements": sum(stats.count for stats in self._stats.values()),
+                "slow_statements": sum(stats.slow_count for stats in self._stats.values()),
+                "slow_ms": self.slow_ms,
+                "explain": self.explain,
+            }
+
+
+slow_query_log = SlowQueryLog()
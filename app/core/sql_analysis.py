@@ -0,0 +1,212 @@
+"""
+One sqlglot parse per generated statement, shared by every consumer.
+
+parse_sql() returns a ParsedQuery carrying the read-only verdict, the tables
+the statement really reads (CTE names excluded), a canonical SQL string for
+fingerprinting, its literal-free `shape` for grouping statistics, and
+with_limit() for capping the result. Parses are memoized
+by SQL text, so the validator, the row cap, the result cache and the cost
+governor all reuse the same tree.
+"""
+import functools
+import logging
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.dialects.postgres import Postgres
+from sqlglot.errors import SqlglotError
+
+
+logger = logging.getLogger("sql_analysis")
+
+_READ_ROOTS = (exp.Select, exp.Union, exp.Intersect, exp.Except)
+
+_WRITE_NODES = tuple(
+    getattr(exp, name)
+    for name in (
+        "Insert", "Update", "Delete", "Merge", "Create", "Drop", "Alter",
+        "TruncateTable", "Command", "Copy", "Grant", "Set",
+    )
+    if hasattr(exp, name)
+)
+
+# Functions a chat query may call, by the name sqlglot gives them (its own
+# name for functions it models, e.g. str_position for strpos/position, else
+# the name as written). Anything else is refused: functions such as
+# query_to_xml or pg_read_file read relations or files the table allow-list
+# cannot see. Operators and constructs sqlglot models as functions (AND, CASE,
+# CAST, EXTRACT, ...) are listed too.
+ALLOWED_FUNCTIONS = frozenset({
+    # constructs
+    "and", "or", "not", "case", "if", "cast", "try_cast", "exists", "extract", "interval",
+    "coalesce", "nullif", "greatest", "least",
+    # aggregates
+    "count", "sum", "avg", "min", "max", "array_agg", "string_agg", "group_concat",
+    "logical_and", "logical_or", "every", "bool_and", "bool_or", "stddev", "stddev_pop",
+    "stddev_samp", "variance", "variance_pop", "var_samp", "corr", "mode",
+    "percentile_cont", "percentile_disc", "json_agg", "jsonb_agg", "j_s_o_n_array_agg",
+    # window functions
+    "row_number", "rank", "dense_rank", "percent_rank", "cume_dist", "ntile", "lag", "lead",
+    "first_value", "last_value", "nth_value",
+    # text
+    "lower", "upper", "initcap", "trim", "btrim", "ltrim", "rtrim", "length", "char_length",
+    "octet_length", "substring", "substr", "str_position", "strpos", "position", "replace",
+    "translate", "concat", "concat_ws", "left", "right", "pad", "lpad", "rpad", "split_part",
+    "reverse", "repeat", "starts_with", "ascii", "chr", "md5", "format", "quote_literal",
+    "regexp_like", "regexp_replace", "regexp_match", "regexp_matches", "regexp_split_to_array",
+    "string_to_array", "array_to_string", "array_size", "cardinality", "explode",
+    # dates
+    "current_date", "current_time", "current_timestamp", "localtimestamp", "now",
+    "clock_timestamp", "date", "date_part", "date_trunc", "timestamp_trunc", "age",
+    "make_date", "make_interval", "justify_days", "isfinite", "to_char", "time_to_str",
+    "to_date", "to_timestamp", "str_to_date", "str_to_time", "to_number",
+    # numbers
+    "abs", "round", "ceil", "ceiling", "floor", "trunc", "mod", "div", "power", "pow", "sqrt",
+    "cbrt", "exp", "ln", "log", "log10", "sign", "width_bucket", "rand", "random", "pi",
+    # json
+    "to_json", "row_to_json", "json_build_object", "jsonb_build_object",
+})
+
+
+# allowed functions that can return several rows per input row
+_SET_RETURNING_FUNCTIONS = frozenset({"explode", "regexp_matches"})
+
+
+class _BindParamPostgres(Postgres):
+    """Postgres output that keeps SQLAlchemy-style :name bind parameters."""
+
+    class Generator(Postgres.Generator):
+        TRANSFORMS = {
+            **Postgres.Generator.TRANSFORMS,
+            exp.Placeholder: lambda self, e: f":{e.name}" if e.name else "?",
+        }
+
+
+def _function_name(node: exp.Expression) -> str:
+    if isinstance(node, exp.Anonymous):
+        return str(node.this).lower()
+    return node.sql_name().lower()
+
+
+class ParsedQuery:
+    """
+    Analysis of one SQL string. `error` is set (and `read_only` is False)
+    when the text does not parse as exactly one statement.
+    """
+
+    def __init__(self, sql: str):
+        self.sql = (sql or "").strip().rstrip(";").strip()
+        self.expression = None
+        self.error = None
+        self.read_only = False
+        self.tables: frozenset[str] = frozenset()
+        self.canonical = None
+        try:
+            statements = [s for s in sqlglot.parse(self.sql, read="postgres") if s is not None]
+        except SqlglotError as e:
+            self.error = f"Could not parse SQL: {str(e).splitlines()[0]}"
+            return
+        if len(statements) != 1:
+            self.error = f"Expected one SQL statement, found {len(statements)}."
+            return
+
+        self.expression = statements[0]
+        self.canonical = self.expression.sql(dialect=_BindParamPostgres)
+        self.tables = self._referenced_tables()
+        self.read_only, self.error = self._check_read_only()
+
+    @functools.cached_property
+    def shape(self) -> str | None:
+        """Canonical SQL with every literal replaced by '?', so statements differing only in values match."""
+        if self.expression is None:
+            return None
+        return self.expression.transform(
+            lambda node: exp.Var(this="?") if isinstance(node, exp.Literal) else node
+        ).sql(dialect=_BindParamPostgres)
+
+    def with_limit(self, limit: int) -> str:
+        """
+        SQL returning at most `limit` rows. A plain SELECT gets a LIMIT, or
+        has its literal LIMIT lowered. Any other row limit the query has
+        (FETCH FIRST, a bound LIMIT :n) is kept, and the query is wrapped,
+        as are compound or unparsed statements.
+        """
+        limit = int(limit)
+        if isinstance(self.expression, exp.Select):
+            current = self.expression.args.get("limit")
+            if current is None:
+                return self.expression.limit(limit, copy=True).sql(dialect=_BindParamPostgres)
+            count = current.args.get("count") if isinstance(current, exp.Fetch) else current.expression
+            if isinstance(count, exp.Literal) and count.is_int and int(count.name) <= limit:
+                return self.sql
+            if isinstance(current, exp.Limit) and isinstance(count, exp.Literal) and count.is_int:
+                return self.expression.limit(limit, copy=True).sql(dialect=_BindParamPostgres)
+        return f"SELECT * FROM (\n{self.sql}\n) AS capped_result LIMIT {limit}"
+
+    def rows_unique_on(self, column: str, relation: str) -> bool:
+        """
+        True when every result row is a different row of `relation` and
+        returns its `column` as is, so a column unique in `relation` is also
+        unique in the result: a single SELECT from `relation` with no joins,
+        GROUP BY, CTEs or set-returning functions.
+        """
+        select = self.expression
+        if not self.read_only or not isinstance(select, exp.Select):
+            return False
+        source = select.args.get("from_")
+        if (
+            source is None
+            or not isinstance(source.this, exp.Table)
+            or source.this.name.lower() != relation.lower()
+            or select.args.get("joins")
+            or select.args.get("group")
+            or select.args.get("with")
+        ):
+            return False
+        for projection in select.expressions:
+            if any(_function_name(f) in _SET_RETURNING_FUNCTIONS for f in projection.find_all(exp.Func)):
+                return False
+        return any(
+            projection.is_star
+            or isinstance(projection.unalias(), exp.Column)
+            and projection.unalias().name == column
+            and projection.alias_or_name == column
+            for projection in select.expressions
+        )
+
+    def _referenced_tables(self) -> frozenset[str]:
+        cte_names = {cte.alias_or_name.lower() for cte in self.expression.find_all(exp.CTE)}
+        tables = set()
+        for table in self.expression.find_all(exp.Table):
+            name = table.name.lower()
+            if not name:
+                continue
+            if table.db and table.db.lower() != "public":
+                tables.add(f"{table.db.lower()}.{name}")
+            elif name not in cte_names or table.db:
+                tables.add(name)
+        return frozenset(tables)
+
+    def _check_read_only(self) -> tuple[bool, str | None]:
+        if not isinstance(self.expression, _READ_ROOTS):
+            return False, f"Only SELECT statements are allowed, got {self.expression.key.upper()}."
+        if self.expression.find(*_WRITE_NODES):
+            return False, "The statement contains a data-modifying clause."
+        for select in self.expression.find_all(exp.Select):
+            if select.args.get("into") is not None:
+                return False, "SELECT ... INTO creates a table."
+            if select.args.get("locks"):
+                return False, "Row-locking clauses (FOR UPDATE/SHARE) are not allowed."
+        for function in self.expression.find_all(exp.Func):
+            if _function_name(function) not in ALLOWED_FUNCTIONS:
+                return False, f"Function {_function_name(function)}() is not allowed."
+        return True, None
+
+
+@functools.lru_cache(maxsize=2048)
+def parse_sql(sql: str) -> ParsedQuery:
+    """Memoized ParsedQuery for `sql`; treat the result as read-only."""
+    parsed = ParsedQuery(sql)
+    if parsed.error:
+        logger.info(f"{parsed.error} SQL: {sql}")
+    return parsed
@@ -1,6 +1,16 @@
 import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
 from dotenv import load_dotenv
-from sqlalchemy import create_engine,MetaData
+from sqlalchemy import create_engine, MetaData, text
+
+from app.core.metrics import record_db_wait
+from app.core.slow_query_log import slow_query_log
 
 load_dotenv()
 metadata= MetaData()
@@ -11,5 +21,265 @@ DATABASE_URL = (
     f"@{os.environ.get('DB_HOST')}:{int(os.environ.get('DB_PORT', 5432))}/{os.environ.get('DB_NAME')}"
 )
 
-#Creating the database engine 
-engine = create_engine(DATABASE_URL,echo=True)
+#Creating the database engine. Statement logging is off unless DB_ECHO=true;
+# slow statements are recorded by app.core.slow_query_log instead.
+engine = create_engine(DATABASE_URL, echo=os.environ.get("DB_ECHO", "false").lower() == "true")
+
+# Size of the dedicated thread pool that runs SQL for the chatbot. Keep it below
+# the engine pool capacity (pool_size + max_overflow, 15 by default) so neither
+# a worker thread nor the single plan-capture thread waits for a connection.
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", 10))
+
+# Rows fetched per round trip from a server-side cursor when streaming.
+DB_STREAM_BATCH_SIZE = int(os.environ.get("DB_STREAM_BATCH_SIZE", 500))
+
+_END_OF_STREAM = object()
+
+
+def _begin_read_only(connection):
+    # must be the first statement of the transaction; a read-only transaction
+    # refuses writes even if a statement slipped past the SQL validation
+    connection.execute(text("SET TRANSACTION READ ONLY"))
+
+
+def _apply_statement_timeout(connection, timeout_ms: int | None):
+    # transaction-local, so it ends with the rollback that returns the connection
+    if timeout_ms:
+        connection.execute(
+            text("SELECT set_config('statement_timeout', :timeout, true)"),
+            {"timeout": str(int(timeout_ms))},
+        )
+
+
+class _CancelHandle:
+    """Lets the event loop cancel a statement running on a worker thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dbapi_connection = None
+        self.cancelled = False
+
+    def attach(self, dbapi_connection) -> bool:
+        with self._lock:
+            self._dbapi_connection = dbapi_connection
+            return not self.cancelled
+
+    def detach(self):
+        with self._lock:
+            self._dbapi_connection = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            connection = self._dbapi_connection
+        # psycopg2 connections expose cancel(), which asks the server to abort
+        # the statement currently running on that connection.
+        if connection is not None and hasattr(connection, "cancel"):
+            connection.cancel()
+
+
+class QueryExecutor:
+    """
+    Runs blocking SQL on a bounded thread pool so the event loop never waits on
+    PostgreSQL. Every statement runs in a READ ONLY transaction. Cancelling the
+    awaiting task also cancels the statement on the server, e.g. when the HTTP
+    client disconnects. Slow-statement plans are captured on a separate
+    single thread, so the EXPLAIN ANALYZE re-run never occupies a worker that
+    chat queries need.
+    """
+
+    def __init__(self, engine, max_workers: int):
+        self.engine = engine
+        self.max_workers = max_workers
+        self.logger = logging.getLogger("QueryExecutor")
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="db-query"
+        )
+        self._plan_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-plan")
+
+    def _connect(self, submitted: float):
+        """Check out a connection, recording how long the statement waited for a thread and for it."""
+        record_db_wait("executor", time.perf_counter() - submitted)
+        started = time.perf_counter()
+        connection = self.engine.connect()
+        record_db_wait("connection", time.perf_counter() - started)
+        return connection
+
+    def _record(self, query: str, params: dict | None, seconds: float, rows: int):
+        """Account a finished statement; capture its plan in the background when asked to."""
+        elapsed_ms = seconds * 1000
+        fingerprint = slow_query_log.record(query, params, elapsed_ms, rows)
+        if fingerprint is not None:
+            self._plan_pool.submit(self._capture_plan, fingerprint, query, params, elapsed_ms)
+
+    def _capture_plan(self, fingerprint: str, query: str, params: dict | None, elapsed_ms: float):
+        plan = None
+        try:
+            with self.engine.connect() as connection:
+                try:
+                    _begin_read_only(connection)
+                    # give up well before a pathological statement hurts anyone
+                    _apply_statement_timeout(connection, max(1000, int(elapsed_ms * 2)))
+                    plan = connection.execute(
+                        text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}"), params or {}
+                    ).scalar()
+                finally:
+                    connection.rollback()
+        except Exception as e:
+            self.logger.warning(f"Could not capture plan for slow query: {str(e)}")
+        finally:
+            slow_query_log.attach_plan(fingerprint, elapsed_ms, plan)
+
+    def _run(self, query: str, params: dict | None, handle: _CancelHandle,
+             max_rows: int | None, timeout_ms: int | None, submitted: float, record: bool) -> list[dict]:
+        with self._connect(submitted) as connection:
+            if not handle.attach(connection.connection.dbapi_connection):
+                raise asyncio.CancelledError()
+            try:
+                _begin_read_only(connection)
+                _apply_statement_timeout(connection, timeout_ms)
+                started = time.perf_counter()
+                if max_rows is None:
+                    result = connection.execute(text(query), params or {})
+                else:
+                    # server-side cursor: never pull more than max_rows into memory
+                    result = connection.execution_options(
+                        stream_results=True, max_row_buffer=min(max_rows, DB_STREAM_BATCH_SIZE)
+                    ).execute(text(query), params or {})
+                rows = []
+                if result.returns_rows:
+                    fetched = result if max_rows is None else result.fetchmany(max_rows)
+                    rows = [dict(row._mapping) for row in fetched]
+                if record:
+                    self._record(query, params, time.perf_counter() - started, len(rows))
+                return rows
+            finally:
+                handle.detach()
+                connection.rollback()
+
+    def _columns(self, query: str, params: dict | None) -> list[str]:
+        with self.engine.connect() as connection:
+            try:
+                _begin_read_only(connection)
+                result = connection.execute(
+                    text(f"SELECT * FROM (\n{query}\n) AS probe LIMIT 0"), params or {}
+                )
+                return list(result.keys())
+            finally:
+                connection.rollback()
+
+    async def run(
+        self, query: str, params: dict | None = None, max_rows: int | None = None,
+        timeout_ms: int | None = None, record: bool = True,
+    ) -> list[dict]:
+        """
+        Execute a read-only statement and return its rows as dicts. With
+        `max_rows`, rows are fetched through a server-side cursor and at most
+        that many are read. `timeout_ms` sets statement_timeout for this
+        statement only. Pass `record=False` for the app's own bookkeeping
+        statements, so the slow-query log ranks only user SQL.
+        """
+        handle = _CancelHandle()
+        loop = asyncio.get_running_loop()
+        # the copied context carries the request's metrics trace to the worker thread
+        future = loop.run_in_executor(
+            self._pool, contextvars.copy_context().run, self._run,
+            query, params, handle, max_rows, timeout_ms, time.perf_counter(), record,
+        )
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self.logger.warning("Query cancelled, aborting statement on the server.")
+            await loop.run_in_executor(None, handle.cancel)
+            raise
+
+    async def columns(self, query: str, params: dict | None = None) -> list[str]:
+        """Column names a statement would return, without fetching any rows."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._columns, query, params)
+
+    def _stream(self, query, params, batch_size, timeout_ms, handle, loop, queue, submitted):
+        def emit(item) -> bool:
+            # blocks the worker while the consumer is behind (backpressure),
+            # but gives up as soon as the consumer has gone away
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=0.5)
+                    return True
+                except FutureTimeoutError:
+                    if handle.cancelled:
+                        future.cancel()
+                        return False
+
+        try:
+            with self._connect(submitted) as connection:
+                if not handle.attach(connection.connection.dbapi_connection):
+                    return
+                try:
+                    _begin_read_only(connection)
+                    _apply_statement_timeout(connection, timeout_ms)
+                    # only time spent in PostgreSQL counts, not waiting for the consumer
+                    started = time.perf_counter()
+                    # stream_results makes psycopg2 use a named (server-side) cursor
+                    result = connection.execution_options(
+                        stream_results=True, max_row_buffer=batch_size
+                    ).execute(text(query), params or {})
+                    seconds, rows = time.perf_counter() - started, 0
+                    partitions = result.partitions(batch_size) if result.returns_rows else iter(())
+                    while True:
+                        started = time.perf_counter()
+                        partition = next(partitions, None)
+                        seconds += time.perf_counter() - started
+                        if partition is None:
+                            break
+                        rows += len(partition)
+                        if not emit([dict(row._mapping) for row in partition]):
+                            return
+                    self._record(query, params, seconds, rows)
+                finally:
+                    handle.detach()
+                    connection.rollback()
+            emit(_END_OF_STREAM)
+        except Exception as e:
+            if not handle.cancelled:
+                emit(e)
+
+    async def stream(
+        self, query: str, params: dict | None = None, batch_size: int | None = None,
+        timeout_ms: int | None = None,
+    ):
+        """
+        Execute a read-only statement through a server-side cursor, yielding
+        lists of row dicts as they arrive instead of materializing the result.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=2)
+        handle = _CancelHandle()
+        worker = loop.run_in_executor(
+            self._pool, contextvars.copy_context().run, self._stream, query, params,
+            batch_size or DB_STREAM_BATCH_SIZE, timeout_ms, handle, loop, queue, time.perf_counter(),
+        )
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    await worker
+                    raise item
+                yield item
+            await worker
+        finally:
+            if not worker.done():
+                self.logger.warning("Stream abandoned, aborting statement on the server.")
+                await loop.run_in_executor(None, handle.cancel)
+                # let the worker notice and hand its connection back to the pool
+                await asyncio.wait({worker}, timeout=5)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._plan_pool.shutdown(wait=False, cancel_futures=True)
+
+
+db_executor = QueryExecutor(engine, max_workers=DB_EXECUTOR_WORKERS)
@@ -0,0 +1,292 @@
+"""
+Bulk loader for DRT case dumps.
+
+    python -m app.manage ingest dump.csv [more.csv.gz ...]
+
+Each dump is a CSV file with a header row naming CASE_TABLE columns, plain
+or gzipped. A load works like this:
+
+1. The files are COPYed into a temporary staging table.
+2. In the same transaction, rows are upserted into CASE_TABLE by CASE_KEY
+   (diary_no, filing_no, doc_name). Within a load, the last row for a key
+   wins. Rows whose values did not change are not rewritten.
+3. The counts go to drt_ingest_log.
+
+The first load adds a unique index on CASE_KEY to CASE_TABLE. If the table
+already holds rows that share a key, the load stops and reports them. With
+`--dedupe`, all but the last-stored copy of each key are moved to
+CASE_TABLE_duplicates first.
+
+A failed load leaves CASE_TABLE untouched. If anything changed, the next
+generation of the serving view is built beside the live one and swapped in
+(see `swap_serving_view`), and then the rollup is rebuilt. The chatbot
+therefore reads either the old data or the new data, never a half-loaded
+table.
+"""
+import csv
+import gzip
+import logging
+from pathlib import Path
+
+from sqlalchemy import text
+
+from app.maintenance.serving_view import swap_serving_view
+from app.maintenance.rollups import build_rollups
+from app.table_info import CASE_TABLE, CASE_COLUMNS, CASE_KEY
+
+
+logger = logging.getLogger("maintenance.ingest")
+
+STAGING_TABLE = f"{CASE_TABLE}_staging"
+INGEST_LOG_TABLE = "drt_ingest_log"
+CASE_KEY_INDEX = f"{CASE_TABLE}_key_idx"
+DUPLICATES_TABLE = f"{CASE_TABLE}_duplicates"
+# Duplicate keys listed when a load refuses to add CASE_KEY_INDEX.
+DUPLICATE_SAMPLE_SIZE = 5
+
+CREATE_INGEST_LOG_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {INGEST_LOG_TABLE} (
+    id BIGSERIAL PRIMARY KEY,
+    source TEXT NOT NULL,
+    staged_rows BIGINT NOT NULL,
+    inserted_rows BIGINT NOT NULL,
+    updated_rows BIGINT NOT NULL,
+    deleted_rows BIGINT NOT NULL,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    published_at TIMESTAMPTZ,
+    data_version BIGINT
+)
+"""
+
+
+def _key_expr(column: str, alias: str = "") -> str:
+    # NULL keys compare equal to each other, as '' does
+    prefix = f"{alias}." if alias else ""
+    return f"COALESCE({prefix}{column}, '')"
+
+
+def _key_match(left: str, right: str) -> str:
+    return " AND ".join(f"{_key_expr(c, left)} = {_key_expr(c, right)}" for c in CASE_KEY)
+
+
+def open_dump(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def read_header(handle) -> list[str]:
+    """Column names from the dump's header row; leaves `handle` at the first data row."""
+    header = next(csv.reader([handle.readline()]), [])
+    columns = [column.strip().lower() for column in header]
+    unknown = [column for column in columns if column not in CASE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns in dump: {', '.join(unknown)}")
+    missing = [column for column in CASE_KEY if column not in columns]
+    if missing:
+        raise ValueError(f"Dump lacks key columns: {', '.join(missing)}")
+    return columns
+
+
+class DuplicateKeys(ValueError):
+    pass
+
+
+def _duplicate_rows_query() -> str:
+    """ctids of every row of CASE_TABLE except the last-stored one for its key."""
+    keys = ", ".join(_key_expr(c) for c in CASE_KEY)
+    return (
+        f"SELECT row_ctid FROM (SELECT ctid AS row_ctid, "
+        f"row_number() OVER (PARTITION BY {keys} ORDER BY ctid DESC) AS copy "
+        f"FROM {CASE_TABLE}) ranked WHERE copy > 1"
+    )
+
+
+def duplicate_report(connection) -> tuple[int, list[dict]]:
+    """(rows that would be dropped to make CASE_KEY unique, a sample of the repeated keys)."""
+    count = connection.execute(text(f"SELECT COUNT(*) FROM ({_duplicate_rows_query()}) d")).scalar()
+    if not count:
+        return 0, []
+    keys = ", ".join(_key_expr(c) for c in CASE_KEY)
+    sample = connection.execute(text(
+        f"SELECT {', '.join(f'{_key_expr(c)} AS {c}' for c in CASE_KEY)}, COUNT(*) AS copies "
+        f"FROM {CASE_TABLE} GROUP BY {keys} "
+        f"HAVING COUNT(*) > 1 ORDER BY copies DESC LIMIT :limit"
+    ), {"limit": DUPLICATE_SAMPLE_SIZE}).mappings().all()
+    return count, [dict(row) for row in sample]
+
+
+def move_duplicates(connection) -> int:
+    """Move all but the last-stored row of each CASE_KEY into DUPLICATES_TABLE."""
+    names = ", ".join(CASE_COLUMNS)
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {DUPLICATES_TABLE} "
+        f"(LIKE {CASE_TABLE}, removed_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    ))
+    return connection.execute(text(
+        f"WITH removed AS ("
+        f"DELETE FROM {CASE_TABLE} WHERE ctid IN ({_duplicate_rows_query()}) RETURNING {names}"
+        f") INSERT INTO {DUPLICATES_TABLE} ({names}) SELECT {names} FROM removed"
+    )).rowcount
+
+
+def ensure_case_table(connection, dedupe: bool = False):
+    """
+    Create CASE_TABLE if missing and make CASE_KEY unique in it. Rows that
+    share a key raise DuplicateKeys, unless `dedupe` moves the extra copies
+    to DUPLICATES_TABLE.
+    """
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {CASE_TABLE} "
+        f"({', '.join(f'{column} text' for column in CASE_COLUMNS)})"
+    ))
+    exists = connection.execute(
+        text("SELECT to_regclass(:name)"), {"name": CASE_KEY_INDEX}
+    ).scalar()
+    if exists:
+        return
+    if dedupe:
+        moved = move_duplicates(connection)
+        if moved:
+            logger.warning(f"Moved {moved} duplicate rows from {CASE_TABLE} to {DUPLICATES_TABLE}.")
+    else:
+        count, sample = duplicate_report(connection)
+        if count:
+            examples = "; ".join(
+                f"{', '.join(f'{c}={row[c]!r}' for c in CASE_KEY)} ({row['copies']} copies)"
+                for row in sample
+            )
+            raise DuplicateKeys(
+                f"{CASE_TABLE} has {count} rows whose ({', '.join(CASE_KEY)}) repeats another row, "
+                f"e.g. {examples}. Rerun with --dedupe to move them to {DUPLICATES_TABLE} "
+                f"(the last-stored copy of each key stays)."
+            )
+    connection.execute(text(
+        f"CREATE UNIQUE INDEX {CASE_KEY_INDEX} ON {CASE_TABLE} "
+        f"({', '.join(f'({_key_expr(c)})' for c in CASE_KEY)})"
+    ))
+
+
+def stage(connection, paths: list[Path]) -> tuple[list[str], int]:
+    """COPY the dumps into a temporary staging table; returns (columns, rows staged)."""
+    connection.execute(text(
+        f"CREATE TEMP TABLE {STAGING_TABLE} "
+        f"(load_seq BIGSERIAL, {', '.join(f'{column} text' for column in CASE_COLUMNS)}) "
+        f"ON COMMIT DROP"
+    ))
+    columns = None
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        for path in paths:
+            with open_dump(path) as handle:
+                header = read_header(handle)
+                if columns is not None and set(header) != set(columns):
+                    raise ValueError(f"{path} has different columns than {paths[0]}.")
+                columns = columns or header
+                cursor.copy_expert(
+                    f"COPY {STAGING_TABLE} ({', '.join(header)}) FROM STDIN WITH (FORMAT csv)", handle
+                )
+            logger.info(f"Staged {path}.")
+    finally:
+        cursor.close()
+    # temporary tables are never analyzed by autovacuum
+    connection.execute(text(f"ANALYZE {STAGING_TABLE}"))
+    staged = connection.execute(text(f"SELECT COUNT(*) FROM {STAGING_TABLE}")).scalar()
+    return columns, staged
+
+
+def upsert_statement(columns: list[str]) -> str:
+    """
+    Insert new keys and update changed rows, counting each. Only the dump's
+    columns are written, so a dump without some column leaves it unchanged.
+    """
+    names = ", ".join(columns)
+    keys = ", ".join(_key_expr(c) for c in CASE_KEY)
+    values = [c for c in columns if c not in CASE_KEY]
+    if values:
+        changed = (
+            f"ROW({', '.join(f'{CASE_TABLE}.{c}' for c in values)}) IS DISTINCT FROM "
+            f"ROW({', '.join(f'EXCLUDED.{c}' for c in values)})"
+        )
+        on_conflict = (
+            f"DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in values)} WHERE {changed}"
+        )
+    else:
+        on_conflict = "DO NOTHING"
+    return f"""
+        WITH latest AS (
+            SELECT DISTINCT ON ({keys}) {names}
+            FROM {STAGING_TABLE}
+            ORDER BY {keys}, load_seq DESC
+        ), written AS (
+            INSERT INTO {CASE_TABLE} ({names})
+            SELECT {names} FROM latest
+            ON CONFLICT ({', '.join(f'({_key_expr(c)})' for c in CASE_KEY)}) {on_conflict}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+        FROM written
+    """
+
+
+def delete_missing(connection) -> int:
+    """Delete rows whose key is not in the staged dumps (for complete snapshots)."""
+    return connection.execute(text(
+        f"DELETE FROM {CASE_TABLE} t WHERE NOT EXISTS "
+        f"(SELECT 1 FROM {STAGING_TABLE} s WHERE {_key_match('t', 's')})"
+    )).rowcount
+
+
+def ingest(
+    engine, paths: list[str], full_snapshot: bool = False, publish: bool = True, dedupe: bool = False,
+) -> dict:
+    """
+    Load case dumps into CASE_TABLE and publish the result. With
+    `full_snapshot`, the dumps are the complete data set and keys missing
+    from them are deleted. `dedupe` is passed to `ensure_case_table`.
+    """
+    paths = [Path(path) for path in paths]
+    with engine.begin() as connection:
+        ensure_case_table(connection, dedupe=dedupe)
+        columns, staged = stage(connection, paths)
+        logger.info(f"Merging {staged} staged rows into {CASE_TABLE}.")
+        inserted, updated = connection.execute(text(upsert_statement(columns))).one()
+        deleted = delete_missing(connection) if full_snapshot else 0
+        connection.execute(text(CREATE_INGEST_LOG_TABLE))
+        log_id = connection.execute(
+            text(
+                f"INSERT INTO {INGEST_LOG_TABLE} "
+                f"(source, staged_rows, inserted_rows, updated_rows, deleted_rows) "
+                f"VALUES (:source, :staged, :inserted, :updated, :deleted) RETURNING id"
+            ),
+            {
+                "source": ", ".join(str(path) for path in paths), "staged": staged,
+                "inserted": inserted, "updated": updated, "deleted": deleted,
+            },
+        ).scalar_one()
+    summary = {
+        "log_id": log_id, "staged": staged, "inserted": inserted,
+        "updated": updated, "deleted": deleted, "data_version": None,
+    }
+    logger.info(
+        f"{CASE_TABLE}: {inserted} inserted, {updated} updated, {deleted} deleted "
+        f"({staged} rows staged)."
+    )
+
+    if not publish:
+        logger.info("Not publishing; run `python -m app.manage serving-view` when ready.")
+        return summary
+    if not (inserted or updated or deleted):
+        logger.info("No changes; the serving view is already current.")
+        return summary
+    summary["data_version"] = swap_serving_view(engine)
+    build_rollups(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                f"UPDATE {INGEST_LOG_TABLE} SET published_at = now(), data_version = :version "
+                f"WHERE id = :id"
+            ),
+            {"version": summary["data_version"], "id": log_id},
+        )
+    return summary
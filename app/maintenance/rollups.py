@@ -0,0 +1,100 @@
+"""
+Pre-aggregated counts and disposal-day sums for statistics questions.
+
+drt_case_rollup holds one row per DRT x case_type x status x filing
+year/FY/month x disposal year/FY, built from the serving view. The
+RollupRouter (app/core/rollup_router.py) answers matching COUNT/AVG queries
+from it. The table comment records the data version it was built for, so
+the router ignores a rollup left behind by a later data refresh.
+
+A case (diary_no) has one row per document. Each group counts both its rows
+and its distinct cases. The case counts add up across groups only when every
+case has the same dimension values on all of its rows. The build checks
+that, and records the result in the comment as `cases=exact`. Otherwise
+COUNT(DISTINCT diary_no) queries are not routed to the rollup.
+"""
+import logging
+
+from sqlalchemy import text
+
+from app.core.data_version import DATA_VERSION_TABLE, CREATE_DATA_VERSION_TABLE
+from app.maintenance.serving_view import index_statement
+from app.table_info import CASE_SERVING_VIEW, CASE_ROLLUP_TABLE
+
+
+logger = logging.getLogger("maintenance.rollups")
+
+# Bumped whenever the rollup's columns change, so an older table is not read.
+ROLLUP_FORMAT = 2
+
+ROLLUP_DIMENSIONS = (
+    "drt_name",
+    "case_type",
+    "case_status",
+    "filing_year",
+    "filing_fy",
+    "filing_month",
+    "disposal_year",
+    "disposal_fy",
+)
+
+ROLLUP_INDEXES = [
+    ("drt", "", "(drt_name)"),
+    ("status_disposal", "", "(case_status, disposal_year, disposal_fy)"),
+    ("filing", "", "(filing_year, filing_fy)"),
+]
+
+
+def build_rollups(engine):
+    """
+    Rebuild the rollup into a fresh table and swap it in, so readers see either
+    the complete old generation or the complete new one.
+    """
+    staging = f"{CASE_ROLLUP_TABLE}_next"
+    dimensions = ", ".join(ROLLUP_DIMENSIONS)
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        logger.info(f"Aggregating {CASE_SERVING_VIEW} into {staging}.")
+        connection.execute(text(f"""
+            CREATE TABLE {staging} AS
+            SELECT
+                {dimensions},
+                COUNT(*)::bigint AS row_count,
+                COUNT(DISTINCT diary_no)::bigint AS case_count,
+                SUM(disposal_diffdays) AS disposal_days_sum,
+                COUNT(disposal_diffdays)::bigint AS disposal_days_count,
+                COUNT(DISTINCT diary_no) FILTER (WHERE disposal_diffdays IS NOT NULL)::bigint
+                    AS disposal_case_count
+            FROM {CASE_SERVING_VIEW}
+            GROUP BY {dimensions}
+        """))
+        # every case falls in exactly one group iff the per-group counts add up
+        cases_exact = connection.execute(text(f"""
+            SELECT (SELECT COALESCE(SUM(case_count), 0) FROM {staging})
+                 = (SELECT COUNT(DISTINCT diary_no) FROM {CASE_SERVING_VIEW})
+        """)).scalar()
+        if not cases_exact:
+            logger.warning(
+                f"Some cases have different {', '.join(ROLLUP_DIMENSIONS)} values across their "
+                f"rows; COUNT(DISTINCT diary_no) queries will not use {CASE_ROLLUP_TABLE}."
+            )
+        for index in ROLLUP_INDEXES:
+            connection.execute(text(index_statement(staging, *index)))
+        connection.execute(text(f"ANALYZE {staging}"))
+
+        connection.execute(text(CREATE_DATA_VERSION_TABLE))
+        version = connection.execute(
+            text(f"SELECT version FROM {DATA_VERSION_TABLE} WHERE id = 1")
+        ).scalar()
+        connection.execute(text(f"DROP TABLE IF EXISTS {CASE_ROLLUP_TABLE}"))
+        connection.execute(text(f"ALTER TABLE {staging} RENAME TO {CASE_ROLLUP_TABLE}"))
+        for suffix, _, _ in ROLLUP_INDEXES:
+            connection.execute(text(
+                f"ALTER INDEX {staging}_{suffix}_idx RENAME TO {CASE_ROLLUP_TABLE}_{suffix}_idx"
+            ))
+        connection.execute(text(
+            f"COMMENT ON TABLE {CASE_ROLLUP_TABLE} IS "
+            f"'data_version={version};format={ROLLUP_FORMAT};cases={'exact' if cases_exact else 'per_group'}'"
+        ))
+        groups = connection.execute(text(f"SELECT COUNT(*) FROM {CASE_ROLLUP_TABLE}")).scalar()
+    logger.info(f"{CASE_ROLLUP_TABLE} rebuilt: {groups} groups for data version {version}.")
@@ -0,0 +1,258 @@
+"""
+Typed serving layer over the raw case table.
+
+The loader writes every column of the raw table (CASE_TABLE) as text (dates,
+amounts and 'NaN' day counts included). The chatbot queries the materialized
+view built here instead: real DATE/NUMERIC columns, a normalized case_status,
+calendar/financial-year columns and B-tree indexes for the common filters.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.data_version import bump_data_version
+from app.maintenance.trigram_indexes import (
+    TEXT_MATCH_COLUMNS, trigram_index_name, trigram_index_statement,
+)
+from app.table_info import CASE_TABLE, CASE_SERVING_VIEW
+
+
+logger = logging.getLogger("maintenance.serving_view")
+
+
+HELPER_FUNCTIONS = [
+    """
+    CREATE OR REPLACE FUNCTION drt_clean_text(value text) RETURNS text
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN value IS NULL OR btrim(value) IN ('', 'NaN', 'NaT', 'None', 'null') THEN NULL
+            ELSE value
+        END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION drt_try_date(value text) RETURNS date
+    LANGUAGE plpgsql STABLE AS $$
+    BEGIN
+        IF drt_clean_text(value) IS NULL THEN
+            RETURN NULL;
+        END IF;
+        RETURN btrim(value)::date;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION drt_try_numeric(value text) RETURNS numeric
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    BEGIN
+        IF drt_clean_text(value) IS NULL THEN
+            RETURN NULL;
+        END IF;
+        RETURN btrim(value)::numeric;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END
+    $$
+    """,
+    # Indian financial year label, e.g. 2023-06-10 -> '2023-24'
+    """
+    CREATE OR REPLACE FUNCTION drt_fy(value date) RETURNS text
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN value IS NULL THEN NULL
+            WHEN extract(month FROM value) >= 4 THEN
+                extract(year FROM value)::int || '-'
+                || lpad(((extract(year FROM value)::int + 1) % 100)::text, 2, '0')
+            ELSE
+                (extract(year FROM value)::int - 1) || '-'
+                || lpad((extract(year FROM value)::int % 100)::text, 2, '0')
+        END
+    $$
+    """,
+]
+
+SERVING_VIEW_STATEMENT = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS {view} AS
+SELECT
+    t.*,
+    extract(year FROM t.case_filing_date)::int AS filing_year,
+    extract(month FROM t.case_filing_date)::int AS filing_month,
+    drt_fy(t.case_filing_date) AS filing_fy,
+    extract(year FROM t.case_disposed_off_date)::int AS disposal_year,
+    drt_fy(t.case_disposed_off_date) AS disposal_fy
+FROM (
+    SELECT
+        -- stable across refreshes, so REFRESH ... CONCURRENTLY only rewrites
+        -- rows that changed: the natural key, plus a position among rows
+        -- that share it (duplicate document rows exist), ordered by content
+        concat_ws(
+            chr(31), coalesce(diary_no, ''), coalesce(filing_no, ''), coalesce(doc_name, ''),
+            row_number() OVER (PARTITION BY diary_no, filing_no, doc_name ORDER BY raw::text)
+        ) AS serving_row_id,
+        diary_no,
+        filing_no,
+        case_no,
+        drt_clean_text(case_type) AS case_type,
+        drt_try_date(case_filing_date) AS case_filing_date,
+        drt_try_date(case_registration_date) AS case_registration_date,
+        drt_clean_text(petitioner_name) AS petitioner_name,
+        drt_clean_text(respondent_name) AS respondent_name,
+        upper(drt_clean_text(case_status)) AS case_status,
+        drt_try_date(scrutiny_notification_date) AS scrutiny_notification_date,
+        drt_try_date(scrutiny_compliance_date) AS scrutiny_compliance_date,
+        drt_clean_text(scrutiny_objection_status_1_2) AS scrutiny_objection_status_1_2,
+        drt_try_date(case_first_listing_date) AS case_first_listing_date,
+        drt_try_numeric(suit_amount) AS suit_amount,
+        drt_try_date(daily_order_uploaded_date) AS daily_order_uploaded_date,
+        drt_clean_text(final_order_upload) AS final_order_upload,
+        drt_clean_text(document_upload_url) AS document_upload_url,
+        drt_clean_text(master_doc_name) AS master_doc_name,
+        drt_clean_text(doc_name) AS doc_name,
+        drt_try_date(case_disposed_off_date) AS case_disposed_off_date,
+        drt_try_numeric(scrutiney_time) AS scrutiney_time,
+        drt_try_numeric(case_listing_time) AS case_listing_time,
+        drt_try_numeric(disposal_diffdays) AS disposal_diffdays,
+        drt_clean_text(drt_name) AS drt_name,
+        drt_try_numeric(filing_no_rank_no) AS filing_no_rank_no
+    FROM {source} AS raw
+) t
+WITH NO DATA
+"""
+CREATE_SERVING_VIEW = SERVING_VIEW_STATEMENT.format(view=CASE_SERVING_VIEW, source=CASE_TABLE)
+
+# Lock wait allowed for the swap in `swap_serving_view`, and how often to retry it.
+SWAP_LOCK_TIMEOUT_MS = 2000
+SWAP_ATTEMPTS = 10
+
+# (name suffix, UNIQUE or "", column list and options). The unique index is
+# what allows REFRESH MATERIALIZED VIEW CONCURRENTLY.
+SERVING_VIEW_INDEXES = [
+    ("row_id", "UNIQUE", "(serving_row_id)"),
+    ("diary_no", "", "(diary_no)"),
+    ("filing_no", "", "(filing_no)"),
+    ("case_no", "", "(case_no)"),
+    ("filing_date", "", "(case_filing_date)"),
+    ("disposed_date", "", "(case_disposed_off_date)"),
+    ("status_disposed", "", "(case_status, case_disposed_off_date)"),
+    ("filing_fy", "", "(filing_fy, drt_name)"),
+    (
+        "disposal_fy_days", "",
+        "(disposal_fy, drt_name) INCLUDE (disposal_diffdays) WHERE case_status = 'D'",
+    ),
+]
+
+
+def index_statement(relation: str, suffix: str, unique: str, clause: str) -> str:
+    unique = f"{unique} " if unique else ""
+    return f"CREATE {unique}INDEX IF NOT EXISTS {relation}_{suffix}_idx ON {relation} {clause}"
+
+
+def serving_view_exists(connection, name: str = CASE_SERVING_VIEW) -> bool:
+    return bool(
+        connection.execute(
+            text("SELECT 1 FROM pg_matviews WHERE matviewname = :name"),
+            {"name": name},
+        ).scalar()
+    )
+
+
+def create_serving_view(engine, rebuild: bool = False):
+    """
+    Create the view if it is missing (or, with `rebuild`, drop and recreate
+    it), make sure every index exists, and populate it.
+    """
+    with engine.begin() as connection:
+        existed = serving_view_exists(connection)
+        if rebuild and existed:
+            logger.info(f"Dropping {CASE_SERVING_VIEW}.")
+            connection.execute(text(f"DROP MATERIALIZED VIEW {CASE_SERVING_VIEW}"))
+            existed = False
+        for statement in HELPER_FUNCTIONS:
+            connection.execute(text(statement))
+        if not existed:
+            connection.execute(text(CREATE_SERVING_VIEW))
+            # nobody reads a brand-new view yet, so the trigram indexes can be
+            # built inside this transaction instead of CONCURRENTLY
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for column in TEXT_MATCH_COLUMNS:
+                connection.execute(text(trigram_index_statement(column, concurrently=False)))
+        for index in SERVING_VIEW_INDEXES:
+            connection.execute(text(index_statement(CASE_SERVING_VIEW, *index)))
+        logger.info(f"Populating {CASE_SERVING_VIEW} from {CASE_TABLE}.")
+        mode = "CONCURRENTLY " if existed else ""
+        connection.execute(text(f"REFRESH MATERIALIZED VIEW {mode}{CASE_SERVING_VIEW}"))
+        connection.execute(text(f"ANALYZE {CASE_SERVING_VIEW}"))
+        version = bump_data_version(connection)
+    logger.info(f"{CASE_SERVING_VIEW} ready (data version {version}).")
+
+
+def refresh_serving_view(engine, concurrently: bool = True):
+    """
+    Re-read the raw table into the view. CONCURRENTLY keeps the old contents
+    readable for the whole refresh instead of locking out chat queries.
+    """
+    with engine.begin() as connection:
+        if not serving_view_exists(connection):
+            raise RuntimeError(
+                f"{CASE_SERVING_VIEW} does not exist; run "
+                f"`python -m app.manage serving-view --create` first."
+            )
+        mode = "CONCURRENTLY " if concurrently else ""
+        logger.info(f"Refreshing {CASE_SERVING_VIEW}.")
+        connection.execute(text(f"REFRESH MATERIALIZED VIEW {mode}{CASE_SERVING_VIEW}"))
+        connection.execute(text(f"ANALYZE {CASE_SERVING_VIEW}"))
+        version = bump_data_version(connection)
+    logger.info(f"{CASE_SERVING_VIEW} refreshed (data version {version}).")
+
+
+def _index_names(relation: str) -> list[str]:
+    return [f"{relation}_{suffix}_idx" for suffix, _, _ in SERVING_VIEW_INDEXES] + [
+        trigram_index_name(column, relation) for column in TEXT_MATCH_COLUMNS
+    ]
+
+
+def swap_serving_view(engine, source: str = CASE_TABLE) -> int:
+    """
+    Build the next generation of the view from `source` under a side name,
+    with all of its indexes, then swap it in with renames in one short
+    transaction. Readers keep the old generation until the swap commits, and
+    nothing is diffed row by row as REFRESH ... CONCURRENTLY would. Returns
+    the new data version.
+    """
+    next_view = f"{CASE_SERVING_VIEW}_next"
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {next_view}"))
+        for statement in HELPER_FUNCTIONS:
+            connection.execute(text(statement))
+        logger.info(f"Building {next_view} from {source}.")
+        connection.execute(text(SERVING_VIEW_STATEMENT.format(view=next_view, source=source)))
+        connection.execute(text(f"REFRESH MATERIALIZED VIEW {next_view}"))
+        for index in SERVING_VIEW_INDEXES:
+            connection.execute(text(index_statement(next_view, *index)))
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for column in TEXT_MATCH_COLUMNS:
+            connection.execute(text(trigram_index_statement(column, concurrently=False, relation=next_view)))
+        connection.execute(text(f"ANALYZE {next_view}"))
+
+    # The DROP needs an exclusive lock on the live view. Wait only briefly for
+    # running chat queries, so new ones do not queue up behind the swap.
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(f"SET LOCAL lock_timeout = {SWAP_LOCK_TIMEOUT_MS}"))
+                connection.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {CASE_SERVING_VIEW}"))
+                connection.execute(text(f"ALTER MATERIALIZED VIEW {next_view} RENAME TO {CASE_SERVING_VIEW}"))
+                for old, new in zip(_index_names(next_view), _index_names(CASE_SERVING_VIEW)):
+                    connection.execute(text(f"ALTER INDEX {old} RENAME TO {new}"))
+                version = bump_data_version(connection)
+            break
+        except OperationalError as e:
+            # 55P03: lock_not_available
+            if getattr(e.orig, "pgcode", None) != "55P03" or attempt == SWAP_ATTEMPTS:
+                raise
+            logger.warning(f"{CASE_SERVING_VIEW} is busy; retrying the swap ({attempt}/{SWAP_ATTEMPTS}).")
+    logger.info(f"{CASE_SERVING_VIEW} swapped in (data version {version}).")
+    return version
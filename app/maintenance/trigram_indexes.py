@@ -0,0 +1,83 @@
+"""
+pg_trgm GIN indexes for the text-matching rule in WRITE_QUERY_PROMPT.
+
+The prompt makes the LLM filter party, tribunal and document names with
+LOWER(column) LIKE LOWER('%value%'). A B-tree cannot serve a leading
+wildcard, but a trigram GIN index on the same LOWER(column) expression can.
+"""
+import logging
+
+from sqlalchemy import text
+
+from app.table_info import CASE_SERVING_VIEW
+
+
+logger = logging.getLogger("maintenance.trigram_indexes")
+
+# Columns the prompt's "Text matching" rule applies LIKE '%value%' to.
+TEXT_MATCH_COLUMNS = (
+    "petitioner_name",
+    "respondent_name",
+    "drt_name",
+    "doc_name",
+    "master_doc_name",
+)
+
+
+def trigram_index_name(column: str, relation: str = CASE_SERVING_VIEW) -> str:
+    return f"{relation}_{column}_trgm_idx"
+
+
+def trigram_index_statement(column: str, concurrently: bool = True,
+                            relation: str = CASE_SERVING_VIEW) -> str:
+    mode = "CONCURRENTLY " if concurrently else ""
+    return (
+        f"CREATE INDEX {mode}IF NOT EXISTS {trigram_index_name(column, relation)} "
+        f"ON {relation} USING gin (lower({column}) gin_trgm_ops)"
+    )
+
+
+def trigram_index_status(connection) -> dict:
+    """{index name: True if valid, False if present but invalid}; missing ones are absent."""
+    rows = connection.execute(
+        text(
+            "SELECT c.relname, i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = ANY(:names)"
+        ),
+        {"names": [trigram_index_name(column) for column in TEXT_MATCH_COLUMNS]},
+    )
+    return {name: valid for name, valid in rows}
+
+
+def missing_trigram_indexes(connection) -> list[str]:
+    """Columns whose trigram index is missing or left invalid by a failed build."""
+    status = trigram_index_status(connection)
+    return [c for c in TEXT_MATCH_COLUMNS if not status.get(trigram_index_name(c))]
+
+
+def ensure_trigram_indexes(engine, rebuild: bool = False):
+    """
+    Create any missing trigram index with CREATE INDEX CONCURRENTLY so chat
+    queries keep running during the build. Invalid leftovers from an
+    interrupted build are dropped and recreated; `rebuild` reindexes all.
+    """
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        status = trigram_index_status(connection)
+        for column in TEXT_MATCH_COLUMNS:
+            name = trigram_index_name(column)
+            if status.get(name) is False:
+                logger.info(f"Dropping invalid index {name}.")
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            elif status.get(name) and rebuild:
+                logger.info(f"Reindexing {name}.")
+                connection.execute(text(f"REINDEX INDEX CONCURRENTLY {name}"))
+                continue
+            elif status.get(name):
+                continue
+            logger.info(f"Creating {name}.")
+            connection.execute(text(trigram_index_statement(column)))
+        connection.execute(text(f"ANALYZE {CASE_SERVING_VIEW}"))
+    logger.info("Trigram indexes are in place.")
@@ -0,0 +1,97 @@
+"""
+Database maintenance commands.
+
+    python -m app.manage serving-view --create     # create/populate the typed view
+    python -m app.manage serving-view --rebuild    # drop and recreate it
+    python -m app.manage serving-view              # refresh it (and the rollups) after a data load
+    python -m app.manage rollups                   # rebuild the statistics rollup only
+    python -m app.manage trigram-indexes           # create missing pg_trgm indexes
+    python -m app.manage schema-snapshot           # re-reflect the tables after a schema change
+    python -m app.manage ingest dump.csv.gz        # load a case dump and publish it
+"""
+import argparse
+import logging
+
+from app.db import engine
+from app.maintenance.serving_view import create_serving_view, refresh_serving_view
+from app.maintenance.trigram_indexes import ensure_trigram_indexes
+from app.maintenance.rollups import build_rollups
+from app.maintenance.ingest import DuplicateKeys, ingest
+from app.core.schema_snapshot import refresh_schema_snapshot
+
+
+def serving_view_command(args):
+    if args.create or args.rebuild:
+        create_serving_view(engine, rebuild=args.rebuild)
+    else:
+        refresh_serving_view(engine, concurrently=not args.blocking)
+    if not args.skip_rollups:
+        build_rollups(engine)
+
+
+def trigram_indexes_command(args):
+    ensure_trigram_indexes(engine, rebuild=args.rebuild)
+
+
+def rollups_command(args):
+    build_rollups(engine)
+
+
+def schema_snapshot_command(args):
+    refresh_schema_snapshot(engine)
+
+
+def ingest_command(args):
+    try:
+        ingest(engine, args.paths, full_snapshot=args.full_snapshot, publish=not args.no_publish,
+               dedupe=args.dedupe)
+    except DuplicateKeys as e:
+        raise SystemExit(str(e))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serving = commands.add_parser("serving-view", help="Manage the typed serving view.")
+    serving.add_argument("--create", action="store_true", help="Create the view if missing, then populate it.")
+    serving.add_argument("--rebuild", action="store_true", help="Drop and recreate the view.")
+    serving.add_argument("--blocking", action="store_true",
+                         help="Refresh without CONCURRENTLY (faster, but blocks readers).")
+    serving.add_argument("--skip-rollups", action="store_true",
+                         help="Do not rebuild the statistics rollup afterwards.")
+    serving.set_defaults(handler=serving_view_command)
+
+    trigram = commands.add_parser("trigram-indexes", help="Create/repair pg_trgm indexes for LIKE matching.")
+    trigram.add_argument("--rebuild", action="store_true", help="REINDEX existing indexes as well.")
+    trigram.set_defaults(handler=trigram_indexes_command)
+
+    rollups = commands.add_parser("rollups", help="Rebuild the pre-aggregated statistics rollup.")
+    rollups.set_defaults(handler=rollups_command)
+
+    snapshot = commands.add_parser("schema-snapshot", help="Save the reflected table schema for fast startup.")
+    snapshot.set_defaults(handler=schema_snapshot_command)
+
+    loader = commands.add_parser("ingest", help="Upsert case dumps (CSV, optionally gzipped) and publish them.")
+    loader.add_argument("paths", nargs="+", help="Dump files with a header row of case table columns.")
+    loader.add_argument("--full-snapshot", action="store_true",
+                        help="The dumps are the complete data set: delete cases missing from them.")
+    loader.add_argument("--no-publish", action="store_true",
+                        help="Only load the raw table; leave the serving view and rollup as they are.")
+    loader.add_argument("--dedupe", action="store_true",
+                        help="If the raw table has repeated keys, move the extra rows to "
+                             "<table>_duplicates instead of stopping.")
+    loader.set_defaults(handler=ingest_command)
+
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
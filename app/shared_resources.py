@@ -1,6 +1,5 @@
-from langchain_community.utilities import SQLDatabase
-
-shared_db: SQLDatabase = None
+# SQLDatabase, built on demand by the chatbot (see app/core/schema_snapshot.py)
+shared_db = None
 
 chatbot_instances = {}
 
@@ -1,36 +1,65 @@
-TABLE_INFO = """
-Table: updated_case_details_2025
+import os
+
+# Raw case data as loaded (every column stored as text; see app/maintenance/ingest.py).
+CASE_TABLE = os.getenv("CASE_TABLE", "updated_case_details_2025")
+# Typed, indexed materialized view over CASE_TABLE that the chatbot queries
+# (see app/maintenance/serving_view.py).
+CASE_SERVING_VIEW = os.getenv("CASE_SERVING_VIEW", "drt_case_serving")
+# Pre-aggregated counts over CASE_SERVING_VIEW (see app/maintenance/rollups.py).
+CASE_ROLLUP_TABLE = os.getenv("CASE_ROLLUP_TABLE", "drt_case_rollup")
+CASE_TYPE_TABLE = os.getenv("CASE_TYPE_TABLE", "case_type")
+
+# Columns of CASE_TABLE, in the order the case dumps carry them.
+CASE_COLUMNS = [
+    "diary_no", "filing_no", "case_no", "case_type", "case_filing_date",
+    "case_registration_date", "petitioner_name", "respondent_name", "case_status",
+    "scrutiny_notification_date", "scrutiny_compliance_date",
+    "scrutiny_objection_status_1_2", "case_first_listing_date", "suit_amount",
+    "daily_order_uploaded_date", "final_order_upload", "document_upload_url",
+    "master_doc_name", "doc_name", "case_disposed_off_date", "scrutiney_time",
+    "case_listing_time", "disposal_diffdays", "drt_name", "filing_no_rank_no",
+]
+# One row of CASE_TABLE per document of a filing.
+CASE_KEY = ("diary_no", "filing_no", "doc_name")
+
+TABLE_INFO = f"""
+Table: {CASE_SERVING_VIEW}
 Columns:
-- diary_no (string) - Unique diary number assigned to the case
-- filing_no (string) - Filing number of the case
-- case_no (string) - Court case number
-- case_type (string) - Type/category of the case Foregin key relationship for 'case_type' table 1 and 6 for original application, 4 and 7 for securitization application
-- case_filing_date (string) - Date when the case was filed
-- case_registration_date (string) - Date when the case was registered
-- petitioner_name (string) - Name of the petitioner
-- respondent_name (string) - Name of the respondent
-- case_status (string) - Current status of the case 'D' for 'disposed' and 'P' for 'pending'
-- scrutiny_notification_date (string) - Date when scrutiny notification was issued
-- scrutiny_compliance_date (string) - Date when scrutiny compliance happened
-- scrutiny_objection_status_1_2 (string) - Scrutiny objection status (e.g., level 1/2)
-- case_first_listing_date (string) - Date of first listing/hearing of the case
-- suit_amount (string) - Claimed suit amount for the case
-- daily_order_uploaded_date (string) - Date when daily order was uploaded
-- final_order_upload (string) - Path/URL of final order document
-- document_upload_url (string) - Path/URL of the uploaded supporting document
-- master_doc_name (string) - Master document type or filename
-- doc_name (string) - Specific document name or description
-- case_disposed_off_date (string) - Date when the case was disposed
-- scrutiney_time (string) - Time taken for scrutiny (e.g., days)
-- case_listing_time (string) - Time taken to list the case (e.g., days)
-- disposal_diffdays (string) - Days between filing and disposal
-- drt_name (string) - Tribunal/DRT name
-- filing_no_rank_no (string) - Ranking of filing number
+- diary_no (text) - Unique diary number assigned to the case
+- filing_no (text) - Filing number of the case
+- case_no (text) - Court case number
+- case_type (text) - Type/category of the case Foregin key relationship for 'case_type' table 1 and 6 for original application, 4 and 7 for securitization application
+- case_filing_date (date) - Date when the case was filed
+- case_registration_date (date) - Date when the case was registered
+- petitioner_name (text) - Name of the petitioner
+- respondent_name (text) - Name of the respondent
+- case_status (text) - Current status of the case 'D' for 'disposed' and 'P' for 'pending' (always upper case)
+- scrutiny_notification_date (date) - Date when scrutiny notification was issued
+- scrutiny_compliance_date (date) - Date when scrutiny compliance happened
+- scrutiny_objection_status_1_2 (text) - Scrutiny objection status (e.g., level 1/2)
+- case_first_listing_date (date) - Date of first listing/hearing of the case
+- suit_amount (numeric) - Claimed suit amount for the case
+- daily_order_uploaded_date (date) - Date when daily order was uploaded
+- final_order_upload (text) - Path/URL of final order document, NULL when not uploaded
+- document_upload_url (text) - Path/URL of the uploaded supporting document
+- master_doc_name (text) - Master document type or filename
+- doc_name (text) - Specific document name or description
+- case_disposed_off_date (date) - Date when the case was disposed
+- scrutiney_time (numeric) - Time taken for scrutiny (e.g., days)
+- case_listing_time (numeric) - Time taken to list the case (e.g., days)
+- disposal_diffdays (numeric) - Days between filing and disposal, NULL when unknown
+- drt_name (text) - Tribunal/DRT name
+- filing_no_rank_no (numeric) - Ranking of filing number
+- filing_year (integer) - Calendar year of case_filing_date
+- filing_month (integer) - Calendar month (1-12) of case_filing_date
+- filing_fy (text) - Indian financial year of case_filing_date, e.g. '2023-24'
+- disposal_year (integer) - Calendar year of case_disposed_off_date
+- disposal_fy (text) - Indian financial year of case_disposed_off_date, e.g. '2023-24'
 
-Table: case_type 
+Table: {CASE_TYPE_TABLE}
 - case_type_name columns contains different cases of applications like Original Applications, standard etc.
-Columns: 
-- case_type_id (string) - case type master 
+Columns:
+- case_type_id (string) - case type master
 - case_type_name (string) - case type name different cases
 
 """
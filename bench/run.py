@@ -0,0 +1,202 @@
+"""
+Replay the `help` question set concurrently against /api/chat and report
+throughput and per-stage latency percentiles.
+
+    python -m bench.seed --rows 1000000 --replace   # once
+    python -m bench.run --concurrency 16 --rounds 5
+    python -m bench.run --url http://localhost:8000 # against a running server
+
+By default the app runs in this process (no sockets) with the fake LLM
+(`LLM_PROVIDER=fake:<--llm-latency-ms>`), so the only dependency is the
+local PostgreSQL the seed command filled. The fake LLM answers each help
+question with the representative SQL in bench/fake_queries.json (filters,
+joins, large and small results); pass --no-fast-path so every question goes
+through it rather than the rule-based parser. Stages come from each response:
+`total` is the client-observed latency, `sql` the slowest sub-query, and
+the rest are the per-stage timings the server reports with `?timings=true`.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from collections import defaultdict
+
+import httpx
+
+
+logger = logging.getLogger("bench.run")
+
+DEFAULT_QUESTIONS = Path(__file__).resolve().parent.parent / "help"
+DEFAULT_FAKE_QUERIES = Path(__file__).resolve().parent / "fake_queries.json"
+
+
+def load_questions(path: Path) -> list[str]:
+    """Questions from the help file: the lines ending in '?' or '.' (the rest are headings)."""
+    lines = (line.strip() for line in path.read_text(encoding="utf-8").splitlines())
+    return [line for line in lines if line and line[-1] in "?."]
+
+
+def percentile(values: list[float], quantile: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+def stage_timings(result: dict, total_ms: float) -> dict[str, float]:
+    stages = {"total": total_ms}
+    elapsed = [report["elapsed_ms"] for report in result.get("sub_queries") or [] if "elapsed_ms" in report]
+    if elapsed:
+        # sub-queries run concurrently, so the slowest one is the SQL stage
+        stages["sql"] = max(elapsed)
+    for stage, value in ((result.get("timings") or {}).get("stages") or {}).items():
+        stages[stage] = value
+    return stages
+
+
+async def replay(client: httpx.AsyncClient, questions: list[str], concurrency: int, rounds: int) -> dict:
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for _ in range(rounds):
+        for question in questions:
+            queue.put_nowait(question)
+    samples: dict[str, list[float]] = defaultdict(list)
+    outcomes: dict[str, int] = defaultdict(int)
+
+    async def worker():
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                # empty history keeps every request stateless (no server-side session)
+                response = await client.post(
+                    "/api/chat", params={"timings": "true"}, json={"question": question, "chat_history": []}
+                )
+                total_ms = (time.perf_counter() - started) * 1000
+                if response.status_code != 200:
+                    outcomes[f"http_{response.status_code}"] += 1
+                    continue
+                result = response.json()
+            except Exception as e:
+                logger.warning(f"Request failed for {question!r}: {str(e)}")
+                outcomes["error"] += 1
+                continue
+            outcomes["rows" if result.get("success") else "no_rows"] += 1
+            for stage, value in stage_timings(result, total_ms).items():
+                samples[stage].append(value)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_seconds = time.perf_counter() - started
+    requests = sum(outcomes.values())
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(requests / wall_seconds, 2) if wall_seconds else None,
+        "outcomes": dict(outcomes),
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50_ms": _round(percentile(values, 0.50)),
+                "p95_ms": _round(percentile(values, 0.95)),
+                "p99_ms": _round(percentile(values, 0.99)),
+                "max_ms": _round(max(values)),
+            }
+            for stage, values in samples.items()
+        },
+    }
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 1)
+
+
+def print_report(report: dict):
+    print(
+        f"\n{report['requests']} requests, concurrency {report['concurrency']}, "
+        f"{report['wall_seconds']}s -> {report['throughput_rps']} req/s"
+    )
+    print(f"outcomes: {report['outcomes']}")
+    print(f"{'stage':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, values in sorted(report["stages"].items()):
+        print(
+            f"{stage:<20}{values['count']:>8}{values['p50_ms']:>10}"
+            f"{values['p95_ms']:>10}{values['p99_ms']:>10}{values['max_ms']:>10}"
+        )
+
+
+async def run(args) -> dict:
+    questions = load_questions(Path(args.questions))
+    if not questions:
+        raise SystemExit(f"No questions found in {args.questions}.")
+    print(f"Replaying {len(questions)} questions x {args.rounds} round(s).", file=sys.stderr)
+    timeout = httpx.Timeout(args.timeout)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            return await replay(client, questions, args.concurrency, args.rounds)
+
+    # in-process: settings are read at import/startup, so set them first
+    os.environ["LLM_PROVIDER"] = f"fake:{args.llm_latency_ms:g}"
+    os.environ.pop("LLM_PROVIDERS", None)
+    os.environ.setdefault("FAKE_LLM_SEED", str(args.seed))
+    os.environ["FAKE_LLM_QUERIES"] = args.fake_queries
+    if args.no_fast_path:
+        os.environ["FAST_PATH_ENABLED"] = "false"
+    os.environ["ANSWER_STAGE_ENABLED"] = "true" if args.answer_stage else "false"
+    if args.no_caches:
+        os.environ["QUERY_CACHE_SIZE"] = "0"
+        os.environ["RESULT_CACHE_MAX_BYTES"] = "0"
+    import main as app_main
+    from app.db import engine
+
+    engine.echo = False
+    await app_main.initialize_resources()
+    transport = httpx.ASGITransport(app=app_main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            return await replay(client, questions, args.concurrency, args.rounds)
+    finally:
+        await app_main.release_resources()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS), help="Question file (help format).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once.")
+    parser.add_argument("--rounds", type=int, default=3, help="Times the question set is replayed.")
+    parser.add_argument("--url", help="Benchmark a running server instead of an in-process app.")
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0, help="Fake LLM latency per call.")
+    parser.add_argument("--seed", type=int, default=42, help="Fake LLM seed (latency jitter).")
+    parser.add_argument("--answer-stage", action="store_true", help="Also generate the written answer.")
+    parser.add_argument("--no-caches", action="store_true", help="Disable the query and result caches.")
+    parser.add_argument("--no-fast-path", action="store_true",
+                        help="Send every question to the fake LLM instead of the rule-based parser.")
+    parser.add_argument("--fake-queries", default=str(DEFAULT_FAKE_QUERIES),
+                        help="JSON file of {question: SQL} the fake LLM answers with.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--json", help="Also write the report to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.verbose:
+        # the chatbot logs every step at INFO, which would dominate the run
+        logging.disable(logging.INFO)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    return 0 if report["requests"] and not report["outcomes"].get("error") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Seed a local PostgreSQL with synthetic DRT case data for benchmarks.
+
+    python -m bench.seed --rows 100000             # ~100k document rows
+    python -m bench.seed --rows 10000000 --replace # drop and reload at 10M
+
+Uses the same DB_* settings as the app, so point them at a scratch database.
+Rows are shaped like the real loader's output: every column is text, missing
+values are 'NaN', and each case (diary_no) has several document rows that
+repeat the case columns with a different document. After loading, the
+serving view and the rollup are rebuilt exactly as in production.
+"""
+import io
+import csv
+import time
+import random
+import logging
+import argparse
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from app.db import engine
+from app.maintenance.serving_view import create_serving_view
+from app.maintenance.rollups import build_rollups
+from app.table_info import CASE_TABLE, CASE_TYPE_TABLE, CASE_COLUMNS
+
+
+logger = logging.getLogger("bench.seed")
+
+CASE_TYPES = [
+    ("1", "Original Application"),
+    ("4", "Securitisation Application"),
+    ("6", "Original Application (Transferred)"),
+    ("7", "Securitisation Application (Transferred)"),
+    ("9", "Miscellaneous Application"),
+]
+CASE_TYPE_WEIGHTS = [50, 25, 10, 10, 5]
+
+BANKS = [
+    "STATE BANK OF INDIA", "IDFC First Bank Ltd", "PUNJAB NATIONAL BANK",
+    "BANK OF BARODA", "CANARA BANK", "HDFC BANK LTD", "ICICI BANK LTD",
+    "UNION BANK OF INDIA", "THE BAGHAT URBAN CO OPERATIVE BANK LTD", "AXIS BANK LTD",
+]
+FIRST_NAMES = ["SURESH", "RAMESH", "NAZIR", "ANITA", "VIJAY", "SUNITA", "MOHAN", "PRIYA", "ARJUN", "KAVITA"]
+LAST_NAMES = ["KUMAR", "HUSSAIN", "SHARMA", "SINGH", "GUPTA", "VERMA", "REDDY", "DAS", "PATEL", "KAUR"]
+FIRMS = ["M/S HARI OM MEDICAL STORE", "M/S SHIV TRADERS", "M/S GANGA ENTERPRISES", "M/S NEW INDIA TEXTILES"]
+DRT_NAMES = [f"DRT {city}{n}" for city in ("Chandigarh", "Delhi", "Mumbai", "Kolkata", "Chennai") for n in (1, 2)]
+DOCUMENTS = [
+    ("Vakalatnama", "Vakalatnama"),
+    ("Original Application", "Application under Section 19"),
+    ("Affidavit", "Affidavit in support"),
+    ("Statement of Account", "Statement of Account"),
+    ("Interim Application", "Interim Application for stay"),
+    ("Reply", "Reply filed by respondent"),
+]
+
+FIRST_FILING_DATE = date(2015, 4, 1)
+LAST_FILING_DATE = date(2025, 9, 30)
+
+DDL = [
+    f"CREATE TABLE {CASE_TYPE_TABLE} (case_type_id text PRIMARY KEY, case_type_name text)",
+    f"CREATE TABLE {CASE_TABLE} ({', '.join(f'{column} text' for column in CASE_COLUMNS)})",
+]
+
+
+def _day(value: date | None) -> str:
+    return value.isoformat() if value else "NaN"
+
+
+def _person(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def generate_rows(rows: int, seed: int = 42, max_documents: int = 6):
+    """Yield `rows` raw case rows (lists of strings), grouped by case."""
+    rng = random.Random(seed)
+    span = (LAST_FILING_DATE - FIRST_FILING_DATE).days
+    produced, case_number = 0, 0
+    while produced < rows:
+        case_number += 1
+        filed = FIRST_FILING_DATE + timedelta(days=rng.randrange(span))
+        registered = filed + timedelta(days=rng.randint(0, 30))
+        notified = filed + timedelta(days=rng.randint(1, 20))
+        complied = notified + timedelta(days=rng.randint(0, 40)) if rng.random() < 0.8 else None
+        listed = registered + timedelta(days=rng.randint(5, 90))
+        disposed = filed + timedelta(days=rng.randint(30, 2500)) if rng.random() < 0.55 else None
+        if disposed and disposed > LAST_FILING_DATE:
+            disposed = None
+        bank_petitioner = rng.random() < 0.85
+        party = rng.choice(FIRMS) if rng.random() < 0.2 else _person(rng)
+        case_type = rng.choices(CASE_TYPES, CASE_TYPE_WEIGHTS)[0][0]
+        daily_order = listed + timedelta(days=rng.randint(0, 60)) if rng.random() < 0.7 else None
+        case_columns = {
+            "diary_no": f"{case_number}/{filed.year}",
+            "filing_no": f"{rng.randint(1, 99):02d}{filed.year}{case_number:07d}",
+            "case_no": f"{'OA' if case_type in ('1', '6') else 'SA'}/{case_number}/{filed.year}",
+            "case_type": case_type,
+            "case_filing_date": _day(filed),
+            "case_registration_date": _day(registered),
+            "petitioner_name": rng.choice(BANKS) if bank_petitioner else party,
+            "respondent_name": party if bank_petitioner else rng.choice(BANKS),
+            # the source is not consistent about case
+            "case_status": ("D" if disposed else "P") if rng.random() < 0.95 else ("d" if disposed else "p"),
+            "scrutiny_notification_date": _day(notified),
+            "scrutiny_compliance_date": _day(complied),
+            "scrutiny_objection_status_1_2": rng.choice(["Y", "N", "NaN"]),
+            "case_first_listing_date": _day(listed),
+            "suit_amount": f"{rng.lognormvariate(14, 1.5):.2f}" if rng.random() < 0.9 else "NaN",
+            "daily_order_uploaded_date": _day(daily_order),
+            "final_order_upload": (
+                f"/orders/final/{case_number}.pdf" if disposed and rng.random() < 0.8 else "NaN"
+            ),
+            "case_disposed_off_date": _day(disposed),
+            "scrutiney_time": str((complied - notified).days) if complied else "NaN",
+            "case_listing_time": str((listed - registered).days),
+            "disposal_diffdays": str((disposed - filed).days) if disposed else "NaN",
+            "drt_name": rng.choice(DRT_NAMES),
+            "filing_no_rank_no": str(case_number),
+        }
+        documents = rng.sample(DOCUMENTS, rng.randint(1, max_documents))
+        for master_doc_name, doc_name in documents:
+            if produced >= rows:
+                break
+            row = dict(case_columns)
+            row["master_doc_name"] = master_doc_name
+            row["doc_name"] = doc_name
+            row["document_upload_url"] = f"/documents/{case_number}/{master_doc_name.replace(' ', '_')}.pdf"
+            yield [row[column] for column in CASE_COLUMNS]
+            produced += 1
+
+
+def _copy(cursor, table: str, columns: list[str], rows, batch_size: int) -> int:
+    """COPY `rows` into `table` in CSV batches; returns the number of rows."""
+    total = 0
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    while True:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if count >= batch_size:
+                break
+        if not count:
+            return total
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        total += count
+        logger.info(f"Loaded {total} rows into {table}.")
+
+
+def seed(rows: int, seed: int = 42, replace: bool = False, batch_size: int = 50000):
+    with engine.begin() as connection:
+        existing = connection.execute(
+            text("SELECT to_regclass(:case_table), to_regclass(:type_table)"),
+            {"case_table": CASE_TABLE, "type_table": CASE_TYPE_TABLE},
+        ).one()
+        if any(existing):
+            if not replace:
+                raise RuntimeError(
+                    f"{CASE_TABLE} or {CASE_TYPE_TABLE} already exists; pass --replace to drop them."
+                )
+            connection.execute(text(f"DROP TABLE IF EXISTS {CASE_TABLE}, {CASE_TYPE_TABLE} CASCADE"))
+        for statement in DDL:
+            connection.execute(text(statement))
+
+    started = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            _copy(cursor, CASE_TYPE_TABLE, ["case_type_id", "case_type_name"], iter(CASE_TYPES), batch_size)
+            _copy(cursor, CASE_TABLE, CASE_COLUMNS, generate_rows(rows, seed), batch_size)
+        raw.commit()
+    finally:
+        raw.close()
+    logger.info(f"Loaded {rows} rows in {time.perf_counter() - started:.1f}s.")
+
+    # the raw table is replaced, so the dependent view is rebuilt from scratch
+    create_serving_view(engine, rebuild=True)
+    build_rollups(engine)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m bench.seed", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Raw (document) rows to generate.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; the same seed gives the same data.")
+    parser.add_argument("--replace", action="store_true", help="Drop existing case tables first.")
+    parser.add_argument("--batch-size", type=int, default=50000, help="Rows per COPY batch.")
+    args = parser.parse_args(argv)
+    engine.echo = False
+    seed(args.rows, seed=args.seed, replace=args.replace, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,22 @@ import os
 import logging
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from fastapi.middleware.cors import CORSMiddleware
-from langchain_community.utilities import SQLDatabase
-from app.db import engine
+from app.db import engine, db_executor
+from app.core.llm_factory import close_http_clients
 from app.core.chatbot import Chatbot
+from app.core import metrics
 from app.shared_resources import shared_db, chatbot_instances
 from app.api.router import router as api_router
+from app.api.admin import router as admin_router
+from app.maintenance.serving_view import serving_view_exists
+from app.maintenance.trigram_indexes import missing_trigram_indexes
+from app.table_info import CASE_SERVING_VIEW
 
 
 
@@ -32,6 +39,9 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
 )
+# Compress responses for clients that accept gzip; row payloads shrink
+# several-fold. Server-Sent Events are left uncompressed so they flush per event.
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_BYTES", "1024")))
 
 
 # Serve static files and templates from project root
@@ -45,22 +55,41 @@ async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus scrape target: per-stage latency, LLM tokens, rows, DB wait and cache outcomes."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.on_event("startup")
 async def initialize_resources():
     """
-    Initialize SQLDatabase and a single chatbot instance at server startup.
+    Initialize a single chatbot instance at server startup. No tables are
+    reflected here; the chatbot builds its SQLDatabase from the schema
+    snapshot only if it needs one.
     """
     global shared_db, chatbot_instances
 
-    # 1. Initialize the shared SQLDatabase (PostgreSQL)
-    shared_db = SQLDatabase(
-        engine=engine,
-        # Mention only the tables you want LLM to query
-        include_tables=["updated_case_details_2025", "case_type"]  
-    )
-    print("✅ Shared SQLDatabase initialized successfully.")
-
-    # 2. Initialize only one chatbot (your first phase)
+    # 0. Warn early when the typed serving view the prompts target, or the
+    #    trigram indexes its LIKE '%value%' filters rely on, are missing
+    try:
+        with engine.connect() as connection:
+            if not serving_view_exists(connection):
+                logger.warning(
+                    f"Serving view {CASE_SERVING_VIEW} is missing; run "
+                    f"`python -m app.manage serving-view --create`."
+                )
+            else:
+                missing = missing_trigram_indexes(connection)
+                if missing:
+                    logger.warning(
+                        f"Trigram indexes missing for {', '.join(missing)}; text matching "
+                        f"will scan the whole table. Run `python -m app.manage trigram-indexes`."
+                    )
+    except Exception as e:
+        logger.warning(f"Could not check the serving view: {str(e)}")
+
+    # 1. Initialize only one chatbot (your first phase)
     chatbot_instances.clear()  # reset dictionary
     chatbot_instances["DefaultBot"] = Chatbot(
         bot_type="DefaultBot",
@@ -72,5 +101,12 @@ async def initialize_resources():
     print("🤖 Chatbot instance initialized successfully.")
 
 
+@app.on_event("shutdown")
+async def release_resources():
+    db_executor.shutdown()
+    await close_http_clients()
+
+
 
 app.include_router(api_router)
+app.include_router(admin_router)
@@ -0,0 +1,32 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.admin import router
+
+
+def _get(path, headers=None):
+    app = FastAPI()
+    app.include_router(router)
+
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers or {})
+
+    return asyncio.run(request())
+
+
+def test_admin_routes_are_off_without_a_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    response = _get("/api/admin/slow-queries")
+    assert response.status_code == 403
+    assert "ADMIN_TOKEN" in response.json()["detail"]
+
+
+def test_admin_routes_check_the_token(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert _get("/api/admin/slow-queries").status_code == 403
+    assert _get("/api/admin/slow-queries", {"X-Admin-Token": "wrong"}).status_code == 403
+    assert _get("/api/admin/slow-queries", {"X-Admin-Token": "secret"}).status_code == 200
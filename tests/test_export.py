@@ -0,0 +1,66 @@
+import asyncio
+
+import app.core.export as export
+from app.core.export import ExportResponse, export_chunks, export_limiter
+
+
+def _entry():
+    return {"query": "SELECT bench_name FROM drt_case_serving", "params": {}, "columns": None}
+
+
+def _stream(monkeypatch, closed):
+    async def stream(query, params=None, **kwargs):
+        try:
+            for _ in range(3):
+                yield [{"bench_name": "Delhi"}]
+        finally:
+            closed.append(query)
+
+    monkeypatch.setattr(export.db_executor, "stream", stream)
+
+
+async def _respond(response, send, spec_version="2.4"):
+    async def receive():
+        await asyncio.sleep(3600)
+
+    scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+    await response(scope, receive, send)
+
+
+def test_slot_is_freed_when_the_client_is_gone_before_the_body(monkeypatch):
+    closed = []
+    _stream(monkeypatch, closed)
+
+    async def send(message):
+        raise OSError("client went away")
+
+    async def scenario():
+        body, close = await export_chunks(_entry(), export.CSV)
+        assert export_limiter.running == 1
+        try:
+            await _respond(ExportResponse(body, close, media_type="text/csv"), send)
+        except Exception:
+            pass
+
+    asyncio.run(scenario())
+    assert export_limiter.running == 0
+    assert len(closed) == 1
+
+
+def test_slot_is_freed_once_after_a_full_download(monkeypatch):
+    closed = []
+    _stream(monkeypatch, closed)
+    sent = []
+
+    async def send(message):
+        sent.append(message.get("body", b""))
+
+    async def scenario():
+        body, close = await export_chunks(_entry(), export.CSV)
+        await _respond(ExportResponse(body, close, media_type="text/csv"), send)
+        await close()
+
+    asyncio.run(scenario())
+    assert b"".join(sent) == b"bench_name\r\nDelhi\r\n" + b"Delhi\r\n" * 2
+    assert export_limiter.running == 0
+    assert len(closed) == 1
@@ -0,0 +1,14 @@
+from pathlib import Path
+
+from app.core.fake_llm import load_fake_queries
+from app.core.query_cache import normalize_question
+from app.core.sql_analysis import parse_sql
+from bench.run import DEFAULT_FAKE_QUERIES, DEFAULT_QUESTIONS, load_questions
+
+
+def test_every_help_question_has_canned_read_only_sql():
+    queries = load_fake_queries(str(DEFAULT_FAKE_QUERIES))
+    for question in load_questions(Path(DEFAULT_QUESTIONS)):
+        sql = queries.get(normalize_question(question))
+        assert sql is not None, question
+        assert parse_sql(sql).read_only, question
@@ -0,0 +1,55 @@
+import pytest
+
+from app.core.fast_path import FastPathParser
+
+
+# Questions that look like a template but carry a further condition the
+# template cannot express; they must go to the LLM.
+NEAR_MISSES = [
+    "How many cases of SBI are pending?",
+    "How many cases are from SBI in 2024?",
+    "Show all cases filed by SBI in 2023",
+    "How many cases are from DRT Delhi pending?",
+    "How many cases are from SBI after 2020?",
+    "How many cases are from SBI before 2022?",
+    "How many cases were filed by SBI vs PNB?",
+    "How many cases are from SBI disposed?",
+    "How many cases from State Bank of India are pending?",
+    "How many cases belong to DRT Delhi filed in 2021?",
+    "How many cases belong to DRT chandigarh1 2024?",
+    "Show all cases filed by SBI on 2023-01-01",
+    "Show all cases belonging to DRT Delhi where case_status is 'D'",
+    "List all cases where the petitioner is SURESH KUMAR and status is pending",
+    "Show full details for diary number 118/2018 and 849/2021",
+    "Show full details for diary number 118/2018 in DRT Delhi",
+    "How many cases are from each DRT?",
+    "How many cases are from all banks?",
+    "How many cases were filed by private banks?",
+    "How many cases are from today?",
+    "How many cases are from Chandigarh?",
+    "How many cases are from every DRT?",
+    "How many cases are from Delhi 2?",
+    "How many cases are from public sector banks?",
+    "How many cases are from last year?",
+    "Show all cases filed by any bank",
+]
+
+
+@pytest.mark.parametrize("question", NEAR_MISSES)
+def test_near_misses_fall_through(question):
+    assert FastPathParser().parse(question) is None
+
+
+@pytest.mark.parametrize("question, template, params", [
+    ("How many cases are from State Bank of India?", "count_by_party", {"party": "%State Bank of India%"}),
+    ("How many cases belong to DRT Chandigarh1?", "count_by_drt", {"drt": "%Chandigarh1%"}),
+    ("How many cases are from Allahabad Bank?", "count_by_party", {"party": "%Allahabad Bank%"}),
+    ('How many cases are from "Chandigarh"?', "count_by_party", {"party": "%Chandigarh%"}),
+    ("How many cases in DRT chandigarh1 were disposed in 2024?", "count_by_drt_disposed_year",
+     {"drt": "%chandigarh1%", "year": 2024}),
+    ('Show all cases filed by "SBI in 2023".', "cases_filed_by", {"party": "%SBI in 2023%"}),
+    ("Show full details for diary number 118/2018.", "details_by_diary_no", {"diary_no": "118/2018"}),
+])
+def test_plain_questions_match(question, template, params):
+    name, _, bound = FastPathParser().parse(question)
+    assert (name, bound) == (template, params)
@@ -0,0 +1,35 @@
+import asyncio
+
+from app.core.fake_llm import FakeChatModel
+from app.core.llm_router import LLMRouter
+
+
+def test_hedge_loser_is_measured_and_ranked_down():
+    router = LLMRouter(
+        {
+            "slow": FakeChatModel(name="slow", latency_ms=1000, jitter=0, token_delay_ms=0),
+            "fast": FakeChatModel(name="fast", latency_ms=10, jitter=0, token_delay_ms=0),
+        },
+        min_samples=2,
+        hedge=True,
+        hedge_min_delay_seconds=0.05,
+    )
+
+    async def calls(count: int) -> float:
+        started = asyncio.get_running_loop().time()
+        for _ in range(count):
+            await router.ainvoke("hello")
+        return (asyncio.get_running_loop().time() - started) / count
+
+    async def scenario():
+        # unmeasured providers go first until they have min_samples samples;
+        # "slow" only ever gets censored ones, from the hedges it loses
+        await calls(3)
+        assert router.ranked() == ["fast", "slow"]
+        return await calls(5)
+
+    mean_seconds = asyncio.run(scenario())
+    # no more hedge delays once "fast" leads
+    assert mean_seconds < 0.05
+    assert router.stats()["fast"]["hedge_wins"] == 2
+    assert router.stats()["slow"]["p50_ms"] >= 50
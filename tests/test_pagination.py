@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+import app.core.pagination as pagination
+from app.core.pagination import PageRejected, cursor_offset, encode_cursor, fetch_page
+
+
+@pytest.mark.parametrize("offset", ["10; DROP TABLE x", -1, 1.5, True, None, [0]])
+def test_malformed_offsets_are_rejected(offset):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        cursor_offset({"offset": offset})
+
+
+def test_offsets_past_the_ceiling_are_refused(monkeypatch):
+    monkeypatch.setattr(pagination, "MAX_PAGE_OFFSET", 100)
+    assert cursor_offset({}) == 0
+    assert cursor_offset({"offset": 100}) == 100
+    with pytest.raises(ValueError, match="export"):
+        cursor_offset({"offset": 101})
+
+
+class _Bot:
+    def __init__(self, verdict=None):
+        self.verdict = verdict
+        self.checked = []
+
+    async def cost_rejection(self, query, params, max_cost=None):
+        self.checked.append((query, params))
+        return self.verdict
+
+
+def _entry():
+    return {"query": "SELECT bench_name FROM drt_cases", "params": {}, "columns": ["bench_name"]}
+
+
+def test_offset_pages_are_governed(monkeypatch):
+    executed = []
+
+    async def run(query, params=None, **kwargs):
+        executed.append(query)
+        return [{"bench_name": "Delhi"}] * 3
+
+    monkeypatch.setattr(pagination.db_executor, "run", run)
+    bot = _Bot()
+    page = asyncio.run(fetch_page(bot, _entry(), encode_cursor({"offset": 4}), 2))
+    assert bot.checked[0][0] == executed[0]
+    assert bot.checked[0][1]["page_offset"] == 4
+    assert pagination.decode_cursor(page["next_cursor"]) == {"offset": 6}
+
+    rejecting = _Bot({"allowed": False, "rejected_by": "cost", "reason": "Estimated cost 1e9."})
+    with pytest.raises(PageRejected):
+        asyncio.run(fetch_page(rejecting, _entry(), None, 2))
+    assert len(executed) == 1
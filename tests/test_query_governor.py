@@ -0,0 +1,50 @@
+import asyncio
+
+from app.db import db_executor
+from app.core.query_governor import QueryGovernor, COST, PLAN_ERROR
+
+
+def _plan(cost):
+    return [{"QUERY PLAN": [{"Plan": {"Node Type": "Seq Scan", "Total Cost": cost, "Plan Rows": 10}}]}]
+
+
+def test_verdicts_are_cached_per_data_version(monkeypatch):
+    explains = []
+
+    async def run(query, params=None, **kwargs):
+        explains.append(query)
+        return _plan(10.0 if len(explains) == 1 else 1e9)
+
+    monkeypatch.setattr(db_executor, "run", run)
+    governor = QueryGovernor(max_cost=1000)
+
+    async def scenario():
+        first = await governor.check("SELECT 1", data_version="1:0")
+        again = await governor.check("SELECT 1", data_version="1:0")
+        reloaded = await governor.check("SELECT 1", data_version="2:0")
+        return first, again, reloaded
+
+    first, again, reloaded = asyncio.run(scenario())
+    assert first["allowed"] and again["allowed"]
+    assert not reloaded["allowed"] and reloaded["rejected_by"] == COST
+    assert len(explains) == 2
+
+
+def test_planning_errors_are_not_cached(monkeypatch):
+    calls = []
+
+    async def run(query, params=None, **kwargs):
+        calls.append(query)
+        if len(calls) == 1:
+            raise RuntimeError("could not connect to server")
+        return _plan(10.0)
+
+    monkeypatch.setattr(db_executor, "run", run)
+    governor = QueryGovernor(max_cost=1000)
+
+    async def scenario():
+        return [await governor.check("SELECT 1", data_version="1:0") for _ in range(2)]
+
+    failed, retried = asyncio.run(scenario())
+    assert failed["rejected_by"] == PLAN_ERROR
+    assert retried["allowed"]
@@ -0,0 +1,69 @@
+import asyncio
+
+import app.core.rollup_router as rollup_router
+from app.core.rollup_router import RollupRouter
+
+
+def test_stale_rollup_is_rechecked(monkeypatch):
+    note = {"value": "data_version=4;format=2;cases=exact"}
+    checks = []
+
+    async def run(query, *args, **kwargs):
+        # bookkeeping statements stay out of the slow-query log
+        assert kwargs.get("record") is False
+        checks.append(query)
+        return [{"note": note["value"]}]
+
+    monkeypatch.setattr(rollup_router.db_executor, "run", run)
+    router = RollupRouter(recheck_seconds=0)
+
+    async def scenario():
+        # version 5 was bumped while the rollup was still being rebuilt
+        assert not await router.is_available(5)
+        note["value"] = "data_version=5;format=2;cases=exact"
+        assert await router.is_available(5)
+        # a positive answer is kept for the version
+        assert await router.is_available(5)
+
+    asyncio.run(scenario())
+    assert len(checks) == 2
+
+
+def test_case_counts_use_the_distinct_case_column():
+    router = RollupRouter()
+    rewritten = router.rewrite(
+        "SELECT COUNT(DISTINCT diary_no) AS case_count FROM drt_case_serving "
+        "WHERE case_status = 'D' AND disposal_year = :year"
+    )
+    assert rewritten == (
+        "SELECT COALESCE(SUM(case_count), 0)::bigint AS case_count FROM drt_case_rollup "
+        "WHERE case_status = 'D' AND disposal_year = :year"
+    )
+    assert "SUM(row_count)" in router.rewrite("SELECT COUNT(*) FROM drt_case_serving WHERE filing_year = 2021")
+
+
+def test_case_counts_need_an_exact_rollup(monkeypatch):
+    async def run(query, *args, **kwargs):
+        return [{"note": "data_version=5;format=2;cases=per_group"}]
+
+    monkeypatch.setattr(rollup_router.db_executor, "run", run)
+    router = RollupRouter()
+
+    async def scenario():
+        return await router.is_available(5), await router.is_available(5, counts_cases=True)
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_grouped_known_days_drops_groups_without_disposal_days():
+    rewritten = RollupRouter().rewrite(
+        "SELECT drt_name, COUNT(*) AS disposed, ROUND(AVG(disposal_diffdays), 1) AS avg_days "
+        "FROM drt_case_serving WHERE case_status = 'D' AND disposal_diffdays IS NOT NULL "
+        "GROUP BY drt_name ORDER BY disposed DESC"
+    )
+    assert rewritten == (
+        "SELECT drt_name, COALESCE(SUM(disposal_days_count), 0)::bigint AS disposed, "
+        "ROUND(SUM(disposal_days_sum) / NULLIF(SUM(disposal_days_count), 0), 1) AS avg_days "
+        "FROM drt_case_rollup WHERE case_status = 'D' GROUP BY drt_name "
+        "HAVING SUM(disposal_days_count) > 0 ORDER BY disposed DESC"
+    )
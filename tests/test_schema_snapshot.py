@@ -0,0 +1,28 @@
+import pickle
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.schema import CreateTable
+
+from app.core.schema_snapshot import load_schema_snapshot, refresh_schema_snapshot
+
+
+def test_snapshot_round_trips_as_json(tmp_path):
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE cases (diary_no INTEGER PRIMARY KEY, bench_name VARCHAR(80) NOT NULL, "
+            "filed_on DATE, amount NUMERIC(12, 2))"
+        ))
+    path = str(tmp_path / "schema.json")
+    reflected = refresh_schema_snapshot(engine, ["cases"], path)
+    loaded = load_schema_snapshot(["cases"], path)
+
+    ddl = [str(CreateTable(metadata.tables["cases"]).compile(engine)) for metadata in (reflected, loaded)]
+    assert ddl[0] == ddl[1]
+    assert load_schema_snapshot(["cases", "case_types"], path) is None
+
+
+def test_pickled_snapshots_are_not_loaded(tmp_path):
+    path = tmp_path / "schema.json"
+    path.write_bytes(pickle.dumps({"tables": ["cases"], "metadata": None}))
+    assert load_schema_snapshot(["cases"], str(path)) is None
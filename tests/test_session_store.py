@@ -0,0 +1,47 @@
+import pytest
+
+from app.core.session_store import ChatSession, SessionStore
+
+
+def _ask(session, question, sql):
+    session.add_turn(question, [{"question": question, "query": sql, "status": "ok"}], "", 1)
+
+
+def test_follow_up_is_not_reused_after_a_different_question():
+    session = ChatSession("s", context_turns=1)
+    _ask(session, "Cases in DRT Delhi", "SQL delhi")
+    _ask(session, "And in 2019?", "SQL delhi 2019")
+    _ask(session, "Cases in DRT Mumbai", "SQL mumbai")
+    assert session.find_queries("and in 2019") is None
+
+    _ask(session, "Cases in DRT Delhi", "SQL delhi")
+    assert session.find_queries("and in 2019")[0]["query"] == "SQL delhi 2019"
+
+
+def test_repeated_question_needs_the_same_earlier_questions():
+    session = ChatSession("s", context_turns=2)
+    _ask(session, "Cases in DRT Delhi", "SQL delhi")
+    # first asked with no earlier questions, now after one
+    assert session.find_queries("cases in drt delhi") is None
+
+    without_context = ChatSession("t", context_turns=0)
+    _ask(without_context, "Cases in DRT Delhi", "SQL delhi")
+    assert without_context.find_queries("cases in drt delhi")[0]["query"] == "SQL delhi"
+
+
+@pytest.mark.parametrize("persistent", [False, True])
+def test_concurrent_saves_keep_both_turns(tmp_path, persistent):
+    path = str(tmp_path / "sessions.sqlite") if persistent else None
+    worker_a = SessionStore(path=path)
+    # a second worker on the same file, or the same store within one worker
+    worker_b = SessionStore(path=path) if persistent else worker_a
+
+    first, second = worker_a.get("s"), worker_b.get("s")
+    _ask(first, "Cases in DRT Delhi", "SQL delhi")
+    _ask(second, "Cases in DRT Mumbai", "SQL mumbai")
+    worker_a.save(first)
+    worker_b.save(second)
+
+    for store in (worker_a, worker_b):
+        questions = [turn["question"] for turn in store.get("s").turns]
+        assert questions == ["Cases in DRT Delhi", "Cases in DRT Mumbai"]
@@ -0,0 +1,61 @@
+import pytest
+
+from app.core.sql_analysis import parse_sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM drt_case_serving WHERE LOWER(drt_name) LIKE LOWER('%delhi%')",
+    "SELECT drt_name, ROUND(AVG(disposal_diffdays), 2) FROM drt_case_serving GROUP BY drt_name",
+    "SELECT EXTRACT(YEAR FROM case_filing_date), DATE_TRUNC('month', case_filing_date) FROM drt_case_serving",
+    "SELECT STRING_AGG(DISTINCT doc_name, ', ') FROM drt_case_serving WHERE diary_no = '118/2018'",
+    "SELECT ROW_NUMBER() OVER (PARTITION BY diary_no ORDER BY doc_name) FROM drt_case_serving",
+    "SELECT COALESCE(NULLIF(TRIM(final_order_upload), ''), 'none') FROM drt_case_serving",
+])
+def test_ordinary_functions_are_allowed(sql):
+    assert parse_sql(sql).read_only
+
+
+@pytest.mark.parametrize("call", [
+    "query_to_xml('SELECT * FROM pg_authid', true, true, '')",
+    "table_to_xml('pg_authid', true, true, '')",
+    "cursor_to_xml(c, 10, true, true, '')",
+    "pg_read_file('/etc/passwd')",
+    "current_setting('data_directory')",
+    "pg_sleep(10)",
+    "lo_get(1)",
+    "dblink('host=x', 'SELECT 1')",
+])
+def test_other_functions_are_refused(call):
+    parsed = parse_sql(f"SELECT {call} FROM drt_case_serving")
+    assert not parsed.read_only
+    assert "is not allowed" in parsed.error
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT a FROM t", "SELECT a FROM t LIMIT 1001"),
+    ("SELECT a FROM t LIMIT 5", "SELECT a FROM t LIMIT 5"),
+    ("SELECT a FROM t LIMIT 5000", "SELECT a FROM t LIMIT 1001"),
+    ("SELECT a FROM t FETCH FIRST 5 ROWS ONLY", "SELECT a FROM t FETCH FIRST 5 ROWS ONLY"),
+    ("SELECT a FROM t FETCH FIRST 5000 ROWS ONLY",
+     "SELECT * FROM (\nSELECT a FROM t FETCH FIRST 5000 ROWS ONLY\n) AS capped_result LIMIT 1001"),
+    ("SELECT a FROM t LIMIT :n", "SELECT * FROM (\nSELECT a FROM t LIMIT :n\n) AS capped_result LIMIT 1001"),
+])
+def test_with_limit_keeps_existing_limits(sql, expected):
+    assert parse_sql(sql).with_limit(1001) == expected
+
+
+@pytest.mark.parametrize("sql, unique", [
+    ("SELECT * FROM drt_case_serving WHERE drt_name = 'DRT Delhi'", True),
+    ("SELECT s.* FROM drt_case_serving s", True),
+    ("SELECT serving_row_id, diary_no FROM drt_case_serving", True),
+    ("SELECT DISTINCT serving_row_id, doc_name FROM drt_case_serving", True),
+    ("SELECT diary_no, doc_name FROM drt_case_serving", False),
+    ("SELECT LOWER(serving_row_id) AS serving_row_id FROM drt_case_serving", False),
+    ("SELECT diary_no AS serving_row_id FROM drt_case_serving", False),
+    ("SELECT s.serving_row_id FROM drt_case_serving s JOIN case_type c ON c.id = s.case_type", False),
+    ("SELECT serving_row_id, COUNT(*) FROM drt_case_serving GROUP BY serving_row_id, doc_name", False),
+    ("SELECT serving_row_id, UNNEST(STRING_TO_ARRAY(doc_name, ',')) FROM drt_case_serving", False),
+    ("SELECT serving_row_id FROM drt_case_serving UNION ALL SELECT serving_row_id FROM drt_case_serving", False),
+])
+def test_rows_unique_on(sql, unique):
+    assert parse_sql(sql).rows_unique_on("serving_row_id", "drt_case_serving") is unique